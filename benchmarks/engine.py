@@ -0,0 +1,418 @@
+"""micro benchmarks of the engine's hot paths and full game throughput
+
+every case runs on a fixed seed and a fixed board, the results are compared
+with a stored baseline and the script fails when a case got slower than the
+threshold allows. baselines are only comparable on the same machine, save
+one before working on the engine.
+
+    python benchmarks/engine.py --save            # store the baseline
+    python benchmarks/engine.py                   # compare with it
+    python benchmarks/engine.py --json out.json --threshold 0.1 -k line_clear
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from typing import Callable, NamedTuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from tetris.bitboard import BOARD_HEIGHT, BOARD_WIDTH  # noqa: E402
+from tetris.engine import (  # noqa: E402
+    CELL_TABLE,
+    EMPTY_ROW,
+    GARBAGE,
+    KICK_TABLE,
+    MASK_TABLE,
+    Action,
+    TetriminoShape,
+    TetrisEngine,
+    Tetrimino,
+)
+from tetris.render import CursesRenderer  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+SEED = 7
+
+# the bottom rows of the fixture boards, x is a filled cell
+STACKED = [
+    "....x.....",
+    "...xxx..x.",
+    "x.xxxx.xxx",
+    "xx.xxxxxxx",
+    "xxxxx.xxxx",
+    "xxx.xxxxx.",
+    "xxxxxxx.xx",
+    "x.xxxxxxxx",
+    "xxxxxx.xxx",
+    "xxxx.xxxxx",
+    "xx.xxxxxxx",
+    "xxxxxxxx.x",
+]
+# a t-spin double slot at column 2, with the corner at row 37 column 3
+T_SPIN = [
+    "...xxxxxxx",
+    "x...xxxxxx",
+    "xx.xxxxxxx",
+]
+TETRIS = ["xxxxxxxxx."] * 4
+# the stack reaches into the rows tetriminos spawn in
+NEAR_TOP_OUT = ["x.xxxxxxxx" if i % 2 else "xxxxxxxx.x" for i in range(19)]
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[], float]  # one measurement, seconds per operation
+    unit: str = "ns"  # lower is better, "steps/s" is higher is better
+
+
+def board(rows: list[str], seed: int = SEED) -> TetrisEngine:
+    """a game on a board with `rows` at the bottom"""
+    game = TetrisEngine(seed)
+    game.init_game()
+    start = BOARD_HEIGHT - len(rows)
+    for i, picture in enumerate(rows):
+        row = tuple(GARBAGE if c == "x" else 0 for c in picture)
+        game.board[start + i] = row if any(row) else EMPTY_ROW
+        game.bitboard.rows[start + i] = sum(
+            1 << y for y, c in enumerate(picture) if c == "x"
+        )
+    game.bitboard.refresh_tops()
+    game.bitboard.rehash()
+    game.ghost_distance = None
+    return game
+
+
+def put(game: TetrisEngine, shape: TetriminoShape, rot: int, row: int, col: int) -> None:
+    tetrimino = Tetrimino(shape)
+    tetrimino.rot, tetrimino.row, tetrimino.col = rot, row, col
+    game.cur_tetrimino = tetrimino
+    game.ghost_distance = None
+    game.shadow_key = None
+
+
+def put_in_well(game: TetrisEngine) -> None:
+    """a vertical I at the bottom of the last column"""
+    cells = CELL_TABLE[TetriminoShape.I.value][1]
+    dx = max(x for x, _ in cells)
+    put(game, TetriminoShape.I, 1, BOARD_HEIGHT - 1 - dx, BOARD_WIDTH - 1 - cells[0][1])
+
+
+def best(measure: Callable[[], float], repeat: int) -> float:
+    return min(measure() for _ in range(repeat))
+
+
+def batch(op: Callable[[], object], number: int) -> Callable[[], float]:
+    """time `number` calls at once, for operations without side effects"""
+
+    def measure() -> float:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            op()
+        return (time.perf_counter_ns() - start) / number
+
+    return measure
+
+
+def each(
+    reset: Callable[[], object], op: Callable[[], object], number: int
+) -> Callable[[], float]:
+    """time `op` alone, after an untimed `reset` before every call"""
+
+    def measure() -> float:
+        total = 0
+        clock = time.perf_counter_ns
+        for _ in range(number):
+            reset()
+            start = clock()
+            op()
+            total += clock() - start
+        return total / number
+
+    return measure
+
+
+def kicked_rotation(game: TetrisEngine, shape: TetriminoShape) -> tuple[int, int, int]:
+    """a (rot, row, col) on the board where a cw turn takes the most SRS kicks
+    to fit"""
+    no = shape.value
+    collides = game.bitboard.collides
+    found = (0, 0, 0)
+    most = -1
+    for rot in range(4):
+        kicks = KICK_TABLE[no][rot][False]
+        next_mask = MASK_TABLE[no][(rot + 1) & 3]
+        for row in range(20, BOARD_HEIGHT):
+            for col in range(-2, BOARD_WIDTH):
+                if collides(MASK_TABLE[no][rot], row, col):
+                    continue
+                for i in range(0, len(kicks), 2):
+                    if not collides(next_mask, row + kicks[i], col + kicks[i + 1]):
+                        if i > most:
+                            most = i
+                            found = (rot, row, col)
+                        break
+    return found
+
+
+def cases(repeat: int) -> list[Case]:
+    res = []
+
+    for name, rows in (("stacked", STACKED), ("near_top_out", NEAR_TOP_OUT)):
+        game = board(rows)
+        put(game, TetriminoShape.T, 0, 21, 4)
+        for direction in ("left", "right", "down"):
+            check = getattr(game, f"check_can_move_{direction}")
+            res.append(
+                Case(
+                    f"check_can_move_{direction}/{name}",
+                    lambda check=check: best(batch(check, 20_000), repeat),
+                )
+            )
+
+    for name, rows, shape in (
+        ("t_spin", T_SPIN, TetriminoShape.T),
+        ("stacked", STACKED, TetriminoShape.J),
+        ("near_top_out", NEAR_TOP_OUT, TetriminoShape.I),
+    ):
+        game = board(rows)
+        state = kicked_rotation(game, shape)
+
+        def reset(game=game, shape=shape, state=state) -> None:
+            put(game, shape, *state)
+
+        res.append(
+            Case(
+                f"do_rotate_kicked/{name}",
+                lambda reset=reset, game=game: best(
+                    each(reset, game.do_rotate_cw, 5_000), repeat
+                ),
+            )
+        )
+
+    game = board(TETRIS)
+    put_in_well(game)
+    for x, y in game.cur_tetrimino:
+        row = game.board[x]
+        game.board[x] = row[:y] + (TetriminoShape.I.value,) + row[y + 1 :]
+    game.bitboard.place(game.cur_tetrimino.mask, 36, 7)
+    state = game.snapshot()
+    res.append(
+        Case(
+            "line_clear/tetris",
+            lambda: best(each(lambda: game.restore(state), game.line_clear, 2_000), repeat),
+        )
+    )
+
+    for name, rows in (
+        ("stacked", STACKED),
+        ("near_top_out", NEAR_TOP_OUT),
+        ("empty", []),
+    ):
+        game = board(rows)
+        put(game, TetriminoShape.L, 0, 19, 3)
+
+        def reset(game=game) -> None:
+            game.ghost_distance = None
+            game.shadow_key = None
+
+        res.append(
+            Case(
+                f"handle_shadow/{name}",
+                lambda reset=reset, game=game: best(
+                    each(reset, game.handle_shadow, 10_000), repeat
+                ),
+            )
+        )
+
+    # lock a T into the slot after a rotation: a t-spin double
+    game = board(T_SPIN)
+    dx, dy = CELL_TABLE[TetriminoShape.T.value][2][1]
+    put(game, TetriminoShape.T, 2, 38 - dx, 2 - dy)
+    game.last_move = game.Movement.ROTATE
+    t_spin = game.snapshot()
+    game = board(TETRIS)
+    put_in_well(game)
+    tetris = game.snapshot()
+    for name, state in (("t_spin_double", t_spin), ("tetris", tetris)):
+        res.append(
+            Case(
+                f"lock_down/{name}",
+                lambda game=game, state=state: best(
+                    each(lambda: game.restore(state), game.lock_down, 2_000), repeat
+                ),
+            )
+        )
+    for state, lines, t_spins in ((t_spin, 2, 1), (tetris, 4, 0)):
+        check = TetrisEngine(0)
+        check.restore(state)
+        check.lock_down()
+        assert (check.lines, check.t_spins) == (lines, t_spins), "broken fixture"
+
+    states = scripted_frames(300)
+    renderer = CursesRenderer(FakeWindow())  # type: ignore[arg-type]
+    renderer.colors = list(range(GARBAGE + 1))
+    frames = iter(())
+
+    def next_frame() -> None:
+        nonlocal frames
+        state = next(frames, None)
+        if state is None:
+            frames = iter(states)
+            state = next(frames)
+        game.restore(state)
+
+    res.append(
+        Case(
+            "draw_board/fake_window",
+            lambda: best(each(next_frame, lambda: renderer.draw(game), 900), repeat),
+        )
+    )
+
+    res.append(Case("game/steps_per_second", lambda: best(game_speed, repeat), "steps/s"))
+    return res
+
+
+class FakeWindow:
+    """takes the curses calls of a renderer and does nothing"""
+
+    def addstr(self, *args: object) -> None:
+        pass
+
+    def refresh(self) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+# how often a scripted player presses each key, one key at most per step
+WEIGHTS = {
+    Action.MOVE_LEFT: 6,
+    Action.MOVE_RIGHT: 6,
+    Action.SOFT_DROP: 3,
+    Action.HARD_DROP: 1,
+    Action.ROTATE_CW: 3,
+    Action.ROTATE_CCW: 2,
+    Action.HOLD: 1,
+}
+IDLE = 30
+
+
+def script(rng: random.Random, steps: int) -> list[list[Action]]:
+    """the inputs of a player mashing keys, nothing on most steps"""
+    keys = [[]] * IDLE + [[a] for a in WEIGHTS]
+    weights = [1] * IDLE + list(WEIGHTS.values())
+    return rng.choices(keys, weights, k=steps)
+
+
+def scripted_frames(count: int) -> list:
+    game = TetrisEngine(SEED)
+    game.init_game()
+    res = []
+    for i, actions in enumerate(script(random.Random(SEED), count)):
+        if game.failed:
+            game = TetrisEngine(SEED + i)
+            game.init_game()
+        game.step(actions, 1 / 50)
+        res.append(game.snapshot())
+    return res
+
+
+def game_speed(steps: int = 20_000) -> float:
+    """steps per second of headless games on a scripted input stream, a new
+    game starts when one is lost"""
+    inputs = script(random.Random(SEED), steps)
+    game = TetrisEngine(SEED)
+    game.init_game()
+    seed = SEED
+    start = time.perf_counter()
+    for actions in inputs:
+        if game.failed:
+            seed += 1
+            game = TetrisEngine(seed)
+            game.init_game()
+        game.step(actions, 1 / 60)
+    # best() keeps the smallest, so return the time per step
+    return (time.perf_counter() - start) / steps
+
+
+def run(pattern: str, repeat: int) -> dict[str, dict]:
+    results = {}
+    for case in cases(repeat):
+        if pattern not in case.name:
+            continue
+        value = case.run()
+        if case.unit == "steps/s":
+            value = 1 / value
+        results[case.name] = {"value": round(value, 1), "unit": case.unit}
+        print(f"{case.name:<36} {value:>12.1f} {case.unit}", flush=True)
+    return results
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """print the comparison, return the cases that got slower"""
+    res = []
+    print(f"\n{'case':<36} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], result["value"]
+        # positive is slower
+        change = old / new - 1 if result["unit"] == "steps/s" else new / old - 1
+        flag = ""
+        if change > threshold:
+            flag = "  slower"
+            res.append(name)
+        print(f"{name:<36} {old:>12.1f} {new:>12.1f} {change:>+7.1%}{flag}")
+    return res
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k", dest="pattern", default="", help="only cases matching")
+    parser.add_argument("--repeat", type=int, default=5, help="best of how many runs")
+    parser.add_argument("--json", metavar="PATH", help="write the results")
+    parser.add_argument("--baseline", default=BASELINE, metavar="PATH")
+    parser.add_argument("--save", action="store_true", help="make these the baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="fail when a case is slower by more than this fraction",
+    )
+    args = parser.parse_args()
+
+    results = run(args.pattern, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}, store one with --save")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    slower = regressions(results, baseline["results"], args.threshold)
+    if slower:
+        print(f"\n{len(slower)} case(s) slower than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
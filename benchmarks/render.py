@@ -0,0 +1,145 @@
+"""compare the curses and the ANSI renderer on the same frames
+
+a scripted game is simulated first and every frame is kept as a snapshot.
+both renderers then draw those frames to a pseudo terminal, which counts the
+bytes each one wrote, while the time per frame is measured around
+`Renderer.draw`, flushing to the terminal included.
+
+    python benchmarks/render.py [--frames 2000] [--json results.json]
+"""
+
+import argparse
+import curses
+import json
+import os
+import pty
+import random
+import statistics
+import struct
+import sys
+import tempfile
+import time
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # windows, no pseudo terminals
+    sys.exit("needs a pseudo terminal, run it on linux or macos")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from tetris.bot import Bot  # noqa: E402
+from tetris.engine import Action, GameState, TetrisEngine  # noqa: E402
+from tetris.render import AnsiRenderer, CursesRenderer, Renderer  # noqa: E402
+from tetris.tetris import Tetris  # noqa: E402
+
+BACKENDS = ["curses", "ansi"]
+MARK = b"\x1b]bench;%s\x07"  # an OSC sequence, terminals ignore it
+
+
+def frames(count: int, seed: int) -> list[GameState]:
+    """snapshots of a game the bot plays with some noise, one per frame"""
+    game = TetrisEngine(seed)
+    game.init_game()
+    bot = Bot(budget=0.001, max_depth=1)
+    rng = random.Random(seed)
+    res = []
+    while len(res) < count:
+        if game.failed:
+            game = TetrisEngine(rng.getrandbits(32))
+            game.init_game()
+        # a few moves per frame, as a player would make
+        actions = bot.actions(game) or [rng.choice(list(Action)[:3])]
+        game.step(actions[:3], 1 / 50)
+        res.append(game.snapshot())
+    return res
+
+
+def render(stdscr: curses.window, states: list[GameState], out: str) -> None:
+    Tetris.init_color()
+    curses.curs_set(0)
+    game = TetrisEngine(0)
+    results = {}
+    for backend in BACKENDS:
+        renderer: Renderer
+        if backend == "ansi":
+            renderer = AnsiRenderer(stdscr)
+        else:
+            renderer = CursesRenderer(stdscr)
+        # the first frame draws the chrome, leave it out
+        game.restore(states[0])
+        renderer.invalidate()
+        renderer.draw(game)
+        os.write(sys.stdout.fileno(), MARK % backend.encode())
+        times = []
+        for state in states[1:]:
+            game.restore(state)
+            start = time.perf_counter()
+            renderer.draw(game)
+            times.append(time.perf_counter() - start)
+        os.write(sys.stdout.fileno(), MARK % b"end")
+        results[backend] = times
+    with open(out, "w") as f:
+        json.dump(results, f)
+
+
+def child(count: int, seed: int, out: str) -> None:
+    os.environ["TERM"] = "xterm-256color"
+    states = frames(count + 1, seed)
+    curses.wrapper(render, states, out)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write the results")
+    args = parser.parse_args()
+
+    fd, out = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    pid, master = pty.fork()
+    if pid == 0:
+        child(args.frames, args.seed, out)
+        os._exit(0)
+    fcntl.ioctl(master, termios.TIOCSWINSZ, struct.pack("HHHH", 24, 80, 0, 0))
+
+    data = bytearray()
+    while True:
+        try:
+            chunk = os.read(master, 1 << 16)
+        except OSError:  # the child closed the terminal
+            break
+        if not chunk:
+            break
+        data += chunk
+    os.waitpid(pid, 0)
+    with open(out) as f:
+        times = json.load(f)
+    os.unlink(out)
+
+    results = {}
+    print(f"{args.frames} frames     bytes/frame   mean us   p50 us   p99 us")
+    for backend in BACKENDS:
+        start = data.index(MARK % backend.encode()) + len(MARK % backend.encode())
+        end = data.index(MARK % b"end", start)
+        samples = sorted(times[backend])
+        results[backend] = {
+            "bytes_per_frame": (end - start) / len(samples),
+            "mean_us": statistics.fmean(samples) * 1e6,
+            "p50_us": samples[len(samples) // 2] * 1e6,
+            "p99_us": samples[int(len(samples) * 0.99)] * 1e6,
+        }
+        r = results[backend]
+        print(
+            f"{backend:<16} {r['bytes_per_frame']:>11.1f} {r['mean_us']:>9.1f}"
+            f" {r['p50_us']:>8.1f} {r['p99_us']:>8.1f}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
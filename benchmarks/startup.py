@@ -0,0 +1,121 @@
+"""how long importing each entry point takes, from `python -X importtime`
+
+every module is imported in a fresh interpreter, the best of a few runs is
+reported: the whole import and the part spent in tetris' own modules. the
+script fails when a headless module pulls in curses, simulation workers and
+tools must start without the terminal front end, or when tetris' own part
+of it goes over `BUDGET_MS`.
+
+    python benchmarks/startup.py [--repeat 5] [--json results.json]
+"""
+
+import argparse
+import compileall
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+HEADLESS = [
+    "tetris",
+    "tetris.engine",
+    "tetris.bot",
+    "tetris.sim",
+    "tetris.solver",
+    "tetris.replay",
+    "tetris.controls",
+    "tetris.sequence",
+    "tetris.placement",
+    "tetris.vector",
+    "tetris.archive",
+    "tetris.store",
+]
+FRONT_END = ["tetris.tetris", "tetris.cli"]
+# the optional dependency a module can not be imported without
+REQUIRES = {"tetris.vector": "numpy"}
+BUDGET_MS = 25  # of tetris' own modules in a headless import
+
+
+def missing(module: str) -> str | None:
+    """the optional dependency of `module` that is not installed"""
+    requires = REQUIRES.get(module)
+    if requires is not None and importlib.util.find_spec(requires) is None:
+        return requires
+    return None
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """(self, cumulative) us of every module imported by `import module`"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    res = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, total, name = line[len("import time:") :].split("|")
+        if own.strip().isdigit():
+            res[name.strip()] = (int(own), int(total))
+    return res
+
+
+def measure(module: str, repeat: int) -> dict:
+    runs = [import_times(module) for _ in range(repeat)]
+    best = min(runs, key=lambda times: sum(own for own, _ in times.values()))
+    return {
+        "total_ms": sum(own for own, _ in best.values()) / 1000,
+        "tetris_ms": sum(
+            own for name, (own, _) in best.items() if name.split(".")[0] == "tetris"
+        )
+        / 1000,
+        "curses": "curses" in best or "_curses" in best,
+        "slowest": sorted(best, key=lambda name: best[name][0], reverse=True)[:3],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="best of how many runs")
+    parser.add_argument("--json", metavar="PATH", help="write the results")
+    args = parser.parse_args()
+
+    # time the imports, not compiling them
+    compileall.compile_dir(SRC, quiet=1)
+    print(f"{'import':<18} {'total':>9} {'tetris':>9}  curses  slowest modules")
+    results = {}
+    failed = []
+    slow = []
+    for module in HEADLESS + FRONT_END:
+        requires = missing(module)
+        if requires is not None:
+            print(f"{module:<18} skipped, {requires} is not installed")
+            continue
+        result = results[module] = measure(module, args.repeat)
+        print(
+            f"{module:<18} {result['total_ms']:7.1f}ms {result['tetris_ms']:7.1f}ms"
+            f"  {'yes' if result['curses'] else 'no':<6}  {', '.join(result['slowest'])}"
+        )
+        if module in HEADLESS and result["curses"]:
+            failed.append(module)
+        if module in HEADLESS and result["tetris_ms"] > BUDGET_MS:
+            slow.append(module)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version, "results": results}, f, indent=2)
+    if failed:
+        print(f"\n{', '.join(failed)} import curses, keep it to the front end")
+    if slow:
+        print(f"\n{', '.join(slow)} take over {BUDGET_MS}ms in tetris' own modules")
+    return 1 if failed or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""load and latency of the versus server over localhost
+
+the server runs in its own process, as `tetris serve` does. every simulated
+player joins it, sends a few random inputs each interval and a PING right
+behind them, the server answers with a PONG once the inputs before it were
+applied and their frame was queued. the round trip of a PING is the latency a
+player feels, it grows as the server falls behind. players of a finished
+match join the next one.
+
+    python benchmarks/versus.py [--matches 24] [--seconds 10] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from tetris.engine import Action  # noqa: E402
+from tetris.net import (  # noqa: E402
+    FRAME,
+    HELLO,
+    INPUT,
+    MESSAGE,
+    OVER,
+    PING,
+    PONG,
+    START,
+    message,
+    read_message,
+)
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+CLOCK = struct.Struct("<Q")  # the PING payload, perf_counter_ns when sent
+# mostly moves, a hard drop now and then so the boards fill up slowly
+MOVES = [Action.MOVE_LEFT, Action.MOVE_RIGHT, Action.ROTATE_CW, Action.ROTATE_CCW]
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.rtts: list[float] = []  # ms
+        self.frames = 0
+        self.received = 0  # bytes
+        self.matches = 0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def player(
+    port: int, interval: float, drop: float, deadline: float, stats: Stats
+) -> None:
+    """join matches until the deadline, one after the other"""
+    loop = asyncio.get_running_loop()
+    rng = random.Random()
+    while loop.time() < deadline:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(message(HELLO, b"bench"))
+        started = asyncio.Event()
+
+        async def send() -> None:
+            await started.wait()
+            while True:
+                actions = bytes(
+                    (Action.HARD_DROP if rng.random() < drop else rng.choice(MOVES)).value
+                    for _ in range(rng.randint(1, 3))
+                )
+                writer.write(
+                    message(INPUT, actions)
+                    + message(PING, CLOCK.pack(time.perf_counter_ns()))
+                )
+                await asyncio.sleep(interval)
+
+        sender = asyncio.create_task(send())
+        try:
+            while loop.time() < deadline:
+                kind, payload = await asyncio.wait_for(
+                    read_message(reader), deadline - loop.time()
+                )
+                stats.received += MESSAGE.size + len(payload)
+                if kind == START:
+                    started.set()
+                    stats.matches += 1
+                elif kind == FRAME:
+                    stats.frames += 1
+                elif kind == PONG:
+                    (sent,) = CLOCK.unpack(payload)
+                    stats.rtts.append((time.perf_counter_ns() - sent) / 1e6)
+                elif kind == OVER:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+
+async def load(args: argparse.Namespace, port: int) -> Stats:
+    stats = Stats()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + args.seconds
+    await asyncio.gather(
+        *(
+            player(port, args.interval / 1000, args.drop, deadline, stats)
+            for _ in range(args.matches * args.players)
+        )
+    )
+    return stats
+
+
+def percentile(values: list[float], p: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=24, help="concurrent matches")
+    parser.add_argument("--players", type=int, default=2, help="players per match")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument(
+        "--interval", type=float, default=100, help="ms between the inputs of a player"
+    )
+    parser.add_argument(
+        "--drop", type=float, default=0.1, help="chance an input is a hard drop"
+    )
+    parser.add_argument(
+        "--max-p99", type=float, metavar="MS", help="fail when p99 latency is higher"
+    )
+    parser.add_argument("--json", metavar="PATH", help="write the results")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "tetris.cli", "serve", "--host", "127.0.0.1"]
+        + ["--port", str(port), "--players", str(args.players)],
+        env=dict(os.environ, PYTHONPATH=SRC),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert server.stdout is not None
+        server.stdout.readline()  # listening on ...
+        stats = asyncio.run(load(args, port))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if not stats.rtts:
+        print("no PONG came back, is the server running?")
+        return 1
+    result = {
+        "players": args.matches * args.players,
+        "matches": stats.matches // args.players,
+        "frames_per_s": stats.frames / args.seconds,
+        "kib_per_s": stats.received / args.seconds / 1024,
+        "pings": len(stats.rtts),
+        "p50_ms": statistics.median(stats.rtts),
+        "p99_ms": percentile(stats.rtts, 99),
+        "max_ms": max(stats.rtts),
+    }
+    print(
+        f"{result['players']} players, {result['matches']} matches in {args.seconds:g}s"
+    )
+    print(
+        f"received {result['frames_per_s']:.0f} frames/s, "
+        f"{result['kib_per_s']:.1f} KiB/s"
+    )
+    print(
+        f"latency of {result['pings']} pings: p50 {result['p50_ms']:.2f}ms"
+        f"  p99 {result['p99_ms']:.2f}ms  max {result['max_ms']:.2f}ms"
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version, "args": vars(args), **result}, f, indent=2)
+    if args.max_p99 is not None and result["p99_ms"] > args.max_p99:
+        print(f"p99 latency is over {args.max_p99:g}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,21 @@
-from .tetris import Tetris, GAME_WINDOW_SIZE_HEIGHT, GAME_WINDOW_SIZE_WIDTH
+from .engine import Action, TetrisEngine
 
-__all__ = ["Tetris", "GAME_WINDOW_SIZE_HEIGHT", "GAME_WINDOW_SIZE_WIDTH"]
+__all__ = [
+    "Action",
+    "Tetris",
+    "TetrisEngine",
+    "GAME_WINDOW_SIZE_HEIGHT",
+    "GAME_WINDOW_SIZE_WIDTH",
+]
+
+# the terminal front end imports curses, headless tools and simulation workers
+# only load it when they ask for it
+FRONT_END = ("Tetris", "GAME_WINDOW_SIZE_HEIGHT", "GAME_WINDOW_SIZE_WIDTH")
+
+
+def __getattr__(name: str):
+    if name in FRONT_END:
+        from . import tetris
+
+        return getattr(tetris, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,461 @@
+import argparse
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from typing import Iterable, Iterator, NamedTuple
+
+from .bitboard import BOARD_HEIGHT, BOARD_WIDTH
+from .engine import EMPTY, GameState, TetriminoShape, TetrisEngine
+from .replay import Replay
+from .sequence import PieceSequence
+
+# archive layout, only ever appended to
+#   header : magic, version
+#   entries: one per game
+#            entry header: magic, replay length, keyframes, crc32 of the
+#                          keyframe table and states
+#            the replay file as it was recorded
+#            keyframe table: (steps, events offset, elapsed ms, state offset,
+#                            state length) of every keyframe
+#            keyframe states, each a zlib compressed `STATE` and the garbage
+# index (the archive path + ".idx"), one fixed size record per game, appended
+# after its entry is written so a game is only listed once it is complete:
+#   entry offset, entry size, seed, steps, duration (ms), score, lines
+MAGIC = b"TTAR"
+ENTRY_MAGIC = b"TTAE"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+ENTRY = struct.Struct("<4sIII")
+KEYFRAME = struct.Struct("<IIQII")
+INDEX = struct.Struct("<QIQIQdI")
+STATE = struct.Struct(
+    # board cells, bitboard rows, tops and hash, tetrimino, bag, hold, bags
+    # drawn, score and lines, timers and counters, pending garbage count
+    f"<{BOARD_HEIGHT * BOARD_WIDTH}s{BOARD_HEIGHT}H{BOARD_WIDTH}BQ"
+    "4b15sB?IdIIB??ddH?hBIIIB"
+)
+GARBAGE = struct.Struct("<BB")
+KEYFRAME_INTERVAL = 5000  # ms of game time between two keyframes
+
+
+class GameInfo(NamedTuple):
+    offset: int
+    size: int
+    seed: int
+    steps: int
+    duration: int  # ms
+    score: float
+    lines: int
+
+
+def encode_state(state: GameState, bags: int) -> bytes:
+    """a snapshot as bytes, the piece sequence is stored as the number of
+    bags drawn from it"""
+    no, rot, row, col = state.tetrimino or (EMPTY, 0, 0, 0)
+    data = STATE.pack(
+        b"".join(bytes(cells) for cells in state.board),
+        *state.rows,
+        *state.tops,
+        state.hash,
+        no,
+        rot,
+        row,
+        col,
+        bytes((len(state.bag),)) + state.bag,
+        state.hold,
+        state.hold_once,
+        bags,
+        state.score,
+        state.lines,
+        state.lines_for_level,
+        state.level,
+        state.b2b_bones,
+        state.failed,
+        state.normal_fall_timer,
+        state.lock_down_timer,
+        state.lock_down_rotate_counter,
+        state.reach_bottom,
+        state.lowest,
+        state.last_move.value,
+        state.pieces,
+        state.t_spins,
+        state.sent,
+        len(state.garbage),
+    )
+    garbage = b"".join(GARBAGE.pack(*pending) for pending in state.garbage)
+    return zlib.compress(data + garbage)
+
+
+def decode_state(data: bytes, seed: int) -> GameState:
+    """the snapshot `encode_state` stored, for a game dealt from `seed`"""
+    data = zlib.decompress(data)
+    values = STATE.unpack_from(data)
+    board = values[0]
+    rows = values[1 : 1 + BOARD_HEIGHT]
+    i = 1 + BOARD_HEIGHT
+    tops = values[i : i + BOARD_WIDTH]
+    i += BOARD_WIDTH
+    (
+        hash,
+        no,
+        rot,
+        row,
+        col,
+        bag,
+        hold,
+        hold_once,
+        bags,
+        score,
+        lines,
+        lines_for_level,
+        level,
+        b2b_bones,
+        failed,
+        normal_fall_timer,
+        lock_down_timer,
+        lock_down_rotate_counter,
+        reach_bottom,
+        lowest,
+        last_move,
+        pieces,
+        t_spins,
+        sent,
+        garbage,
+    ) = values[i:]
+    sequence = PieceSequence(seed)
+    for _ in range(bags):
+        sequence.next_bag()
+    return GameState(
+        tuple(
+            tuple(board[x : x + BOARD_WIDTH])
+            for x in range(0, BOARD_HEIGHT * BOARD_WIDTH, BOARD_WIDTH)
+        ),
+        rows,
+        tops,
+        hash,
+        (no, rot, row, col) if no != EMPTY else None,
+        bag[1 : 1 + bag[0]],
+        hold,
+        hold_once,
+        sequence.getstate(),
+        score,
+        lines,
+        lines_for_level,
+        level,
+        b2b_bones,
+        failed,
+        normal_fall_timer,
+        lock_down_timer,
+        lock_down_rotate_counter,
+        reach_bottom,
+        lowest,
+        TetrisEngine.Movement(last_move),
+        pieces,
+        t_spins,
+        tuple(GARBAGE.iter_unpack(data[STATE.size :][: garbage * GARBAGE.size])),
+        sent,
+    )
+
+
+def keyframes(
+    replay: Replay, interval: int = KEYFRAME_INTERVAL
+) -> tuple[list[tuple[int, int, int]], list[bytes]]:
+    """simulate a replay, keeping (steps, events offset, elapsed ms) and the
+    state every `interval` ms of game time and before the first step"""
+    game = TetrisEngine(replay.seed)
+    game.init_game()
+
+    table = [(0, 0, 0)]
+    states = [encode_state(game.snapshot(), game.sequence.bags)]
+    steps = elapsed = 0
+    due = interval
+    for offset, delta, actions in replay.steps_from():
+        game.step(actions, delta / 1000)
+        steps += 1
+        elapsed += delta
+        if elapsed >= due:
+            table.append((steps, offset, elapsed))
+            states.append(encode_state(game.snapshot(), game.sequence.bags))
+            due = elapsed + interval
+    return table, states
+
+
+class ArchivedGame:
+    """one game of an archive, its replay and keyframes are read from the
+    archive's mmap when they are needed"""
+
+    def __init__(self, info: GameInfo, data: memoryview) -> None:
+        self.info = info
+        magic, length, count, crc = ENTRY.unpack_from(data)
+        if magic != ENTRY_MAGIC:
+            raise ValueError("archive entry is corrupt")
+        start = ENTRY.size + length
+        self.extra = data[start:]
+        if crc != zlib.crc32(self.extra):
+            raise ValueError("archive keyframes are corrupt")
+        self.replay = Replay(data[ENTRY.size : start])
+        self.keyframes = list(KEYFRAME.iter_unpack(self.extra[: count * KEYFRAME.size]))
+        self.states = self.extra[count * KEYFRAME.size :]
+
+    def restore(self, keyframe: int) -> TetrisEngine:
+        """a game at the `keyframe`-th keyframe"""
+        _, _, _, offset, length = self.keyframes[keyframe]
+        game = TetrisEngine(self.info.seed)
+        state = decode_state(self.states[offset : offset + length], self.info.seed)
+        game.restore(state)
+        return game
+
+    def at_step(self, step: int) -> TetrisEngine:
+        """the game after its first `step` steps"""
+        if step < 0:
+            raise ValueError("step can not be negative")
+        i = bisect.bisect_right(self.keyframes, step, key=lambda k: k[0]) - 1
+        steps, start, _, _, _ = self.keyframes[i]
+        game = self.restore(i)
+        for _, delta, actions in self.replay.steps_from(start):
+            if steps == step:
+                break
+            game.step(actions, delta / 1000)
+            steps += 1
+        return game
+
+    def at_time(self, ms: int) -> TetrisEngine:
+        """the game after the steps within its first `ms` ms"""
+        if ms < 0:
+            raise ValueError("time can not be negative")
+        i = bisect.bisect_right(self.keyframes, ms, key=lambda k: k[2]) - 1
+        _, start, elapsed, _, _ = self.keyframes[i]
+        game = self.restore(i)
+        for _, delta, actions in self.replay.steps_from(start):
+            elapsed += delta
+            if elapsed > ms:
+                break
+            game.step(actions, delta / 1000)
+        return game
+
+
+class Archive:
+    """many replays in one file, read through mmap
+
+    listing and filtering games only reads the fixed size index records,
+    a game's replay and keyframes are only touched when it is opened, and
+    seeking restores the nearest keyframe before re-simulating the rest.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.data = self.map(path)
+        self.index = self.map(path + ".idx")
+        if len(self.data) and HEADER.unpack_from(self.data) != (MAGIC, VERSION):
+            raise ValueError("not a replay archive, or an unsupported version")
+
+    @staticmethod
+    def map(path: str) -> mmap.mmap | bytes:
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b""  # an empty file can not be mapped
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.index) // INDEX.size
+
+    def __iter__(self) -> Iterator[GameInfo]:
+        """every game's index record, in the order they were added"""
+        records = memoryview(self.index)[: len(self) * INDEX.size]
+        for record in INDEX.iter_unpack(records):
+            yield GameInfo(*record)
+
+    def info(self, i: int) -> GameInfo:
+        if not -len(self) <= i < len(self):
+            raise IndexError("archive index out of range")
+        return GameInfo(*INDEX.unpack_from(self.index, i % len(self) * INDEX.size))
+
+    def __getitem__(self, i: int) -> ArchivedGame:
+        info = self.info(i)
+        data = memoryview(self.data)[info.offset : info.offset + info.size]
+        return ArchivedGame(info, data)
+
+    def close(self) -> None:
+        for mapped in (self.data, self.index):
+            if isinstance(mapped, mmap.mmap):
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass  # a game still reads from it, unmapped when it is gone
+        self.data = self.index = b""
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class ArchiveWriter:
+    """appends replays to an archive, creating it when it does not exist"""
+
+    def __init__(self, path: str, interval: int = KEYFRAME_INTERVAL) -> None:
+        self.interval = interval
+        self.file = open(path, "ab")
+        self.index = open(path + ".idx", "ab")
+        if not self.file.tell():
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+        elif self.index.tell() % INDEX.size:
+            raise ValueError(f"{path}.idx is corrupt, rebuild it with `reindex`")
+
+    def add(self, data: bytes) -> GameInfo:
+        """append a recorded replay file, its keyframes are computed here"""
+        replay = Replay(data)
+        table, states = keyframes(replay, self.interval)
+        offsets = []
+        offset = 0
+        for state in states:
+            offsets.append(offset)
+            offset += len(state)
+        extra = b"".join(
+            KEYFRAME.pack(steps, events, elapsed, offsets[i], len(states[i]))
+            for i, (steps, events, elapsed) in enumerate(table)
+        ) + b"".join(states)
+        entry = ENTRY.pack(ENTRY_MAGIC, len(data), len(table), zlib.crc32(extra))
+        info = GameInfo(
+            self.file.tell(),
+            len(entry) + len(data) + len(extra),
+            replay.seed,
+            replay.steps,
+            replay.duration,
+            replay.score,
+            replay.lines,
+        )
+        self.file.write(entry)
+        self.file.write(data)
+        self.file.write(extra)
+        # the index only lists the game once the entry is on disk
+        self.file.flush()
+        self.index.write(INDEX.pack(*info))
+        self.index.flush()
+        return info
+
+    def close(self) -> None:
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def reindex(path: str) -> int:
+    """rewrite the index from the archive, e.g. after a crash between
+    writing an entry and its index record. a torn last entry is cut off"""
+    with open(path, "rb") as f:
+        data = f.read()
+    games = []
+    offset = HEADER.size
+    while offset + ENTRY.size <= len(data):
+        magic, length, count, _ = ENTRY.unpack_from(data, offset)
+        if magic != ENTRY_MAGIC:
+            break
+        table = offset + ENTRY.size + length
+        states = table + count * KEYFRAME.size
+        if not count or states > len(data):
+            break
+        _, _, _, last, size = KEYFRAME.unpack_from(data, states - KEYFRAME.size)
+        end = states + last + size
+        if end > len(data):
+            break
+        info = GameInfo(offset, end - offset, 0, 0, 0, 0, 0)
+        try:
+            replay = ArchivedGame(info, memoryview(data)[offset:end]).replay
+        except ValueError:
+            break
+        games.append(
+            GameInfo(
+                offset,
+                end - offset,
+                replay.seed,
+                replay.steps,
+                replay.duration,
+                replay.score,
+                replay.lines,
+            )
+        )
+        offset = end
+    if offset < len(data):
+        with open(path, "r+b") as f:
+            f.truncate(offset)
+    with open(path + ".idx", "wb") as f:
+        for info in games:
+            f.write(INDEX.pack(*info))
+    return len(games)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m tetris.archive", description="many replays in one file"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    adder = commands.add_parser("add", help="append replay files to an archive")
+    adder.add_argument("archive")
+    adder.add_argument("replays", nargs="+")
+    adder.add_argument(
+        "--interval", type=int, default=KEYFRAME_INTERVAL, help="ms between keyframes"
+    )
+    lister = commands.add_parser("list", help="the games of an archive")
+    lister.add_argument("archive")
+    lister.add_argument("--top", type=int, help="only the best games by score")
+    seeker = commands.add_parser("seek", help="show a game at a moment")
+    seeker.add_argument("archive")
+    seeker.add_argument("game", type=int, help="its position in the archive")
+    seeker.add_argument("seconds", type=float, help="game time")
+    fixer = commands.add_parser("reindex", help="rebuild the index of an archive")
+    fixer.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        with ArchiveWriter(args.archive, args.interval) as writer:
+            for path in args.replays:
+                try:
+                    with open(path, "rb") as f:
+                        info = writer.add(f.read())
+                except (OSError, ValueError) as e:
+                    print(f"{path}: {e}")
+                    continue
+                print(f"{path}: {info.steps} steps, {info.score:.0f} points")
+        return 0
+    if args.command == "reindex":
+        print(f"{reindex(args.archive)} games")
+        return 0
+
+    with Archive(args.archive) as archive:
+        if args.command == "list":
+            games: Iterable[tuple[int, GameInfo]] = enumerate(archive)
+            if args.top:
+                games = heapq.nlargest(args.top, games, key=lambda game: game[1].score)
+            for i, info in games:
+                print(
+                    f"{i:>8} seed {info.seed:>10} {info.duration / 1000:8.1f}s"
+                    f" {info.score:>9.0f} points {info.lines:>5} lines"
+                )
+            return 0
+
+        try:
+            game = archive[args.game].at_time(int(args.seconds * 1000))
+        except ValueError as e:
+            parser.error(str(e))
+        names = {shape.value: shape.name for shape in TetriminoShape}
+        for row in game.board[BOARD_HEIGHT // 2 :]:
+            cells = "".join(names.get(cell, "#") if cell else "." for cell in row)
+            print(f"|{cells}|")
+        print(f"score {game.score:.0f}  lines {game.lines}  level {game.level}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
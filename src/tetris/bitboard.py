@@ -0,0 +1,185 @@
+import random
+
+BOARD_HEIGHT = 40
+BOARD_WIDTH = 10
+
+FULL_ROW = (1 << BOARD_WIDTH) - 1
+
+# zobrist keys of the filled cells, from a fixed seed so hashes are the same
+# in every process
+_keys = random.Random(0x7E7)
+CELL_KEYS = [
+    [_keys.getrandbits(64) for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)
+]
+
+# (top, left, height, width, bits, bottoms) of a tetrimino in one rotation
+# state: the offset of its bounding box from the tetrimino origin, the box
+# size, bits[i], the occupancy of the i-th box row with the box's left edge at
+# bit 0, and bottoms[j], the lowest occupied box row of the j-th box column
+PieceMask = tuple[int, int, int, int, tuple[int, ...], tuple[int, ...]]
+
+
+def piece_mask(cells: list[tuple[int, int]]) -> PieceMask:
+    """pack cells, given relative to the tetrimino origin, into row masks"""
+    top = min(x for x, _ in cells)
+    left = min(y for _, y in cells)
+    height = max(x for x, _ in cells) - top + 1
+    width = max(y for _, y in cells) - left + 1
+    bits = [0] * height
+    bottoms = [0] * width
+    for x, y in cells:
+        bits[x - top] |= 1 << (y - left)
+        bottoms[y - left] = max(bottoms[y - left], x - top)
+    return top, left, height, width, tuple(bits), tuple(bottoms)
+
+
+def compact(rows: list, full: list[int], top: int, empty: object) -> None:
+    """remove `rows[x]` for every x in `full` (ascending) and move the rows
+    from `top` down over them in one pass, rows above `top` must be empty"""
+    bottom = full[-1] + 1
+    cleared = set(full)
+    rows[top + len(full) : bottom] = [
+        rows[x] for x in range(top, bottom) if x not in cleared
+    ]
+    rows[top : top + len(full)] = [empty] * len(full)
+
+
+class Bitboard:
+    """occupancy of the locked cells, one int per row
+
+    bit `y` of `rows[x]` is set when the cell (x, y) is filled, so testing a
+    tetrimino against the stack is one AND per row of its bounding box.
+    `tops[y]` is the highest filled row of column `y` (the board height when
+    the column is empty). `hash` is the zobrist hash of the filled cells,
+    `place` updates it per cell.
+    """
+
+    def __init__(self, height: int = BOARD_HEIGHT) -> None:
+        self.rows = [0] * height
+        self.tops = [height] * BOARD_WIDTH
+        self.hash = 0
+
+    def refresh_tops(self) -> None:
+        """recompute the column surfaces after rows were changed directly"""
+        rows = self.rows
+        for y in range(BOARD_WIDTH):
+            x = 0
+            while x < len(rows) and not rows[x] >> y & 1:
+                x += 1
+            self.tops[y] = x
+
+    def rehash(self) -> None:
+        """recompute the hash after rows were changed directly, only the rows
+        below the highest column top can have filled cells"""
+        self.hash = 0
+        for x in range(min(self.tops), len(self.rows)):
+            self.hash ^= self.row_hash(x)
+
+    def row_hash(self, x: int) -> int:
+        res = 0
+        row = self.rows[x]
+        keys = CELL_KEYS[x]
+        while row:
+            low = row & -row
+            res ^= keys[low.bit_length() - 1]
+            row ^= low
+        return res
+
+    def collides(self, mask: PieceMask, row: int, col: int) -> bool:
+        """whether a tetrimino with its origin at (row, col) overlaps the
+        stack or leaves the board"""
+        top, left, height, width, bits, _ = mask
+        row += top
+        col += left
+        if col < 0 or row < 0 or col + width > BOARD_WIDTH:
+            return True
+        if row + height > len(self.rows):
+            return True
+        rows = self.rows
+        for i, b in enumerate(bits):
+            if rows[row + i] & (b << col):
+                return True
+        return False
+
+    def drop_distance(self, mask: PieceMask, row: int, col: int) -> int:
+        """rows the tetrimino can fall before it lands
+
+        when the tetrimino is above the surface of every column it covers,
+        the distance is the smallest gap between its lowest cell and the
+        column top. under an overhang it falls back to moving it down row
+        by row.
+        """
+        top, left, _, _, _, bottoms = mask
+        tops = self.tops
+        x = row + top
+        y = col + left
+        distance = len(self.rows)
+        for j, bottom in enumerate(bottoms):
+            gap = tops[y + j] - x - bottom - 1
+            if gap < 0:
+                distance = 0
+                while not self.collides(mask, row + distance + 1, col):
+                    distance += 1
+                return distance
+            if gap < distance:
+                distance = gap
+        return distance
+
+    def place(self, mask: PieceMask, row: int, col: int) -> None:
+        top, left, _, width, bits, _ = mask
+        rows = self.rows
+        row += top
+        col += left
+        for i, b in enumerate(bits):
+            b <<= col
+            rows[row + i] |= b
+            keys = CELL_KEYS[row + i]
+            while b:
+                low = b & -b
+                self.hash ^= keys[low.bit_length() - 1]
+                b ^= low
+        tops = self.tops
+        for y in range(col, col + width):
+            x = row
+            while not rows[x] >> y & 1:
+                x += 1
+            if x < tops[y]:
+                tops[y] = x
+
+    def full_rows(self, first: int, stop: int) -> list[int]:
+        """the full rows among `first` to `stop`, a placed tetrimino can only
+        complete the rows it covers"""
+        rows = self.rows
+        return [x for x in range(first, stop) if rows[x] == FULL_ROW]
+
+    def clear_rows(self, full: list[int]) -> None:
+        """remove the `full` rows and move the stack above them down
+
+        only the rows from the stack top to the lowest cleared row move, so
+        only their part of the hash and the column tops are updated.
+        """
+        rows = self.rows
+        tops = self.tops
+        top = min(tops)
+        bottom = full[-1] + 1
+        # a cell's key depends on its row, take the moved rows out and back in
+        for x in range(top, bottom):
+            self.hash ^= self.row_hash(x)
+        compact(rows, full, top, 0)
+        for x in range(top + len(full), bottom):
+            self.hash ^= self.row_hash(x)
+        # every column top is above the cleared rows, so it moves down by all
+        # of them unless it was cleared itself
+        for y in range(BOARD_WIDTH):
+            x = tops[y] + len(full)
+            while x < len(rows) and not rows[x] >> y & 1:
+                x += 1
+            tops[y] = x
+
+    def is_full(self, row: int) -> bool:
+        return self.rows[row] == FULL_ROW
+
+    def is_empty(self, x: int, y: int) -> bool:
+        return 0 <= x < len(self.rows) and 0 <= y < BOARD_WIDTH and not (
+            self.rows[x] >> y & 1
+        )
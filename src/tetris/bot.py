@@ -0,0 +1,283 @@
+import time
+
+from typing import NamedTuple
+
+from .bitboard import BOARD_WIDTH, FULL_ROW, Bitboard
+from .engine import EMPTY, GENERATE_POSITION, MASK_TABLE, Action, TetriminoShape, TetrisEngine
+from .placement import Placement, choices, enumerate_placements, spawn_state
+
+LOSS = float("-inf")
+PREVIEWS = 5  # tetriminos shown under "Next"
+
+
+def column_table() -> list[list[tuple[tuple[int, int, int], ...]]]:
+    """(box column, first box row, cells) of every column of every mask"""
+    table: list[list[tuple[tuple[int, int, int], ...]]] = [[]]
+    for masks in MASK_TABLE[1:]:
+        table.append([])
+        for _, _, height, width, bits, _ in masks:
+            columns = []
+            for j in range(width):
+                rows = [i for i in range(height) if bits[i] >> j & 1]
+                columns.append((j, rows[0], len(rows)))
+            table[-1].append(tuple(columns))
+    return table
+
+
+COLUMN_TABLE = column_table()
+
+# rotation states that cover distinct cell patterns, e.g. one for O
+DROP_ROTATIONS = [[]] + [
+    [rot for rot in range(4) if masks[rot][4] not in [m[4] for m in masks[:rot]]]
+    for masks in MASK_TABLE[1:]
+]
+
+
+class Weights(NamedTuple):
+    height: float = -0.51  # sum of the column heights
+    holes: float = -0.36  # empty cells under a column top
+    bumpiness: float = -0.18  # height differences of neighbour columns
+    wells: float = -0.08  # 1 + 2 + .. + depth for every well
+    t_slots: float = 0.4  # places a T can spin into
+    lines: float = 0.76  # per cleared line
+    t_spins: float = 1.0  # per t-spin, times the lines it cleared plus one
+
+
+class Node:
+    """a board reached by the search
+
+    besides the rows it keeps every column's top and filled cell count, so
+    a child only updates the columns its tetrimino touched.
+    """
+
+    def __init__(
+        self, rows: list[int], tops: list[int], filled: list[int], reward: float = 0.0
+    ) -> None:
+        self.rows = rows
+        self.tops = tops
+        self.filled = filled
+        self.reward = reward  # for the placement that led here
+
+    @classmethod
+    def from_bitboard(cls, bitboard: Bitboard) -> "Node":
+        rows = bitboard.rows
+        filled = [sum(row >> y & 1 for row in rows) for y in range(BOARD_WIDTH)]
+        return cls(rows[:], bitboard.tops[:], filled)
+
+    def drop_row(self, no: int, rot: int, col: int) -> int | None:
+        """the row a tetrimino lands on when dropped from its spawn row at
+        `col`, None when it does not fit there"""
+        top, left, _, width, _, bottoms = MASK_TABLE[no][rot]
+        y = col + left
+        if y < 0 or y + width > BOARD_WIDTH:
+            return None
+        row = GENERATE_POSITION[TetriminoShape(no)][0]
+        tops = self.tops
+        distance = len(self.rows)
+        for j, bottom in enumerate(bottoms):
+            gap = tops[y + j] - row - top - bottom - 1
+            if gap < 0:
+                # the stack reaches the spawn rows
+                return None
+            if gap < distance:
+                distance = gap
+        return row + distance
+
+    def place(self, no: int, rot: int, row: int, col: int) -> "tuple[Node, int] | None":
+        """the board after locking a tetrimino and the lines it cleared, None
+        when it locked out above the visible rows"""
+        top, left, height, _, bits, _ = MASK_TABLE[no][rot]
+        x = row + top
+        y = col + left
+        if x + height <= 20:
+            return None
+        rows = self.rows[:]
+        cleared = 0
+        for i, b in enumerate(bits):
+            rows[x + i] |= b << y
+            if rows[x + i] == FULL_ROW:
+                cleared += 1
+        tops = self.tops[:]
+        filled = self.filled[:]
+        for j, first, cells in COLUMN_TABLE[no][rot]:
+            filled[y + j] += cells
+            if x + first < tops[y + j]:
+                tops[y + j] = x + first
+        if cleared:
+            rows = [0] * cleared + [r for r in rows if r != FULL_ROW]
+            end = len(rows)
+            for k in range(BOARD_WIDTH):
+                filled[k] -= cleared
+                # everything above the cleared rows moved down
+                t = tops[k]
+                while t < end and not rows[t] >> k & 1:
+                    t += 1
+                tops[k] = t
+        return Node(rows, tops, filled), cleared
+
+
+class Bot:
+    """plays the game by picking a placement for every tetrimino
+
+    a placement is scored by the board it leaves behind, looking ahead at
+    the previews and the hold slot. the search deepens one tetrimino at a
+    time, only following the `beam` most promising boards, until `budget`
+    seconds ran out or `max_depth` tetriminos were placed.
+    """
+
+    def __init__(
+        self,
+        weights: Weights | None = None,
+        budget: float = 0.010,
+        max_depth: int = 3,
+        beam: int = 6,
+    ) -> None:
+        self.weights = weights or Weights()
+        self.budget = budget
+        self.max_depth = max_depth
+        self.beam = beam
+        self.deadline = 0.0
+        # the game and its locked tetriminos when the last plan was made
+        self.planned_for: tuple[TetrisEngine, int] | None = None
+        self.depth = 0  # the depth the last search completed
+
+    def actions(self, game: TetrisEngine) -> list[Action]:
+        """the inputs for the current tetrimino, all of them at once when it
+        is new and none after that"""
+        planned = self.planned_for
+        if game.failed or (
+            planned is not None and planned[0] is game and planned[1] == game.pieces
+        ):
+            return []
+        self.planned_for = (game, game.pieces)
+        move = self.best_move(game)
+        if move is None:
+            return [Action.HARD_DROP]
+        hold, placement = move
+        return [Action.HOLD, *placement.path] if hold else list(placement.path)
+
+    def evaluate(self, node: Node) -> float:
+        w = self.weights
+        rows, tops, filled = node.rows, node.tops, node.filled
+        end = len(rows)
+        heights = [end - t for t in tops]
+        holes = sum(heights) - sum(filled)
+
+        bumpiness = wells = t_slots = 0
+        for y in range(BOARD_WIDTH):
+            h = heights[y]
+            left = heights[y - 1] if y > 0 else end
+            right = heights[y + 1] if y < BOARD_WIDTH - 1 else end
+            if y < BOARD_WIDTH - 1:
+                bumpiness += abs(h - right)
+            depth = min(left, right) - h
+            if depth > 0:
+                wells += depth * (depth + 1) // 2
+            if 0 < y < BOARD_WIDTH - 1 and self.is_t_slot(rows, tops[y] - 1, y):
+                t_slots += 1
+
+        return (
+            w.height * sum(heights)
+            + w.holes * holes
+            + w.bumpiness * bumpiness
+            + w.wells * wells
+            + w.t_slots * t_slots
+        )
+
+    @staticmethod
+    def is_t_slot(rows: list[int], x: int, y: int) -> bool:
+        """whether a T pointing down fits with its stem in (x, y) and would
+        score as a t-spin: both bottom corners and one top corner filled"""
+        if x < 2:
+            return False
+        if rows[x] >> (y - 1) & 7 != 5:
+            return False
+        if rows[x - 1] >> (y - 1) & 7:
+            return False
+        return rows[x - 2] >> (y - 1) & 7 in (1, 4, 5)
+
+    def reward(self, cleared: int, t_spin: bool) -> float:
+        if t_spin:
+            return self.weights.t_spins * (cleared + 1)
+        return self.weights.lines * cleared
+
+    def best_move(self, game: TetrisEngine) -> tuple[bool, Placement] | None:
+        """(hold first, placement) for the current tetrimino"""
+        tetrimino = game.cur_tetrimino
+        assert tetrimino is not None, "cur_tetrimino is None"
+        self.deadline = time.perf_counter() + self.budget
+        root = Node.from_bitboard(game.bitboard)
+        rows = tuple(root.rows)
+        queue = [tetrimino.no] + [game.bag[i] for i in range(PREVIEWS)]
+        hold = game.hold if game.hold != EMPTY else None
+
+        candidates = []
+        for held, no, i, next_hold in choices(queue, 0, hold, not game.hold_once):
+            if held:
+                state = spawn_state(rows, no)
+                rot, row, col = state
+                if game.bitboard.collides(MASK_TABLE[no][rot], row, col):
+                    continue
+            else:
+                state = tetrimino.rot, tetrimino.row, tetrimino.col
+            for placement in enumerate_placements(rows, no, *state):
+                placed = root.place(no, placement.rot, placement.row, placement.col)
+                if placed is None:
+                    continue
+                child, cleared = placed
+                child.reward = self.reward(cleared, placement.t_spin)
+                value = child.reward + self.evaluate(child)
+                candidates.append((value, held, placement, child, i, next_hold))
+        if not candidates:
+            return None
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        best = candidates[0]
+        self.depth = 1
+        for depth in range(2, self.max_depth + 1):
+            try:
+                values = [
+                    child.reward + self.lookahead(child, queue, i, next_hold, depth - 1)
+                    for _, _, _, child, i, next_hold in candidates[: self.beam]
+                ]
+            except TimeoutError:
+                break
+            k = max(range(len(values)), key=values.__getitem__)
+            best = candidates[k]
+            self.depth = depth
+        return best[1], best[2]
+
+    def lookahead(
+        self, node: Node, queue: list[int], i: int, hold: int | None, depth: int
+    ) -> float:
+        """the value of the best `depth` more placements from `node`"""
+        if i >= len(queue):
+            return self.evaluate(node)
+        if time.perf_counter() > self.deadline:
+            raise TimeoutError
+
+        children = []
+        for _, no, next_i, next_hold in choices(queue, i, hold):
+            for rot in DROP_ROTATIONS[no]:
+                for col in range(-2, BOARD_WIDTH):
+                    row = node.drop_row(no, rot, col)
+                    if row is None:
+                        continue
+                    placed = node.place(no, rot, row, col)
+                    if placed is None:
+                        continue
+                    child, cleared = placed
+                    child.reward = self.reward(cleared, False)
+                    value = child.reward + self.evaluate(child)
+                    children.append((value, child, next_i, next_hold))
+        if not children:
+            return LOSS
+        if depth == 1:
+            return max(c[0] for c in children)
+
+        children.sort(key=lambda c: c[0], reverse=True)
+        return max(
+            child.reward + self.lookahead(child, queue, next_i, next_hold, depth - 1)
+            for _, child, next_i, next_hold in children[: self.beam]
+        )
+
@@ -1,18 +1,324 @@
+import argparse
+import asyncio
 import curses
+import os
+import sqlite3
 import sys
+import time
 
 from tetris import GAME_WINDOW_SIZE_HEIGHT, GAME_WINDOW_SIZE_WIDTH, Tetris
+from tetris.bot import Bot
+from tetris.controls import ARR, DAS, SDF, Controls
+from tetris.engine import TetriminoShape
+from tetris.net import split_address
+from tetris.replay import Replay
+from tetris.spectate import watch
+from tetris.stats import FrameStats
+from tetris.store import (
+    DEFAULT_PATH,
+    GameLog,
+    Writer,
+    connect,
+    default_player,
+    leaderboard,
+    personal_bests,
+    piece_totals,
+)
+from tetris.tetris import EXIT, ReplayTetris
+from tetris.versus import DEFAULT_PORT, Server, play
 
 
-def wrapper(stdscr: curses.window) -> int:
+def wrapper(
+    stdscr: curses.window,
+    args: argparse.Namespace,
+    stats: FrameStats | None,
+    controls: Controls,
+    log: GameLog | None,
+) -> int:
     if curses.COLS < GAME_WINDOW_SIZE_WIDTH or curses.LINES < GAME_WINDOW_SIZE_HEIGHT:
         return 1
-    Tetris(stdscr).main()
+    if args.replay:
+        replay = Replay.load(args.replay)
+        ReplayTetris(
+            stdscr, replay, args.speed, args.broadcast, args.renderer, stats
+        ).main()
+    else:
+        bot = Bot(budget=args.budget, max_depth=args.depth) if args.autoplay else None
+        Tetris(
+            stdscr,
+            args.seed,
+            args.record,
+            bot,
+            args.broadcast,
+            args.renderer,
+            stats,
+            controls,
+            log,
+        ).main()
     return 0
 
 
+def replay_headless(path: str) -> int:
+    replay = Replay.load(path)
+    game = replay.simulate()
+    print(f"seed  : {replay.seed}")
+    print(f"steps : {replay.steps} ({replay.duration / 1000:.1f}s)")
+    print(f"score : {game.score}")
+    print(f"lines : {game.lines}")
+    if not replay.verify(game):
+        print(f"does not match the recorded {replay.score} points, {replay.lines} lines")
+        return 1
+    return 0
+
+
+def show_stats(args: argparse.Namespace) -> int:
+    if not os.path.exists(args.db):
+        print(f"no games kept in {args.db} yet")
+        return 1
+    conn = connect(args.db)
+
+    print(f"best {args.mode} games")
+    print(
+        f"{'':>3} {'score':>9} {'lines':>6} {'level':>5} {'pps':>5} {'t-spins':>7}"
+        f" {'finesse':>7}  {'player':<12} {'seed':>10}  played"
+    )
+    for i, game in enumerate(leaderboard(conn, args.mode, args.limit), 1):
+        finesse = "-" if game["finesse"] is None else game["finesse"]
+        played = time.strftime("%Y-%m-%d %H:%M", time.localtime(game["played"]))
+        print(
+            f"{i:>3} {game['score']:>9.0f} {game['lines']:>6} {game['level']:>5}"
+            f" {game['pps']:>5.2f} {game['t_spins']:>7} {finesse:>7}"
+            f"  {game['player'][:12]:<12} {game['seed']:>10}  {played}"
+        )
+
+    print(f"\npersonal bests of {args.player}")
+    print(
+        f"{'mode':<10} {'games':>6} {'score':>9} {'lines':>6} {'level':>5}"
+        f" {'pps':>5} {'finesse':>7}"
+    )
+    for best in personal_bests(conn, args.player):
+        finesse = "-" if best["finesse"] is None else best["finesse"]
+        print(
+            f"{best['mode']:<10} {best['games']:>6} {best['score']:>9.0f}"
+            f" {best['lines']:>6} {best['level']:>5} {best['pps']:>5.2f} {finesse:>7}"
+        )
+
+    pieces = piece_totals(conn, args.player)
+    if pieces:
+        print(f"\n{'piece':<10} {'count':>6} {'avg keys':>8} {'faults':>7} {'t-spins':>7}")
+        for piece in pieces:
+            print(
+                f"{TetriminoShape(piece['shape']).name:<10} {piece['count']:>6}"
+                f" {piece['presses'] / piece['count']:>8.2f}"
+                f" {piece['faults']:>7} {piece['t_spins']:>7}"
+            )
+    conn.close()
+    return 0
+
+
+def address(value: str) -> str:
+    """an argparse type, a bad port is a usage error before curses starts"""
+    try:
+        split_address(value, DEFAULT_PORT)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return value
+
+
+def serve(args: argparse.Namespace) -> int:
+    try:
+        asyncio.run(Server(args.players, args.seed).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def join(args: argparse.Namespace) -> int:
+    address = split_address(args.address, DEFAULT_PORT)
+    if isinstance(address, str):
+        print("versus matches are played over tcp, use HOST or HOST:PORT")
+        return 1
+    host, port = address
+
+    def wrapper(stdscr: curses.window) -> int:
+        if curses.COLS < GAME_WINDOW_SIZE_WIDTH or curses.LINES < GAME_WINDOW_SIZE_HEIGHT:
+            return 1
+        play(stdscr, host, port, args.name)
+        return 0
+
+    try:
+        res = curses.wrapper(wrapper)
+    except OSError as e:
+        print(f"can not connect to {host}:{port}: {e}")
+        return 1
+    if res == 1:
+        print(
+            f"ensure your terminal has at least {GAME_WINDOW_SIZE_HEIGHT} rows and {GAME_WINDOW_SIZE_WIDTH} columns."
+        )
+    return res
+
+
+def spectate(args: argparse.Namespace) -> int:
+    def wrapper(stdscr: curses.window) -> int:
+        if curses.COLS < GAME_WINDOW_SIZE_WIDTH or curses.LINES < GAME_WINDOW_SIZE_HEIGHT:
+            return 1
+        Tetris.init_color()
+        curses.curs_set(0)
+        stdscr.timeout(0)
+        result = asyncio.run(watch(stdscr, args.address, EXIT))
+        if result != "quit":
+            stdscr.addstr(0, 2, f" {result}, press a key ")
+            stdscr.timeout(-1)
+            stdscr.getch()
+        return 0
+
+    try:
+        res = curses.wrapper(wrapper)
+    except OSError as e:
+        print(f"can not connect to {args.address}: {e}")
+        return 1
+    if res == 1:
+        print(
+            f"ensure your terminal has at least {GAME_WINDOW_SIZE_HEIGHT} rows and {GAME_WINDOW_SIZE_WIDTH} columns."
+        )
+    return res
+
+
 def main() -> int:
-    if curses.wrapper(wrapper) == 1:
+    parser = argparse.ArgumentParser(prog="tetris")
+    parser.add_argument(
+        "--seed", type=int, default=None, help="deal the same tetriminos every game"
+    )
+    parser.add_argument("--record", metavar="PATH", help="record the game to a replay")
+    parser.add_argument("--replay", metavar="PATH", help="watch a recorded game")
+    parser.add_argument(
+        "--speed", type=float, default=1, help="replay speed, e.g. 2 or 10"
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="re-simulate the replay at full speed and check its result",
+    )
+    parser.add_argument(
+        "--autoplay", action="store_true", help="let the built-in bot play"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=3, help="tetriminos the bot looks ahead"
+    )
+    parser.add_argument(
+        "--budget", type=float, default=0.010, help="bot thinking time per tetrimino"
+    )
+    parser.add_argument(
+        "--broadcast",
+        type=address,
+        metavar="ADDRESS",
+        help="let spectators watch, HOST:PORT or a unix socket path",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=["curses", "ansi"],
+        default="curses",
+        help="ansi writes every frame at once, curses is used where it can not",
+    )
+    parser.add_argument(
+        "--das",
+        type=float,
+        default=DAS * 1000,
+        help="ms a direction is held before it repeats",
+    )
+    parser.add_argument(
+        "--arr",
+        type=float,
+        default=ARR * 1000,
+        help="ms between repeated shifts, 0 shifts to the wall",
+    )
+    parser.add_argument(
+        "--sdf",
+        type=float,
+        default=SDF,
+        help="how much faster than gravity a held soft drop falls",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="time every frame, p and m profile cpu and memory for a few seconds",
+    )
+    parser.add_argument(
+        "--name", default=default_player(), help="player name kept with the game"
+    )
+    parser.add_argument(
+        "--db", default=DEFAULT_PATH, metavar="PATH", help="the stats database"
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="do not keep the game in the database"
+    )
+
+    commands = parser.add_subparsers(dest="command")
+    server = commands.add_parser("serve", help="host versus matches")
+    server.add_argument("--host", default="0.0.0.0")
+    server.add_argument("--port", type=int, default=DEFAULT_PORT)
+    server.add_argument(
+        "--players", type=int, default=2, help="players per match, 2 by default"
+    )
+    # copies of main options, so they can follow the command as well, only
+    # override the main ones when given
+    server.add_argument(
+        "--seed",
+        type=int,
+        default=argparse.SUPPRESS,
+        help="deal the same tetriminos every match",
+    )
+    client = commands.add_parser("join", help="play a versus match")
+    client.add_argument(
+        "address", type=address, help=f"HOST or HOST:PORT, port {DEFAULT_PORT}"
+    )
+    client.add_argument("--name", default=argparse.SUPPRESS, help="name the others see")
+    watcher = commands.add_parser("watch", help="watch a broadcast game")
+    watcher.add_argument(
+        "address", type=address, help="HOST:PORT or a unix socket path"
+    )
+    viewer = commands.add_parser("stats", help="show the best games kept")
+    viewer.add_argument(
+        "--mode", default="marathon", help="marathon, autoplay or sim"
+    )
+    viewer.add_argument("--player", default=default_player())
+    viewer.add_argument("--limit", type=int, default=10, help="games on the leaderboard")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        return serve(args)
+    if args.command == "join":
+        return join(args)
+    if args.command == "watch":
+        return spectate(args)
+    if args.command == "stats":
+        return show_stats(args)
+    if args.replay and args.headless:
+        return replay_headless(args.replay)
+
+    try:
+        controls = Controls(args.das / 1000, args.arr / 1000, args.sdf)
+    except ValueError as e:
+        parser.error(str(e))
+    stats = FrameStats(Tetris.fps) if args.stats else None
+    writer = log = error = None
+    if not args.replay and not args.no_save:
+        try:
+            writer = Writer(args.db)
+        except (OSError, sqlite3.Error) as e:
+            print(f"can not open {args.db}, the game is not kept: {e}", file=sys.stderr)
+        else:
+            log = GameLog(writer, args.name, "autoplay" if args.autoplay else "marathon")
+    try:
+        res = curses.wrapper(wrapper, args, stats, controls, log)
+    finally:
+        if writer is not None:
+            error = writer.close()
+    if stats is not None and stats.frames.count:
+        print(stats.report())
+    if error is not None:
+        print(f"can not write to {args.db}, the game is not kept: {error}")
+    if res == 1:
         print(
             f"ensure your terminal has at least {GAME_WINDOW_SIZE_HEIGHT} rows and {GAME_WINDOW_SIZE_WIDTH} columns."
         )
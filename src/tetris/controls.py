@@ -0,0 +1,164 @@
+import math
+
+from collections import deque
+
+from .bitboard import BOARD_HEIGHT, BOARD_WIDTH
+from .engine import Action, TetrisEngine
+
+DAS = 0.167  # seconds a direction is held before it auto shifts
+ARR = 0.033  # seconds between two auto shifts, 0 shifts to the wall at once
+SDF = 20  # a held soft drop falls this many times faster than gravity
+# a terminal repeats a held key after a delay between these, in seconds
+REPEAT_DELAY = (0.15, 0.8)
+# and then every REPEAT seconds at most, human taps are slower
+REPEAT = 0.07
+# evenly spaced repeats differ by this fraction of their interval at most, or
+# by JITTER_MS when the game loop woke up late
+JITTER = 0.25
+JITTER_MS = 0.008
+# a key is held after the delay and this many evenly spaced intervals
+# between its repeats
+REPEATS = 2
+
+
+class HeldKey:
+    """a key that acts again and again while it is held
+
+    terminals report no key releases, only the first press and, after a
+    delay, repeats of a held key. every event acts once, like a tap, until
+    the events look like a terminal repeating the key: a gap as long as a
+    repeat delay, then `REPEATS` even intervals. from then on the
+    key counts as held until its repeats stop for longer than their
+    interval, and its own repeats are replaced by actions at a fixed rate.
+    """
+
+    def __init__(self, action: Action) -> None:
+        self.action = action
+        self.seen = -math.inf  # the last event of the key
+        self.gaps: deque[float] = deque(maxlen=REPEATS + 1)  # between events
+        self.interval = REPEAT  # between the last two repeats
+        self.repeating = False
+        self.due = 0.0  # the next action
+
+    def press(self, now: float, delay: float) -> bool:
+        """an event of the key, whether it acts once"""
+        gap = now - self.seen
+        self.seen = now
+        if self.repeating:
+            # a little slack for repeats that arrive late
+            if gap <= self.interval * (1 + JITTER) + JITTER_MS:
+                return False
+            # let go and pressed again
+            self.repeating = False
+            self.gaps.clear()
+        self.gaps.append(gap)
+        if not self.is_repeat_cadence():
+            return True
+        self.repeating = True
+        self.interval = gap
+        # held since the press before the delay
+        self.due = max(now - sum(self.gaps) + delay, now)
+        # the auto shift acts for this event when it is due already
+        return self.due > now
+
+    def is_repeat_cadence(self) -> bool:
+        gaps = self.gaps
+        low, high = REPEAT_DELAY
+        if len(gaps) <= REPEATS or not low <= gaps[0] <= high:
+            return False
+        repeats = list(gaps)[1:]
+        fastest, slowest = min(repeats), max(repeats)
+        return slowest <= REPEAT and slowest - fastest <= slowest * JITTER + JITTER_MS
+
+    def held(self, now: float) -> bool:
+        return self.repeating and now - self.seen <= (
+            self.interval * (1 + JITTER) + JITTER_MS
+        )
+
+    def release(self) -> None:
+        self.repeating = False
+        self.seen = -math.inf
+        self.gaps.clear()
+
+
+class Controls:
+    """turns the keys read in one wake up into actions, with DAS, ARR and a
+    soft drop factor
+
+    every key event acts once until the key is held. a held direction auto
+    shifts every `arr` seconds after `das` seconds, or straight to the wall
+    when `arr` is 0, a held soft drop falls `sdf` times faster than gravity.
+    every timestamp is `time.monotonic()`.
+    """
+
+    def __init__(self, das: float = DAS, arr: float = ARR, sdf: float = SDF) -> None:
+        if das < 0 or arr < 0 or sdf <= 0:
+            raise ValueError("das and arr must not be negative, sdf must be positive")
+        self.das = das
+        self.arr = arr
+        self.sdf = sdf
+        self.left = HeldKey(Action.MOVE_LEFT)
+        self.right = HeldKey(Action.MOVE_RIGHT)
+        self.soft_drop = HeldKey(Action.SOFT_DROP)
+        self.shift: HeldKey | None = None  # the direction pressed last
+
+    def actions(
+        self, pressed: list[Action], now: float, game: TetrisEngine
+    ) -> tuple[list[Action], Action | None]:
+        """the actions of the keys pressed since the last call and of the held
+        ones, and with an `arr` of 0 the direction to shift to the wall after
+        them, which `TetrisEngine.step` does"""
+        res = []
+        for action in pressed:
+            if action is Action.MOVE_LEFT or action is Action.MOVE_RIGHT:
+                key = self.left if action is Action.MOVE_LEFT else self.right
+                if self.shift is not key:
+                    # the terminal only repeats the key pressed last
+                    if self.shift is not None:
+                        self.shift.release()
+                    self.shift = key
+                if key.press(now, self.das):
+                    res.append(action)
+            elif action is Action.SOFT_DROP:
+                if self.soft_drop.press(now, 0.0):
+                    res.append(action)
+            else:
+                res.append(action)
+
+        wall = None
+        shift = self.shift
+        if shift is not None and shift.held(now) and shift.due <= now:
+            if self.arr == 0:
+                wall = shift.action
+            else:
+                res += self.repeat(shift, now, self.arr, BOARD_WIDTH)
+        drop = self.soft_drop
+        if drop.held(now):
+            res += self.repeat(drop, now, game.fall_speed / self.sdf, BOARD_HEIGHT)
+        return res, wall
+
+    @staticmethod
+    def repeat(key: HeldKey, now: float, interval: float, most: int) -> list[Action]:
+        """the actions of a held key that are due, `most` at a time"""
+        count = 0
+        while key.due <= now:
+            key.due += interval
+            count += 1
+            if count == most:
+                # a late wake up does not make up for more
+                key.due = now + interval
+                break
+        return [key.action] * count
+
+    def next_timeout(self, now: float) -> float:
+        """seconds until a held key acts again"""
+        res = math.inf
+        for key in (self.shift, self.soft_drop):
+            if key is None or not key.held(now):
+                continue
+            # at the wall already, until the next tetrimino
+            if key is self.shift and self.arr == 0 and key.due <= now:
+                continue
+            res = min(res, key.due - now)
+        return max(res, 0.0)
+
@@ -0,0 +1,867 @@
+import copy
+import random
+
+from collections import deque
+from enum import Enum
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from .bitboard import (
+    BOARD_HEIGHT,
+    BOARD_WIDTH,
+    FULL_ROW,
+    Bitboard,
+    PieceMask,
+    compact,
+)
+from .sequence import PieceSequence
+from .srs_data import CELL_TABLE, KICK_TABLE, MASK_TABLE
+
+EMPTY = 0
+GARBAGE = 8  # cell value of the garbage rows an opponent sent
+# board rows are immutable, so snapshots can share them
+EMPTY_ROW = (EMPTY,) * BOARD_WIDTH
+# the phases of `TetrisEngine.step` a front end can time
+STEP_PHASES = ("normal_fall", "handle_lock_down", "handle_shadow")
+FALL, LOCK, SHADOW = range(len(STEP_PHASES))
+
+
+class TetriminoShape(Enum):
+    Z = 1
+    S = 2
+    O = 3
+    J = 4
+    T = 5
+    I = 6
+    L = 7
+
+    def __repr__(self) -> str:
+        return f"TetriminoShape.{self.name}"
+
+
+class Direction(Enum):
+    NORTH = 0
+    EAST = 1
+    SOUTH = 2
+    WEST = 3
+
+    def __repr__(self) -> str:
+        return f"Direction.{self.name}"
+
+
+GENERATE_POSITION = {
+    TetriminoShape.I: (19, 3),
+    TetriminoShape.J: (18, 3),
+    TetriminoShape.L: (19, 3),
+    TetriminoShape.O: (18, 4),
+    TetriminoShape.S: (19, 3),
+    TetriminoShape.T: (19, 3),
+    TetriminoShape.Z: (18, 3),
+}
+
+
+# SRS system
+# rotation states, indexed by [shape value][rotation index], generated by
+# srs.py into srs_data:
+#   CELL_TABLE: cell offsets relative to the tetrimino origin, the origin is
+#               the frame SHAPE_TABLE is written in, placed at GENERATE_POSITION
+#   MASK_TABLE: the same cells packed into bitboard row masks
+#   KICK_TABLE: (cw, ccw) wall kicks as flat (drow, dcol, drow, dcol, ...)
+#               tuples, tried in order after the standard rotation
+
+
+# zobrist keys of the falling tetrimino and the hold slot, the locked cells
+# are hashed by the bitboard. origins may sit a few cells outside the board
+_keys = random.Random(0x7E7 + 1)
+PIECE_KEYS = [[_keys.getrandbits(64) for _ in range(4)] for _ in range(8)]
+ROW_KEYS = [_keys.getrandbits(64) for _ in range(BOARD_HEIGHT + 8)]
+COL_KEYS = [_keys.getrandbits(64) for _ in range(BOARD_WIDTH + 8)]
+HOLD_KEYS = [0] + [_keys.getrandbits(64) for _ in range(7)]
+HOLD_ONCE_KEY = _keys.getrandbits(64)
+
+# garbage lines an opponent receives, by the number of cleared lines. a back
+# to back clear sends one more
+ATTACK = (0, 0, 1, 2, 4)
+T_SPIN_ATTACK = (0, 2, 4, 6)
+
+
+# spawn (row, col) of every shape value
+SPAWN_POSITION = [(0, 0)] + [
+    GENERATE_POSITION[TetriminoShape(v)] for v in range(1, len(TetriminoShape) + 1)
+]
+
+
+class Tetrimino:
+
+    ## line0  0000000000 -
+    ## ...               |>  buffer zone
+    ## line19 0000000000 -
+    ## line20 0000000000 -
+    ## ...               |>   game zone
+    ## line39 0000000000 -
+    ## all the tetriminos are generated in the 18th and 19th line(buffer zone)
+
+    # a shape value and a position, cells come from CELL_TABLE
+    __slots__ = ("no", "rot", "row", "col")
+
+    def __init__(self, shape: TetriminoShape) -> None:
+        self.spawn(shape.value)
+
+    def spawn(self, no: int) -> None:
+        """become a new tetrimino of shape value `no`, in place"""
+        self.no = no
+        self.rot = Direction.NORTH.value
+        self.row, self.col = SPAWN_POSITION[no]
+
+    @property
+    def shape(self) -> TetriminoShape:
+        return TetriminoShape(self.no)
+
+    @property
+    def direction(self) -> Direction:
+        return Direction(self.rot)
+
+    @property
+    def mask(self) -> PieceMask:
+        return MASK_TABLE[self.no][self.rot]
+
+    @property
+    def bodies(self) -> list[tuple[int, int]]:
+        row, col = self.row, self.col
+        return [(row + dx, col + dy) for dx, dy in CELL_TABLE[self.no][self.rot]]
+
+    def __iter__(self):
+        row, col = self.row, self.col
+        for dx, dy in CELL_TABLE[self.no][self.rot]:
+            yield row + dx, col + dy
+
+    def __getitem__(self, index: int) -> tuple[int, int]:
+        dx, dy = CELL_TABLE[self.no][self.rot][index]
+        return self.row + dx, self.col + dy
+
+    def move(self, dx: int, dy: int) -> None:
+        self.row += dx
+        self.col += dy
+
+
+class Bag:
+    """the upcoming shape values in a ring buffer, indexed from the next one"""
+
+    __slots__ = ("shapes", "start", "length")
+
+    def __init__(self, size: int = 14) -> None:
+        self.shapes = bytearray(size)
+        self.start = 0
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, i: int) -> int:
+        if not 0 <= i < self.length:
+            raise IndexError("bag index out of range")
+        return self.shapes[(self.start + i) % len(self.shapes)]
+
+    def __iter__(self) -> Iterator[int]:
+        shapes, size = self.shapes, len(self.shapes)
+        for i in range(self.start, self.start + self.length):
+            yield shapes[i % size]
+
+    def __bytes__(self) -> bytes:
+        end = self.start + self.length
+        if end <= len(self.shapes):
+            return bytes(self.shapes[self.start : end])
+        return bytes(self.shapes[self.start :] + self.shapes[: end - len(self.shapes)])
+
+    def extend(self, values: Iterable[int]) -> None:
+        shapes, size = self.shapes, len(self.shapes)
+        for v in values:
+            if self.length == size:
+                raise IndexError("the bag is full")
+            shapes[(self.start + self.length) % size] = v
+            self.length += 1
+
+    def popleft(self) -> int:
+        if not self.length:
+            raise IndexError("pop from an empty bag")
+        v = self.shapes[self.start]
+        self.start = (self.start + 1) % len(self.shapes)
+        self.length -= 1
+        return v
+
+    def clear(self) -> None:
+        self.start = self.length = 0
+
+
+class Action(Enum):
+    MOVE_LEFT = 0
+    MOVE_RIGHT = 1
+    SOFT_DROP = 2
+    HARD_DROP = 3
+    ROTATE_CW = 4
+    ROTATE_CCW = 5
+    HOLD = 6
+
+    def __repr__(self) -> str:
+        return f"Action.{self.name}"
+
+
+class GameState(NamedTuple):
+    """everything `TetrisEngine.restore` needs
+
+    it is immutable and shares the board rows with the game, so taking a
+    snapshot copies a few short tuples and nothing else.
+    """
+
+    board: tuple[tuple[int, ...], ...]
+    rows: tuple[int, ...]
+    tops: tuple[int, ...]
+    hash: int
+    tetrimino: tuple[int, int, int, int] | None  # no, rot, row, col
+    bag: bytes
+    hold: int  # shape value, EMPTY when nothing is held
+    hold_once: bool
+    sequence: object
+    score: float
+    lines: int
+    lines_for_level: int
+    level: int
+    b2b_bones: bool
+    failed: bool
+    normal_fall_timer: float
+    lock_down_timer: float
+    lock_down_rotate_counter: int
+    reach_bottom: bool
+    lowest: int
+    last_move: Enum
+    pieces: int
+    t_spins: int
+    garbage: tuple[tuple[int, int], ...]
+    sent: int
+
+
+class Observer:
+    """follows a game, e.g. `GameLog`, once it is in `TetrisEngine.observers`
+
+    the engine calls these, the defaults do nothing.
+    """
+
+    def on_action(self, game: "TetrisEngine", action: Action) -> None:
+        """before an action is performed"""
+
+    def on_spawn(self, game: "TetrisEngine") -> None:
+        """after a tetrimino spawned"""
+
+    def on_lock(self, game: "TetrisEngine") -> None:
+        """before the falling tetrimino locks"""
+
+
+class TetrisEngine:
+    """the game rules without any terminal io
+
+    the engine only advances when `step` is called, so a front end decides
+    how fast the game runs: the curses `Tetris` feeds it wall-clock time,
+    while bots and simulations can step it as fast as they like.
+    """
+
+    class Movement(Enum):
+        MOVE = 0
+        ROTATE = 1
+
+    def __init__(
+        self, seed: int | None = None, sequence: PieceSequence | None = None
+    ) -> None:
+        # the same seed (or sequence) always deals the same tetriminos
+        self.sequence = sequence if sequence is not None else PieceSequence(seed)
+        self.seed = self.sequence.seed
+
+        self.score = 0
+        self.lines = 0
+
+        self.lines_for_level = 0
+
+        self.level = 1
+
+        self.failed = False
+
+        self.cur_tetrimino: Tetrimino | None = None
+        # rows to the landing position, None when it has to be recomputed
+        self.ghost_distance: int | None = None
+        self.shadow: list[tuple[int, int]] = []
+        self.shadow_key: tuple[int, int, int, int] | None = None
+        self.hold = EMPTY  # shape value of the held tetrimino
+
+        self.normal_fall_timer = 0.0
+
+        self.lock_down_timer = 0.0
+        self.lock_down_rotate_counter = 0
+
+        self.hold_once = False
+        self.reach_bottom = False
+        self.lowest = 0
+
+        self.b2b_bones = False
+
+        # statistics
+        self.pieces = 0
+        self.t_spins = 0
+
+        # versus: (lines, hole column) of the garbage that is about to rise
+        # and the garbage lines sent to opponents in total
+        self.garbage: deque[tuple[int, int]] = deque()
+        self.sent = 0
+
+        # for t-spin calculation
+        self.last_move = self.Movement.MOVE
+
+        # colours of the locked cells, the falling tetrimino is not part of it
+        self.board = [EMPTY_ROW] * BOARD_HEIGHT
+        self.bitboard = Bitboard(len(self.board))
+        self.bag = Bag()
+
+        # not part of a snapshot, a clone starts without any
+        self.observers: list[Observer] = []
+
+        self.actions = {
+            Action.MOVE_LEFT: self.do_move_left,
+            Action.MOVE_RIGHT: self.do_move_right,
+            Action.SOFT_DROP: self.do_soft_drop,
+            Action.HARD_DROP: self.do_hard_drop,
+            Action.ROTATE_CW: self.do_rotate_cw,
+            Action.ROTATE_CCW: self.do_rotate_ccw,
+            Action.HOLD: self.do_hold,
+        }
+
+    @property
+    def fall_speed(self) -> float:
+        return (0.8 - ((self.level - 1) * 0.007)) ** (self.level - 1)
+
+    @property
+    def soft_drop_speed(self) -> float:
+        return self.fall_speed / 20
+
+    def replenish_bag(self) -> None:
+        """replenish the bag with the next 7 tetriminos of the sequence"""
+        self.bag.extend(self.sequence.next_bag())
+
+    def init_bag(self) -> None:
+        """fill the bag"""
+        for _ in range(2):
+            self.replenish_bag()
+
+    def init_game(self) -> None:
+        self.init_bag()
+        self.generate_new_tetrimino()
+
+    def next_shape(self) -> int:
+        """take the next shape value from the bag"""
+        no = self.bag.popleft()
+        if len(self.bag) == 7:
+            self.replenish_bag()
+        return no
+
+    def get_current_lowest(self) -> int:
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        top, _, height, _, _, _ = self.cur_tetrimino.mask
+        return self.cur_tetrimino.row + top + height - 1
+
+    def generate_new_tetrimino(self, no: int | None = None) -> None:
+        """spawn the next tetrimino of the bag, or shape value `no`"""
+        if no is None:
+            no = self.next_shape()
+        if self.cur_tetrimino is None:
+            self.cur_tetrimino = Tetrimino(TetriminoShape(no))
+        else:
+            self.cur_tetrimino.spawn(no)
+        self.ghost_distance = None
+        if self.collides(self.cur_tetrimino.row, self.cur_tetrimino.col):
+            self.failed = True
+        self.do_fall_immediate()
+        for observer in self.observers:
+            observer.on_spawn(self)
+
+    def line_clear(self) -> int:
+        """clear the rows completed by the tetrimino that just locked"""
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        top, _, height, _, _, _ = self.cur_tetrimino.mask
+        first = self.cur_tetrimino.row + top
+        full = self.bitboard.full_rows(first, first + height)
+        if full:
+            compact(self.board, full, min(self.bitboard.tops), EMPTY_ROW)
+            self.bitboard.clear_rows(full)
+        return len(full)
+
+    def collides(self, row: int, col: int, mask: PieceMask | None = None) -> bool:
+        """whether the current tetrimino (or `mask`) at (row, col) overlaps
+        the locked cells or leaves the board"""
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        if mask is None:
+            mask = self.cur_tetrimino.mask
+        return self.bitboard.collides(mask, row, col)
+
+    def check_can_move_down(self) -> bool:
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        return not self.collides(self.cur_tetrimino.row + 1, self.cur_tetrimino.col)
+
+    def check_can_move_left(self) -> bool:
+        if self.lock_down_rotate_counter >= 15:
+            return False
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        return not self.collides(self.cur_tetrimino.row, self.cur_tetrimino.col - 1)
+
+    def check_can_move_right(self) -> bool:
+        if self.lock_down_rotate_counter >= 15:
+            return False
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        return not self.collides(self.cur_tetrimino.row, self.cur_tetrimino.col + 1)
+
+    def do_fall_immediate(self) -> bool:
+        if not self.check_can_move_down():
+            return False
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        self.cur_tetrimino.move(1, 0)
+        if self.ghost_distance:
+            self.ghost_distance -= 1
+        return True
+
+    def do_move_left(self) -> bool:
+        if not self.check_can_move_left():
+            return False
+        if self.reach_bottom:
+            self.lock_down_rotate_counter += 1
+
+        self.last_move = self.Movement.MOVE
+
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        self.cur_tetrimino.move(0, -1)
+        self.ghost_distance = None
+        return True
+
+    def do_move_right(self) -> bool:
+        if not self.check_can_move_right():
+            return False
+        if self.reach_bottom:
+            self.lock_down_rotate_counter += 1
+
+        self.last_move = self.Movement.MOVE
+
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        self.cur_tetrimino.move(0, 1)
+        self.ghost_distance = None
+        return True
+
+    def do_rotate(self, ccw: bool = False) -> None:
+        if (
+            self.lock_down_rotate_counter >= 15
+        ):  # can only rotate 15 times when reach bottom
+            return
+        tetrimino = self.cur_tetrimino
+        assert tetrimino is not None, "cur_tetrimino is None"
+        next_rot = (tetrimino.rot - 1 if ccw else tetrimino.rot + 1) & 3
+        mask = MASK_TABLE[tetrimino.no][next_rot]
+        kicks = KICK_TABLE[tetrimino.no][tetrimino.rot][ccw]
+        collides = self.bitboard.collides
+
+        for i in range(0, len(kicks), 2):
+            row = tetrimino.row + kicks[i]
+            col = tetrimino.col + kicks[i + 1]
+            if not collides(mask, row, col):
+                tetrimino.rot = next_rot
+                tetrimino.row = row
+                tetrimino.col = col
+                self.ghost_distance = None
+
+                self.last_move = self.Movement.ROTATE
+
+                return
+
+    def do_rotate_cw(self) -> None:
+        self.do_rotate()
+
+    def do_rotate_ccw(self) -> None:
+        self.do_rotate(ccw=True)
+
+    def normal_fall(self, dt: float) -> None:
+        self.normal_fall_timer += dt
+        # a long step may cover several rows of gravity
+        while self.normal_fall_timer >= self.fall_speed:
+            self.normal_fall_timer -= self.fall_speed
+            if not self.do_fall_immediate():
+                self.normal_fall_timer = 0
+                self.lowest = self.get_current_lowest()
+                self.reach_bottom = True
+                return
+            self.last_move = self.Movement.MOVE
+
+    def do_soft_drop(self) -> None:
+        # cancel normal fall
+        self.normal_fall_timer = 0
+        if not self.do_fall_immediate():
+            self.lowest = self.get_current_lowest()
+            self.reach_bottom = True
+        else:
+            # soft drop get level score
+            self.score += self.level
+            self.last_move = self.Movement.MOVE
+
+    def do_hard_drop(self) -> None:
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        distance = self.ghost_drop_distance()
+        if distance:
+            self.cur_tetrimino.move(distance, 0)
+            self.ghost_distance = 0
+        # hard drop get 2 * level score
+        self.score += self.level * 2 * distance
+        self.lock_down()
+
+    def do_hold(self) -> None:
+        if self.hold_once:
+            return
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        self.hold_once = True
+        held = self.hold
+        self.hold = self.cur_tetrimino.no
+        # the held tetrimino comes back without passing through the bag
+        self.generate_new_tetrimino(held if held != EMPTY else None)
+
+    def is_t_spin(self) -> bool:
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        if (
+            self.cur_tetrimino.no != TetriminoShape.T.value
+            or self.last_move != self.Movement.ROTATE
+        ):
+            return False
+        cx, cy = self.cur_tetrimino[1]
+        corners = 0
+        for x, y in [
+            (cx - 1, cy - 1),
+            (cx + 1, cy - 1),
+            (cx - 1, cy + 1),
+            (cx + 1, cy + 1),
+        ]:
+            if not self.bitboard.is_empty(x, y):
+                corners += 1
+        return corners >= 3
+
+    def lock_down(self) -> None:
+        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
+        for observer in self.observers:
+            observer.on_lock(self)
+        # all cells in buff zone when lock down
+        if all(x < 20 for x, _ in self.cur_tetrimino):
+            self.failed = True
+
+        no = self.cur_tetrimino.no
+        for x, y in self.cur_tetrimino:
+            row = self.board[x]
+            self.board[x] = row[:y] + (no,) + row[y + 1 :]
+        self.bitboard.place(
+            self.cur_tetrimino.mask, self.cur_tetrimino.row, self.cur_tetrimino.col
+        )
+
+        is_t_spin = self.is_t_spin()
+        cleared_lines = self.line_clear()
+
+        # calculate the score and lines to add
+        bonus = self.b2b_bones
+        self.b2b_bones = False
+
+        awarded_line = 0
+        score2add = 0
+
+        if is_t_spin:
+
+            self.b2b_bones = True
+
+            if cleared_lines == 0:
+                awarded_line = 4
+                score2add = 100 * self.level
+            elif cleared_lines == 1:
+                awarded_line = 7
+                score2add = 400 * self.level
+            elif cleared_lines == 2:
+                awarded_line = 10
+                score2add = 1200 * self.level
+            elif cleared_lines == 3:
+                awarded_line = 13
+                score2add = 1600 * self.level
+        else:
+            if cleared_lines == 1:
+                score2add = 100 * self.level
+            elif cleared_lines == 2:
+                awarded_line = 1
+                score2add = 300 * self.level
+            elif cleared_lines == 3:
+                awarded_line = 2
+                score2add = 500 * self.level
+            elif cleared_lines == 4:
+                awarded_line = 4
+                self.b2b_bones = True
+
+                score2add = 800 * self.level
+        # if b2b, line clear bonus * 1.5 abd score * 1.5
+        if bonus and self.b2b_bones:
+            self.lines_for_level += int((awarded_line + cleared_lines) * 1.5)
+            self.score += 1.5 * score2add
+        else:
+            self.lines_for_level += awarded_line + cleared_lines
+            self.score += score2add
+        
+        self.lines += cleared_lines
+        self.pieces += 1
+        self.t_spins += is_t_spin
+
+        # an attack cancels pending garbage first, the rest is sent on
+        attack = (T_SPIN_ATTACK if is_t_spin else ATTACK)[cleared_lines]
+        if attack and bonus and self.b2b_bones:
+            attack += 1
+        while attack and self.garbage:
+            lines, hole = self.garbage.popleft()
+            if lines > attack:
+                self.garbage.appendleft((lines - attack, hole))
+            attack = max(attack - lines, 0)
+        self.sent += attack
+        if self.garbage and not cleared_lines:
+            self.raise_garbage()
+
+        # level up
+        # max level 15
+        if self.level < 15 and self.lines_for_level >= 5 * self.level * (self.level + 1) / 2:
+            self.level += 1
+
+        self.generate_new_tetrimino()
+
+        self.reach_bottom = False
+        self.lock_down_timer = 0
+        self.lock_down_rotate_counter = 0
+        self.hold_once = False
+
+    def receive(self, lines: int, hole: int) -> None:
+        """queue garbage from an opponent, it rises when the next tetrimino
+        locks without clearing a line"""
+        self.garbage.append((lines, hole))
+
+    def raise_garbage(self) -> None:
+        """push all pending garbage in from the bottom, cells pushed out of
+        the top end the game"""
+        rows = self.bitboard.rows
+        while self.garbage:
+            lines, hole = self.garbage.popleft()
+            lines = min(lines, len(rows))
+            if any(rows[:lines]):
+                self.failed = True
+            row = (GARBAGE,) * hole + (EMPTY,) + (GARBAGE,) * (BOARD_WIDTH - hole - 1)
+            del self.board[:lines]
+            self.board.extend([row] * lines)
+            del rows[:lines]
+            rows.extend([FULL_ROW ^ 1 << hole] * lines)
+        self.bitboard.refresh_tops()
+        self.bitboard.rehash()
+
+    def handle_lock_down(self, dt: float) -> None:
+        if not self.reach_bottom:
+            return
+        # no longer move down and has cells below, continue timer
+        # if self.get_current_lowest() == self.lowest and not self.check_can_move_down():
+        if not self.check_can_move_down():
+            self.lock_down_timer += dt
+            if self.lock_down_timer >= 0.5:
+                self.lock_down()
+        # reach new lowest, reset timer and counter
+        elif self.get_current_lowest() > self.lowest:
+            self.reach_bottom = False
+            self.lock_down_timer = 0
+            self.lock_down_rotate_counter = 0
+
+    def ghost_drop_distance(self) -> int:
+        """rows the current tetrimino falls on a hard drop
+
+        cached until the tetrimino moves sideways, rotates or is replaced,
+        falling one row only shortens the cached distance.
+        """
+        if self.ghost_distance is None:
+            tetrimino = self.cur_tetrimino
+            assert tetrimino is not None, "cur_tetrimino is None"
+            self.ghost_distance = self.bitboard.drop_distance(
+                tetrimino.mask, tetrimino.row, tetrimino.col
+            )
+        return self.ghost_distance
+
+    def handle_shadow(self):
+        tetrimino = self.cur_tetrimino
+        assert tetrimino is not None, "cur_tetrimino is None"
+        key = (
+            tetrimino.no,
+            tetrimino.rot,
+            tetrimino.row + self.ghost_drop_distance(),
+            tetrimino.col,
+        )
+        if key == self.shadow_key:
+            return
+        self.shadow_key = key
+        distance = key[2] - tetrimino.row
+        self.shadow = [(x + distance, y) for x, y in tetrimino]
+
+    def next_timeout(self) -> float:
+        """seconds until gravity or lock down changes the game by itself"""
+        timeout = self.fall_speed - self.normal_fall_timer
+        if self.reach_bottom:
+            timeout = min(timeout, 0.5 - self.lock_down_timer)
+        return max(timeout, 0.0)
+
+    def apply(self, action: Action) -> None:
+        """perform a single player action"""
+        if self.observers:
+            for observer in self.observers:
+                observer.on_action(self, action)
+        self.actions[action]()
+
+    def step(
+        self,
+        actions: Iterable[Action] = (),
+        dt: float = 0.0,
+        shift: Action | None = None,
+        timed: Callable | None = None,
+    ) -> int:
+        """advance the game by `dt` seconds
+
+        the order matches one iteration of the original game loop:
+        gravity, player actions, lock down and the shadow piece. `shift`,
+        MOVE_LEFT or MOVE_RIGHT, then moves the tetrimino as far as it goes,
+        e.g. for an auto repeat rate of 0. returns how many times it moved,
+        so a recording can repeat them as plain actions.
+
+        `timed(phase, method, *args)`, when given, calls the methods of
+        `STEP_PHASES`, e.g. to time them.
+        """
+        if self.failed:
+            return 0
+        if timed is None:
+            self.normal_fall(dt)
+        else:
+            timed(FALL, self.normal_fall, dt)
+        for action in actions:
+            if self.failed:
+                return 0
+            self.apply(action)
+        moved = 0
+        if shift is not None and not self.failed:
+            moved = self.shift_to_wall(shift)
+        if timed is None:
+            self.handle_lock_down(dt)
+            self.handle_shadow()
+        else:
+            timed(LOCK, self.handle_lock_down, dt)
+            timed(SHADOW, self.handle_shadow)
+        return moved
+
+    def shift_to_wall(self, action: Action) -> int:
+        """repeat MOVE_LEFT or MOVE_RIGHT until the tetrimino stops"""
+        if action is Action.MOVE_LEFT:
+            can_move = self.check_can_move_left
+        else:
+            can_move = self.check_can_move_right
+        moved = 0
+        while can_move():
+            self.apply(action)
+            moved += 1
+        return moved
+
+    @property
+    def zobrist(self) -> int:
+        """hash of the locked cells, the falling tetrimino and the hold slot,
+        e.g. for transposition tables. timers and score are not part of it"""
+        res = self.bitboard.hash ^ HOLD_KEYS[self.hold]
+        if self.hold_once:
+            res ^= HOLD_ONCE_KEY
+        tetrimino = self.cur_tetrimino
+        if tetrimino is not None:
+            res ^= (
+                PIECE_KEYS[tetrimino.no][tetrimino.rot]
+                ^ ROW_KEYS[tetrimino.row + 4]
+                ^ COL_KEYS[tetrimino.col + 4]
+            )
+        return res
+
+    def snapshot(self) -> GameState:
+        tetrimino = self.cur_tetrimino
+        return GameState(
+            tuple(self.board),
+            tuple(self.bitboard.rows),
+            tuple(self.bitboard.tops),
+            self.bitboard.hash,
+            (
+                (tetrimino.no, tetrimino.rot, tetrimino.row, tetrimino.col)
+                if tetrimino is not None
+                else None
+            ),
+            bytes(self.bag),
+            self.hold,
+            self.hold_once,
+            self.sequence.getstate(),
+            self.score,
+            self.lines,
+            self.lines_for_level,
+            self.level,
+            self.b2b_bones,
+            self.failed,
+            self.normal_fall_timer,
+            self.lock_down_timer,
+            self.lock_down_rotate_counter,
+            self.reach_bottom,
+            self.lowest,
+            self.last_move,
+            self.pieces,
+            self.t_spins,
+            tuple(self.garbage),
+            self.sent,
+        )
+
+    def restore(self, state: GameState) -> None:
+        """go back to a snapshot, it can be restored any number of times"""
+        self.board = list(state.board)
+        self.bitboard.rows = list(state.rows)
+        self.bitboard.tops = list(state.tops)
+        self.bitboard.hash = state.hash
+
+        if state.tetrimino is None:
+            self.cur_tetrimino = None
+        else:
+            no, rot, row, col = state.tetrimino
+            if self.cur_tetrimino is None:
+                self.cur_tetrimino = Tetrimino(TetriminoShape(no))
+            tetrimino = self.cur_tetrimino
+            tetrimino.no, tetrimino.rot, tetrimino.row, tetrimino.col = no, rot, row, col
+        self.bag.clear()
+        self.bag.extend(state.bag)
+        self.hold = state.hold
+        self.hold_once = state.hold_once
+        self.sequence.setstate(state.sequence)
+
+        self.score = state.score
+        self.lines = state.lines
+        self.lines_for_level = state.lines_for_level
+        self.level = state.level
+        self.b2b_bones = state.b2b_bones
+        self.failed = state.failed
+        self.normal_fall_timer = state.normal_fall_timer
+        self.lock_down_timer = state.lock_down_timer
+        self.lock_down_rotate_counter = state.lock_down_rotate_counter
+        self.reach_bottom = state.reach_bottom
+        self.lowest = state.lowest
+        self.last_move = state.last_move
+        self.pieces = state.pieces
+        self.t_spins = state.t_spins
+        self.garbage = deque(state.garbage)
+        self.sent = state.sent
+
+        self.ghost_distance = None
+        self.shadow_key = None
+        self.shadow = []
+        if self.cur_tetrimino is not None:
+            self.handle_shadow()
+
+    def clone(self) -> "TetrisEngine":
+        """an independent headless copy of the game"""
+        game = TetrisEngine(sequence=copy.deepcopy(self.sequence))
+        game.restore(self.snapshot())
+        return game
@@ -0,0 +1,225 @@
+import asyncio
+import struct
+
+from .bitboard import BOARD_HEIGHT, BOARD_WIDTH
+from .engine import EMPTY_ROW, Action, TetrisEngine, Tetrimino, TetriminoShape
+
+# a message on the wire: payload length and type, then the payload
+MESSAGE = struct.Struct("<HB")
+
+# client -> server
+HELLO = 1  # utf-8 player name
+INPUT = 2  # one byte per action, in the order they were pressed
+PING = 3  # 8 opaque bytes that come back in a PONG
+# server -> client
+START = 16  # START_HEADER, then a length byte and utf-8 name per player
+FRAME = 17  # FRAME_HEADER, then a board delta per changed board
+OVER = 18  # slot of the winner, 255 when nobody won
+PONG = 19
+
+START_HEADER = struct.Struct("<BB")  # your slot, number of players
+FRAME_HEADER = struct.Struct("<I")  # tick
+NO_WINNER = 255
+
+# board delta: what changed on one board since the previous frame
+#   DELTA_HEADER            slot, flags
+#   PIECE    PIECE_STATE    falling tetrimino: no, rot, row, col
+#   QUEUE    QUEUE_STATE    hold, next tetriminos, hold_once
+#   GARBAGE  count byte     then GARBAGE_ENTRY (lines, hole) per entry
+#   STATS    STATS_STATE    score, lines, level, sent
+#   ROWS     ROWS_MASK      bit x set for every changed row x, then its cells
+#                           one byte each, from the top row down
+#   FAILED   no payload
+DELTA_HEADER = struct.Struct("<BB")
+PIECE_STATE = struct.Struct("<BBbb")
+QUEUE_STATE = struct.Struct("<B5sB")
+GARBAGE_ENTRY = struct.Struct("<BB")
+STATS_STATE = struct.Struct("<dIBI")
+ROWS_MASK = struct.Struct("<Q")
+
+PIECE = 1
+QUEUE = 2
+GARBAGE = 4
+STATS = 8
+ROWS = 16
+FAILED = 32
+
+PREVIEWS = 5
+ACTIONS = list(Action)
+
+
+def message(kind: int, payload: bytes = b"") -> bytes:
+    return MESSAGE.pack(len(payload), kind) + payload
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    """the next (type, payload), raises `asyncio.IncompleteReadError` when
+    the connection closed"""
+    length, kind = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+    return kind, await reader.readexactly(length)
+
+
+class BoardEncoder:
+    """encodes the changes of one board since the last `encode`
+
+    board rows are immutable tuples that the engine replaces when it writes
+    them, so a changed row is found by identity first.
+    """
+
+    def __init__(self, slot: int) -> None:
+        self.slot = slot
+        self.piece: tuple[int, ...] | None = None
+        self.queue: tuple | None = None
+        self.garbage: tuple[tuple[int, int], ...] | None = ()
+        self.stats: tuple | None = None
+        self.rows: list[tuple[int, ...] | None] = [EMPTY_ROW] * BOARD_HEIGHT
+        self.failed = False
+
+    def reset(self) -> None:
+        """forget what was sent, the next delta describes the whole board so
+        a mirror in any state catches up"""
+        self.piece = self.queue = self.garbage = self.stats = None
+        self.rows = [None] * BOARD_HEIGHT
+        self.failed = False
+
+    def encode(self, game: TetrisEngine) -> bytes:
+        """the delta to the last call, empty when nothing changed"""
+        flags = 0
+        parts = []
+
+        tetrimino = game.cur_tetrimino
+        if tetrimino is not None:
+            piece = (tetrimino.no, tetrimino.rot, tetrimino.row, tetrimino.col)
+            if piece != self.piece:
+                self.piece = piece
+                flags |= PIECE
+                parts.append(PIECE_STATE.pack(*piece))
+
+        queue = (
+            game.hold,
+            bytes(game.bag)[:PREVIEWS],
+            game.hold_once,
+        )
+        if queue != self.queue:
+            self.queue = queue
+            flags |= QUEUE
+            parts.append(QUEUE_STATE.pack(*queue))
+
+        garbage = tuple(game.garbage)
+        if garbage != self.garbage:
+            self.garbage = garbage
+            flags |= GARBAGE
+            parts.append(bytes([len(garbage)]))
+            parts.extend(GARBAGE_ENTRY.pack(*entry) for entry in garbage)
+
+        stats = (game.score, game.lines, game.level, game.sent)
+        if stats != self.stats:
+            self.stats = stats
+            flags |= STATS
+            parts.append(STATS_STATE.pack(*stats))
+
+        mask = 0
+        cells = []
+        sent = self.rows
+        for x, row in enumerate(game.board):
+            if row is not sent[x]:
+                if row != sent[x]:
+                    mask |= 1 << x
+                    cells.append(bytes(row))
+                sent[x] = row
+        if mask:
+            flags |= ROWS
+            parts.append(ROWS_MASK.pack(mask))
+            parts.extend(cells)
+
+        if game.failed and not self.failed:
+            self.failed = True
+            flags |= FAILED
+
+        if not flags:
+            return b""
+        return DELTA_HEADER.pack(self.slot, flags) + b"".join(parts)
+
+
+def keyframe(game: TetrisEngine, slot: int = 0) -> bytes:
+    """a delta of the whole board"""
+    encoder = BoardEncoder(slot)
+    encoder.reset()
+    return encoder.encode(game)
+
+
+def split_address(address: str, port: int) -> tuple[str, int] | str:
+    """(host, port) of 'HOST' or 'HOST:PORT', a path for a unix socket,
+    raises ValueError when the port is not one"""
+    if "/" in address:
+        return address
+    host, _, number = address.rpartition(":")
+    if not host:
+        return number, port
+    if not number.isdigit() or not 0 < int(number) < 65536:
+        raise ValueError(f"{number!r} in {address!r} is not a port")
+    return host, int(number)
+
+
+def mirror() -> TetrisEngine:
+    """a headless engine that only holds what the deltas describe, for a
+    renderer to draw"""
+    game = TetrisEngine(0)
+    game.bag.extend(range(1, PREVIEWS + 1))
+    return game
+
+
+def apply_frame(games: list[TetrisEngine], payload: bytes) -> int:
+    """apply the board deltas of a FRAME to the mirrored games, returns the
+    tick"""
+    (tick,) = FRAME_HEADER.unpack_from(payload)
+    offset = FRAME_HEADER.size
+    while offset < len(payload):
+        slot, flags = DELTA_HEADER.unpack_from(payload, offset)
+        offset += DELTA_HEADER.size
+        game = games[slot]
+        if flags & PIECE:
+            no, rot, row, col = PIECE_STATE.unpack_from(payload, offset)
+            offset += PIECE_STATE.size
+            if game.cur_tetrimino is None:
+                game.cur_tetrimino = Tetrimino(TetriminoShape(no))
+            tetrimino = game.cur_tetrimino
+            tetrimino.no, tetrimino.rot, tetrimino.row, tetrimino.col = no, rot, row, col
+            game.ghost_distance = None
+        if flags & QUEUE:
+            hold, bag, game.hold_once = QUEUE_STATE.unpack_from(payload, offset)
+            offset += QUEUE_STATE.size
+            game.hold = hold
+            game.bag.clear()
+            game.bag.extend(bag)
+        if flags & GARBAGE:
+            count = payload[offset]
+            offset += 1
+            game.garbage.clear()
+            for _ in range(count):
+                game.garbage.append(GARBAGE_ENTRY.unpack_from(payload, offset))
+                offset += GARBAGE_ENTRY.size
+        if flags & STATS:
+            game.score, game.lines, game.level, game.sent = STATS_STATE.unpack_from(
+                payload, offset
+            )
+            offset += STATS_STATE.size
+        if flags & ROWS:
+            (mask,) = ROWS_MASK.unpack_from(payload, offset)
+            offset += ROWS_MASK.size
+            rows = game.bitboard.rows
+            while mask:
+                x = (mask & -mask).bit_length() - 1
+                mask &= mask - 1
+                row = tuple(payload[offset : offset + BOARD_WIDTH])
+                offset += BOARD_WIDTH
+                game.board[x] = row
+                rows[x] = sum(1 << y for y, v in enumerate(row) if v)
+            game.bitboard.refresh_tops()
+            game.bitboard.rehash()
+            game.ghost_distance = None
+        if flags & FAILED:
+            game.failed = True
+        if game.cur_tetrimino is not None:
+            game.handle_shadow()
+    return tick
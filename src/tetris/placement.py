@@ -0,0 +1,236 @@
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple
+
+from .bitboard import Bitboard
+from .engine import (
+    CELL_TABLE,
+    GENERATE_POSITION,
+    KICK_TABLE,
+    MASK_TABLE,
+    Action,
+    TetriminoShape,
+    TetrisEngine,
+)
+
+T = TetriminoShape.T.value
+
+
+class Placement(NamedTuple):
+    rot: int
+    col: int
+    row: int
+    t_spin: bool  # whether locking here scores as a t-spin
+    # actions from the starting position, ending with the hard drop that
+    # locks the tetrimino
+    path: tuple[Action, ...]
+
+
+def state_key(rot: int, row: int, col: int, spin: int) -> int:
+    """pack a tetrimino state into one int, origins may sit a few cells
+    outside the board"""
+    return (((row + 4) * 16 + col + 4) * 4 + rot) * 2 + spin
+
+
+def is_t_spin(board: Bitboard, rot: int, row: int, col: int) -> bool:
+    """the engine's three corner rule, for a T that was just rotated"""
+    cx, cy = CELL_TABLE[T][rot][1]
+    cx += row
+    cy += col
+    corners = 0
+    for x, y in [
+        (cx - 1, cy - 1),
+        (cx + 1, cy - 1),
+        (cx - 1, cy + 1),
+        (cx + 1, cy + 1),
+    ]:
+        if not board.is_empty(x, y):
+            corners += 1
+    return corners >= 3
+
+
+def spawn_state(rows: tuple[int, ...], no: int) -> tuple[int, int, int]:
+    """(rot, row, col) of a freshly generated tetrimino, which moves down one
+    cell immediately when it can"""
+    board = Bitboard(len(rows))
+    board.rows = list(rows)
+    row, col = GENERATE_POSITION[TetriminoShape(no)]
+    if not board.collides(MASK_TABLE[no][0], row + 1, col):
+        row += 1
+    return 0, row, col
+
+
+def shifts(
+    board: Bitboard, no: int, rot: int, row: int, col: int, moves: list
+) -> None:
+    """append the (rot, row, col, spin, action, 1) states one move left, right
+    or rotated away, rotations take the first SRS kick that fits"""
+    collides = board.collides
+    masks = MASK_TABLE[no]
+    mask = masks[rot]
+    if not collides(mask, row, col - 1):
+        moves.append((rot, row, col - 1, 0, Action.MOVE_LEFT, 1))
+    if not collides(mask, row, col + 1):
+        moves.append((rot, row, col + 1, 0, Action.MOVE_RIGHT, 1))
+
+    spin = int(no == T)
+    kicks = KICK_TABLE[no][rot]
+    for ccw, action in ((False, Action.ROTATE_CW), (True, Action.ROTATE_CCW)):
+        next_rot = (rot - 1 if ccw else rot + 1) & 3
+        next_mask = masks[next_rot]
+        offsets = kicks[ccw]
+        for i in range(0, len(offsets), 2):
+            x = row + offsets[i]
+            y = col + offsets[i + 1]
+            if not collides(next_mask, x, y):
+                moves.append((next_rot, x, y, spin, action, 1))
+                break
+
+
+@lru_cache(maxsize=4096)
+def enumerate_placements(
+    rows: tuple[int, ...], no: int, rot: int, row: int, col: int
+) -> tuple[Placement, ...]:
+    """every distinct place a tetrimino can lock from (rot, row, col)
+
+    a breadth first search over moving left and right, rotating with SRS
+    kicks and soft dropping all the way down, so tucks and spins are found.
+    every state it reaches is locked with a hard drop, and placements that
+    cover the same cells are only reported once, unless they differ in
+    being a t-spin. the lock down move limit and gravity are not taken into
+    account.
+    """
+    board = Bitboard(len(rows))
+    board.rows = rows  # type: ignore[assignment]
+    board.refresh_tops()
+    drop_distance = board.drop_distance
+    masks = MASK_TABLE[no]
+
+    start = state_key(rot, row, col, 0)
+    parents: dict[int, tuple[int, Action, int] | None] = {start: None}
+    queue = deque([(rot, row, col, 0, start)])
+    found: dict[tuple, Placement] = {}
+
+    while queue:
+        rot, row, col, spin, key = queue.popleft()
+        mask = masks[rot]
+        moves = []
+
+        # locking by a hard drop keeps the last move, a soft drop does not
+        distance = drop_distance(mask, row, col)
+        landed = row + distance
+        t_spin = bool(spin) and is_t_spin(board, rot, landed, col)
+        top, left, _, _, bits, _ = mask
+        cells = (landed + top, col + left, bits, t_spin)
+        if cells not in found:
+            found[cells] = Placement(rot, col, landed, t_spin, path_to(parents, key))
+        if distance:
+            moves.append((rot, landed, col, 0, Action.SOFT_DROP, distance))
+
+        shifts(board, no, rot, row, col, moves)
+
+        for next_rot, x, y, next_spin, action, repeat in moves:
+            next_key = state_key(next_rot, x, y, next_spin)
+            if next_key not in parents:
+                parents[next_key] = (key, action, repeat)
+                queue.append((next_rot, x, y, next_spin, next_key))
+
+    return tuple(found.values())
+
+
+def path_to(
+    parents: dict[int, tuple[int, Action, int] | None], key: int
+) -> tuple[Action, ...]:
+    path: list[Action] = []
+    link = parents[key]
+    while link is not None:
+        key, action, repeat = link
+        path.extend([action] * repeat)
+        link = parents[key]
+    path.reverse()
+    path.append(Action.HARD_DROP)
+    return tuple(path)
+
+
+def finesse(
+    rows: tuple[int, ...], no: int, rot: int, row: int, col: int, target: Placement
+) -> tuple[Action, ...] | None:
+    """the fewest key presses that lock a tetrimino like `target`, None when
+    it can not be reached
+
+    holding soft drop for any number of rows counts as one press, so unlike
+    `enumerate_placements` the tetrimino can also stop and turn mid-air.
+    """
+    board = Bitboard(len(rows))
+    board.rows = rows  # type: ignore[assignment]
+    board.refresh_tops()
+    drop_distance = board.drop_distance
+    masks = MASK_TABLE[no]
+    top, left, _, _, bits, _ = masks[target.rot]
+    goal = (target.row + top, target.col + left, bits, target.t_spin)
+
+    start = state_key(rot, row, col, 0)
+    parents: dict[int, tuple[int, Action, int] | None] = {start: None}
+    queue = deque([(rot, row, col, 0, start)])
+
+    while queue:
+        rot, row, col, spin, key = queue.popleft()
+        mask = masks[rot]
+        moves = []
+
+        distance = drop_distance(mask, row, col)
+        landed = row + distance
+        t_spin = bool(spin) and is_t_spin(board, rot, landed, col)
+        top, left, _, _, bits, _ = mask
+        if (landed + top, col + left, bits, t_spin) == goal:
+            return path_to(parents, key)
+        for d in range(1, distance + 1):
+            moves.append((rot, row + d, col, 0, Action.SOFT_DROP, d))
+
+        shifts(board, no, rot, row, col, moves)
+
+        for next_rot, x, y, next_spin, action, repeat in moves:
+            next_key = state_key(next_rot, x, y, next_spin)
+            if next_key not in parents:
+                parents[next_key] = (key, action, repeat)
+                queue.append((next_rot, x, y, next_spin, next_key))
+
+    return None
+
+
+def keypresses(path: tuple[Action, ...]) -> int:
+    """key presses of a path, a run of soft drops is one held key"""
+    presses = 0
+    for i, action in enumerate(path):
+        if action is not Action.SOFT_DROP or i == 0 or path[i - 1] is not action:
+            presses += 1
+    return presses
+
+
+def choices(
+    queue: list[int], i: int, hold: int | None, can_hold: bool = True
+) -> list[tuple[bool, int, int, int | None]]:
+    """(held, tetrimino, next queue index, hold after) for the tetriminos
+    that can be placed next from `queue[i]` on"""
+    res = [(False, queue[i], i + 1, hold)]
+    if not can_hold:
+        return res
+    if hold is None:
+        if i + 1 < len(queue):
+            res.append((True, queue[i + 1], i + 2, queue[i]))
+    elif hold != queue[i]:
+        res.append((True, hold, i + 1, queue[i]))
+    return res
+
+
+def placements(game: TetrisEngine) -> tuple[Placement, ...]:
+    """every reachable final placement of the game's current tetrimino"""
+    tetrimino = game.cur_tetrimino
+    assert tetrimino is not None, "cur_tetrimino is None"
+    return enumerate_placements(
+        tuple(game.bitboard.rows),
+        tetrimino.no,
+        tetrimino.rot,
+        tetrimino.row,
+        tetrimino.col,
+    )
@@ -0,0 +1,342 @@
+import curses
+import os
+import sys
+
+from itertools import chain
+from typing import Iterable
+
+from .engine import EMPTY, GARBAGE, TetriminoShape, TetrisEngine
+
+GAME_WINDOW_SIZE_HEIGHT = 22
+GAME_WINDOW_SIZE_WIDTH = 50
+
+SHADOW = -1  # cell value of the shadow piece
+# shape names by value, nothing for an empty hold
+NAMES = [""] + [TetriminoShape(v).name for v in range(1, len(TetriminoShape) + 1)]
+
+VISIBLE_ROWS = 20
+BOARD_COLS = 10
+
+# colours of the cell values, on curses' 0 - 1000 scale
+PALETTE = {
+    TetriminoShape.Z.value: (941, 0, 0),
+    TetriminoShape.S.value: (0, 941, 0),
+    TetriminoShape.O.value: (941, 941, 0),
+    TetriminoShape.J.value: (0, 0, 941),
+    TetriminoShape.T.value: (627, 0, 941),
+    TetriminoShape.I.value: (0, 941, 941),
+    TetriminoShape.L.value: (941, 627, 0),
+    GARBAGE: (500, 500, 500),
+}
+
+
+def _border(left: str, fill: str, middle: str, right: str) -> str:
+    line = [fill] * GAME_WINDOW_SIZE_WIDTH
+    line[0], line[21], line[-1] = left, middle, right
+    return "".join(line)
+
+
+# (row, col, text) of everything that never changes during a game
+CHROME = [
+    (0, 0, _border("┏", "━", "┳", "┓")),
+    *((i, 0, _border("┃", " ", "┃", "┃")) for i in range(1, GAME_WINDOW_SIZE_HEIGHT - 1)),
+    (GAME_WINDOW_SIZE_HEIGHT - 1, 0, _border("┗", "━", "┻", "┛")),
+    # title
+    (3, 28, "━┳━┏━━━┳━┏━┓┳┏━╸"),
+    (4, 28, " ┃ ┣━━ ┃ ┣┳┛┃┗━┓"),
+    (5, 28, " ╹ ┗━━ ╹ ╹┗━┻━━┛"),
+]
+
+
+class Renderer:
+    """draws a game, touching only what changed since the last frame
+
+    the previous frame's cells and info texts are kept, the static chrome
+    is drawn once and again after `invalidate`. subclasses provide the
+    actual output through `draw_chrome`, `draw_cell`, `draw_text` and
+    `flush`.
+    """
+
+    def __init__(self) -> None:
+        self.cells = [EMPTY] * (VISIBLE_ROWS * BOARD_COLS)
+        self.drawn: list[int | None] = [None] * len(self.cells)
+        self.texts: dict[tuple[int, int], str] = {}
+        self.chrome_drawn = False
+
+    def invalidate(self) -> None:
+        """forget the screen content, e.g. after a resize"""
+        self.drawn = [None] * len(self.cells)
+        self.texts = {}
+        self.chrome_drawn = False
+
+    def compose(self, game: TetrisEngine) -> list[int]:
+        """the visible board with the shadow and the falling tetrimino"""
+        cells = self.cells
+        for i in range(VISIBLE_ROWS):
+            cells[i * BOARD_COLS : (i + 1) * BOARD_COLS] = game.board[
+                i + 40 - VISIBLE_ROWS
+            ]
+        offset = (40 - VISIBLE_ROWS) * BOARD_COLS
+        for x, y in game.shadow:
+            k = x * BOARD_COLS + y - offset
+            if k >= 0 and cells[k] == EMPTY:
+                cells[k] = SHADOW
+        if game.cur_tetrimino is not None:
+            for x, y in game.cur_tetrimino:
+                k = x * BOARD_COLS + y - offset
+                if k >= 0:
+                    cells[k] = game.cur_tetrimino.no
+        return cells
+
+    def info(self, game: TetrisEngine) -> list[tuple[int, int, str]]:
+        bag = game.bag
+        next_shapes = "".join(f"{NAMES[bag[i]]} " for i in range(5))
+        hold = NAMES[game.hold]
+        return [
+            (9, 27, f"Next  : {next_shapes}"),
+            (11, 27, f"Score : {game.score}"),
+            (13, 27, f"Lines : {game.lines}"),
+            (15, 27, f"Level : {game.level}"),
+            (17, 27, f"Hold  : {hold}"),
+        ]
+
+    def draw(
+        self, game: TetrisEngine, extra: Iterable[tuple[int, int, str]] = ()
+    ) -> None:
+        """draw a frame, `extra` texts are drawn and diffed like the info"""
+        if not self.chrome_drawn:
+            self.draw_chrome()
+            self.chrome_drawn = True
+
+        cells = self.compose(game)
+        drawn = self.drawn
+        for row in range(VISIBLE_ROWS):
+            start = row * BOARD_COLS
+            end = start + BOARD_COLS
+            # most rows did not change, compare them as a whole first
+            if cells[start:end] == drawn[start:end]:
+                continue
+            for k in range(start, end):
+                v = cells[k]
+                if drawn[k] != v:
+                    drawn[k] = v
+                    self.draw_cell(row, k - start, v)
+
+        for row, col, text in chain(self.info(game), extra):
+            old = self.texts.get((row, col))
+            if old != text:
+                self.texts[(row, col)] = text
+                # blank out the tail of a longer previous text
+                self.draw_text(row, col, text.ljust(len(old or "")))
+
+        self.flush()
+
+    def draw_chrome(self) -> None:
+        raise NotImplementedError
+
+    def draw_cell(self, row: int, col: int, value: int) -> None:
+        """draw board cell (row, col) of the visible 20 x 10 area"""
+        raise NotImplementedError
+
+    def draw_text(self, row: int, col: int, text: str) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+
+class CursesRenderer(Renderer):
+    def __init__(self, stdscr: curses.window) -> None:
+        super().__init__()
+        self.stdscr = stdscr
+        self.colors: list[int] = []
+
+    def invalidate(self) -> None:
+        super().invalidate()
+        self.stdscr.clear()
+
+    def draw_chrome(self) -> None:
+        for row, col, text in CHROME:
+            self.stdscr.addstr(row, col, text)
+        if not self.colors:
+            self.colors = [curses.color_pair(i) for i in range(GARBAGE + 1)]
+
+    def draw_cell(self, row: int, col: int, value: int) -> None:
+        if value == SHADOW:
+            self.stdscr.addstr(row + 1, 1 + col * 2, "[]")
+        else:
+            self.stdscr.addstr(row + 1, 1 + col * 2, "  ", self.colors[value])
+
+    def draw_text(self, row: int, col: int, text: str) -> None:
+        self.stdscr.addstr(row, col, text)
+
+    def flush(self) -> None:
+        self.stdscr.refresh()
+
+
+class VersusRenderer(CursesRenderer):
+    """the player's own board in a versus match, with the incoming garbage"""
+
+    def info(self, game: TetrisEngine) -> list[tuple[int, int, str]]:
+        incoming = sum(lines for lines, _ in game.garbage)
+        return super().info(game) + [
+            (19, 27, f"Sent  : {game.sent}"),
+            (20, 27, f"Garbage: {incoming}" if incoming else ""),
+        ]
+
+
+class OpponentRenderer(CursesRenderer):
+    """an opponent's board at half width, `left` columns from the edge"""
+
+    width = BOARD_COLS + 2
+
+    def __init__(self, stdscr: curses.window, left: int, name: str) -> None:
+        super().__init__(stdscr)
+        self.left = left
+        self.name = name
+
+    def invalidate(self) -> None:
+        # the player's own board clears the screen
+        Renderer.invalidate(self)
+
+    def draw_chrome(self) -> None:
+        left = self.left
+        self.stdscr.addstr(0, left, "┏" + "━" * BOARD_COLS + "┓")
+        for row in range(1, GAME_WINDOW_SIZE_HEIGHT - 1):
+            self.stdscr.addstr(row, left, "┃")
+            self.stdscr.addstr(row, left + BOARD_COLS + 1, "┃")
+        self.stdscr.addstr(GAME_WINDOW_SIZE_HEIGHT - 1, left, "┗" + "━" * BOARD_COLS + "┛")
+        if not self.colors:
+            self.colors = [curses.color_pair(i) for i in range(GARBAGE + 1)]
+
+    def info(self, game: TetrisEngine) -> list[tuple[int, int, str]]:
+        name = "lost" if game.failed else self.name
+        return [(0, self.left + 1, name[:BOARD_COLS])]
+
+    def draw_cell(self, row: int, col: int, value: int) -> None:
+        if value == SHADOW:
+            value = EMPTY
+        self.stdscr.addstr(row + 1, self.left + 1 + col, " ", self.colors[value])
+
+
+# escapes of the ANSI backend
+RESET = b"\x1b[0m"
+CLEAR = b"\x1b[0m\x1b[2J"
+MOVES = [
+    [b"\x1b[%d;%dH" % (row + 1, col + 1) for col in range(GAME_WINDOW_SIZE_WIDTH)]
+    for row in range(GAME_WINDOW_SIZE_HEIGHT)
+]
+
+
+def cell_colors(colors: int) -> dict[int, bytes]:
+    """the escape that sets the background of every cell value, for a
+    terminal with `colors` colours (24 bit when 1 << 24)"""
+    res = {EMPTY: RESET, SHADOW: RESET}
+    for value, rgb in PALETTE.items():
+        if colors >= 1 << 24:
+            r, g, b = (v * 255 // 1000 for v in rgb)
+            res[value] = b"\x1b[48;2;%d;%d;%dm" % (r, g, b)
+        elif colors >= 256:
+            r, g, b = (round(v * 5 / 1000) for v in rgb)
+            res[value] = b"\x1b[48;5;%dm" % (16 + 36 * r + 6 * g + b)
+        else:
+            # like curses without can_change_color: the basic colour of the
+            # same number, white for garbage
+            res[value] = b"\x1b[4%dm" % (value if value < GARBAGE else 7)
+    return res
+
+
+class AnsiRenderer(Renderer):
+    """composes a frame into one buffer of ANSI escapes, written to the
+    terminal with a single `os.write`
+
+    curses still sets up the terminal and reads the keys, only drawing
+    skips it. the cursor is moved only when a change does not follow the
+    previous one, and a colour is set only when it differs from the last.
+    """
+
+    def __init__(
+        self, stdscr: curses.window, fd: int | None = None, buffer_size: int = 1 << 14
+    ) -> None:
+        super().__init__()
+        self.stdscr = stdscr
+        self.fd = sys.stdout.fileno() if fd is None else fd
+        colors = curses.COLORS if curses.has_colors() else 8
+        if os.environ.get("COLORTERM") in ("truecolor", "24bit"):
+            colors = 1 << 24
+        self.colors = cell_colors(colors)
+        self.buffer = bytearray(buffer_size)
+        self.length = 0
+        self.cursor: tuple[int, int] | None = None
+        self.color: bytes | None = None
+
+    @staticmethod
+    def supported(fd: int | None = None) -> bool:
+        """whether the terminal takes the escapes, windows consoles may not"""
+        fd = sys.stdout.fileno() if fd is None else fd
+        return sys.platform != "win32" and os.isatty(fd) and curses.has_colors()
+
+    def invalidate(self) -> None:
+        super().invalidate()
+        self.cursor = None
+        self.color = None
+
+    def emit(self, data: bytes) -> None:
+        if self.length + len(data) > len(self.buffer):
+            self.write()
+        self.buffer[self.length : self.length + len(data)] = data
+        self.length += len(data)
+
+    def move(self, row: int, col: int) -> None:
+        if self.cursor != (row, col):
+            if col < GAME_WINDOW_SIZE_WIDTH:
+                self.emit(MOVES[row][col])
+            else:  # right of the game window
+                self.emit(b"\x1b[%d;%dH" % (row + 1, col + 1))
+
+    def set_color(self, color: bytes) -> None:
+        if self.color != color:
+            self.emit(color)
+            self.color = color
+
+    def draw_chrome(self) -> None:
+        # let curses clear the screen it thinks it owns, so it never does
+        # that later over a drawn frame
+        self.stdscr.clear()
+        self.stdscr.refresh()
+        self.emit(CLEAR)
+        self.color = RESET
+        for row, col, text in CHROME:
+            self.draw_text(row, col, text)
+
+    def draw_cell(self, row: int, col: int, value: int) -> None:
+        row += 1
+        col = 1 + col * 2
+        self.move(row, col)
+        self.set_color(self.colors[value])
+        self.emit(b"[]" if value == SHADOW else b"  ")
+        self.cursor = (row, col + 2)
+
+    def draw_text(self, row: int, col: int, text: str) -> None:
+        self.move(row, col)
+        self.set_color(RESET)
+        self.emit(text.encode())
+        self.cursor = (row, col + len(text))
+
+    def write(self) -> None:
+        view = memoryview(self.buffer)[: self.length]
+        while view:
+            view = view[os.write(self.fd, view) :]
+        self.length = 0
+
+    def flush(self) -> None:
+        if self.length:
+            self.write()
+
+
+def make_renderer(stdscr: curses.window, backend: str = "curses") -> Renderer:
+    """the renderer of a backend, "ansi" falls back to curses when the
+    terminal does not support it"""
+    if backend == "ansi" and AnsiRenderer.supported():
+        return AnsiRenderer(stdscr)
+    return CursesRenderer(stdscr)
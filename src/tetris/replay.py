@@ -0,0 +1,194 @@
+import struct
+import time
+import zlib
+
+from typing import Iterator, Sequence
+
+from .engine import Action, TetrisEngine
+
+# replay file layout
+#   header : magic, version, seed, start time (unix ms), crc32 of the above
+#   events : one record per engine step
+#            varint(delta_ms << 1 | has_actions) [varint(n), n action bytes]
+#   trailer: magic, steps, duration (ms), final score and lines, crc32 of
+#            the event bytes
+MAGIC = b"TTRP"
+END_MAGIC = b"TEND"
+# 2: a hold swaps the held tetrimino in without dropping a piece of a full bag
+# 3: the action count is a varint, 2 had one byte for it
+VERSION = 3
+HEADER = struct.Struct("<4sBQQ")
+TRAILER = struct.Struct("<4sIQdII")
+CRC = struct.Struct("<I")
+
+ACTIONS = list(Action)
+
+
+def read_varint(data: bytes | memoryview, i: int) -> tuple[int, int]:
+    """the varint at byte `i` and the offset after it"""
+    value = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, i
+
+
+class Recorder:
+    """write the steps of a game to a replay file
+
+    events are encoded straight into a preallocated buffer that is flushed
+    when nearly full, so recording a step allocates nothing.
+    """
+
+    def __init__(
+        self, path: str, seed: int | None, buffer_size: int = 1 << 16
+    ) -> None:
+        if seed is None:
+            # a replay is re-dealt from its seed
+            raise ValueError("a game dealt from a fixed sequence can not be recorded")
+        self.file = open(path, "wb")
+        header = HEADER.pack(MAGIC, VERSION, seed, time.time_ns() // 1_000_000)
+        self.file.write(header + CRC.pack(zlib.crc32(header)))
+        self.buffer = bytearray(buffer_size)
+        self.length = 0
+        self.crc = 0
+        self.steps = 0
+        self.duration = 0
+
+    def write_varint(self, value: int) -> None:
+        buffer, i = self.buffer, self.length
+        while value >= 0x80:
+            buffer[i] = value & 0x7F | 0x80
+            value >>= 7
+            i += 1
+        buffer[i] = value
+        self.length = i + 1
+
+    def record(self, delta_ms: int, actions: Sequence[Action]) -> None:
+        """record one engine step of `delta_ms` milliseconds"""
+        size = 20 + len(actions)  # two varints and the actions
+        if self.length + size > len(self.buffer):
+            self.flush()
+            if size > len(self.buffer):
+                self.buffer = bytearray(size)
+        buffer = self.buffer
+        start = self.length
+        self.write_varint(delta_ms << 1)
+        if actions:
+            # the low bit of the first byte is has_actions
+            buffer[start] |= 1
+            self.write_varint(len(actions))
+            i = self.length
+            for action in actions:
+                buffer[i] = action.value
+                i += 1
+            self.length = i
+        self.steps += 1
+        self.duration += delta_ms
+
+    def flush(self) -> None:
+        view = memoryview(self.buffer)[: self.length]
+        self.crc = zlib.crc32(view, self.crc)
+        self.file.write(view)
+        view.release()
+        self.length = 0
+
+    def close(self, game: TetrisEngine) -> None:
+        self.flush()
+        self.file.write(
+            TRAILER.pack(
+                END_MAGIC,
+                self.steps,
+                self.duration,
+                game.score,
+                game.lines,
+                self.crc,
+            )
+        )
+        self.file.close()
+
+
+class Replay:
+    """a parsed replay file, `data` can be any buffer, e.g. a slice of an
+    mmap"""
+
+    def __init__(self, data: bytes | memoryview) -> None:
+        if len(data) < HEADER.size + CRC.size + TRAILER.size:
+            raise ValueError("not a replay file, or it was cut short")
+        header = data[: HEADER.size]
+        magic, self.version, self.seed, self.started = HEADER.unpack(header)
+        if magic != MAGIC or self.version not in (2, VERSION):
+            raise ValueError("not a replay file, or an unsupported version")
+        (crc,) = CRC.unpack_from(data, HEADER.size)
+        if crc != zlib.crc32(header):
+            raise ValueError("replay header is corrupt")
+        (
+            end_magic,
+            self.steps,
+            self.duration,
+            self.score,
+            self.lines,
+            crc,
+        ) = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+        if end_magic != END_MAGIC:
+            raise ValueError("replay was not finished")
+        self.events = data[HEADER.size + CRC.size : len(data) - TRAILER.size]
+        if crc != zlib.crc32(self.events):
+            raise ValueError("replay events are corrupt")
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def __iter__(self) -> Iterator[tuple[int, list[Action]]]:
+        """(delta_ms, actions) of every recorded step"""
+        for _, delta, actions in self.steps_from():
+            yield delta, actions
+
+    def steps_from(
+        self, start: int = 0
+    ) -> Iterator[tuple[int, int, list[Action]]]:
+        """(offset, delta_ms, actions) of the steps from byte `start` of the
+        events on, offset is where the next step starts"""
+        events, i, end = self.events, start, len(self.events)
+        no_actions: list[Action] = []
+        varint_counts = self.version > 2
+        while i < end:
+            value = shift = 0
+            while True:
+                byte = events[i]
+                i += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            if value & 1:
+                n = events[i]
+                i += 1
+                if n >= 0x80 and varint_counts:
+                    n, i = read_varint(events, i - 1)
+                actions = [ACTIONS[v] for v in events[i : i + n]]
+                i += n
+                yield i, value >> 1, actions
+            else:
+                yield i, value >> 1, no_actions
+
+    def new_game(self) -> TetrisEngine:
+        game = TetrisEngine(self.seed)
+        game.init_game()
+        return game
+
+    def simulate(self, game: TetrisEngine | None = None) -> TetrisEngine:
+        """re-play the whole replay headless, as fast as possible"""
+        game = game or self.new_game()
+        for delta, actions in self:
+            game.step(actions, delta / 1000)
+        return game
+
+    def verify(self, game: TetrisEngine) -> bool:
+        """whether a re-simulated game ended like the recorded one"""
+        return game.score == self.score and game.lines == self.lines
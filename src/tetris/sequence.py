@@ -0,0 +1,84 @@
+import random
+
+from array import array
+
+SHAPES = list(range(1, 8))  # the TetriminoShape values
+
+
+class PieceSequence:
+    """an endless 7-bag stream of shape values
+
+    the bags are drawn lazily from a private `random.Random(seed)`, so the
+    same seed always deals the same tetriminos.
+    """
+
+    def __init__(self, seed: int | None = None) -> None:
+        # pick a seed when none is given, so every game can be replayed
+        self.seed: int | None = seed if seed is not None else random.getrandbits(32)
+        self.rng = random.Random(self.seed)
+        self.bags = 0  # drawn so far, a seed and this count say where it is
+
+    def next_bag(self) -> list[int]:
+        """the next 7 shape values"""
+        bag = SHAPES[::]
+        self.rng.shuffle(bag)
+        self.bags += 1
+        return bag
+
+    def getstate(self) -> object:
+        """where the sequence is, for `setstate` to go back to"""
+        return self.bags, self.rng.getstate()
+
+    def setstate(self, state: object) -> None:
+        self.bags, rng = state  # type: ignore[misc]
+        self.rng.setstate(rng)
+
+    def take(self, count: int) -> array:
+        """precompute the next `count` shapes (rounded up to whole bags)"""
+        shapes = array("B")
+        while len(shapes) < count:
+            shapes.extend(self.next_bag())
+        return shapes
+
+
+class FixedSequence(PieceSequence):
+    """a precomputed sequence, e.g. loaded from a file
+
+    it starts over from the beginning when it runs out.
+    """
+
+    def __init__(self, shapes: array | bytes | list[int]) -> None:
+        # no seed deals these shapes, so none is drawn or recorded
+        self.seed = None
+        self.shapes = array("B", shapes)
+        if not self.shapes or not all(1 <= v <= len(SHAPES) for v in self.shapes):
+            raise ValueError("a piece sequence holds shape values 1 to 7")
+        self.position = 0
+        self.bags = 0
+
+    @classmethod
+    def generate(cls, seed: int | None, count: int) -> "FixedSequence":
+        return cls(PieceSequence(seed).take(count))
+
+    @classmethod
+    def load(cls, path: str) -> "FixedSequence":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            self.shapes.tofile(f)
+
+    def getstate(self) -> object:
+        return self.bags, self.position
+
+    def setstate(self, state: object) -> None:
+        self.bags, self.position = state  # type: ignore[misc]
+
+    def next_bag(self) -> list[int]:
+        bag = []
+        for _ in range(len(SHAPES)):
+            bag.append(self.shapes[self.position])
+            self.position = (self.position + 1) % len(self.shapes)
+        self.bags += 1
+        return bag
@@ -0,0 +1,245 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from .bot import Bot
+from .engine import Action, TetrisEngine
+
+# a policy picks the actions for the next step of a game
+Policy = Callable[[TetrisEngine, random.Random], Iterable[Action]]
+
+
+class GameResult(NamedTuple):
+    seed: int
+    score: float
+    lines: int
+    level: int
+    pieces: int
+    t_spins: int
+    duration: float  # game time in seconds
+    wall_time: float  # seconds it took to simulate
+
+
+ACTIONS = list(Action)
+BOT: Bot | None = None
+
+
+def random_policy(game: TetrisEngine, rng: random.Random) -> list[Action]:
+    """press a random key on every step"""
+    return [rng.choice(ACTIONS)]
+
+
+def bot_policy(game: TetrisEngine, rng: random.Random) -> list[Action]:
+    """let the built-in bot play, one bot per worker process"""
+    global BOT
+    if BOT is None:
+        BOT = Bot()
+    return BOT.actions(game)
+
+
+def load_policy(spec: str) -> Policy:
+    """resolve a 'module:function' policy spec, bare names come from here"""
+    module, _, name = spec.rpartition(":")
+    if not module:
+        return globals()[f"{name}_policy"]
+    return getattr(importlib.import_module(module), name)
+
+
+def play_game(
+    seed: int, policy: Policy, dt: float = 1 / 60, max_steps: int = 100_000
+) -> GameResult:
+    """play one headless game until it is lost or `max_steps` ran out"""
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    game = TetrisEngine(seed)
+    game.init_game()
+    steps = 0
+    while not game.failed and steps < max_steps:
+        game.step(policy(game, rng), dt)
+        steps += 1
+    return GameResult(
+        seed,
+        game.score,
+        game.lines,
+        game.level,
+        game.pieces,
+        game.t_spins,
+        steps * dt,
+        time.perf_counter() - start,
+    )
+
+
+def play_games(
+    seeds: list[int], policy: str, dt: float, max_steps: int
+) -> list[GameResult]:
+    """worker side of `simulate`: play one chunk of games"""
+    resolved = load_policy(policy)
+    return [play_game(seed, resolved, dt, max_steps) for seed in seeds]
+
+
+def game_seeds(seed: int, games: int) -> list[int]:
+    """per game seeds, fixed by the run seed regardless of how the games
+    are spread over workers"""
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for _ in range(games)]
+
+
+def simulate(
+    games: int,
+    seed: int = 0,
+    policy: str = "random",
+    workers: int | None = None,
+    chunk_size: int = 16,
+    dt: float = 1 / 60,
+    max_steps: int = 100_000,
+) -> Iterator[GameResult]:
+    """play `games` games on a process pool, yielding results as they finish
+
+    games are sent out in chunks of `chunk_size` seeds, with at most two
+    chunks per worker in flight so memory stays flat for large runs.
+    """
+    seeds = game_seeds(seed, games)
+    chunks = (seeds[i : i + chunk_size] for i in range(0, games, chunk_size))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield from play_games(chunk, policy, dt, max_steps)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending: set[Future] = set()
+        for chunk in chunks:
+            pending.add(executor.submit(play_games, chunk, policy, dt, max_steps))
+            if len(pending) < workers * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+class Report:
+    """running aggregate of game results"""
+
+    def __init__(self) -> None:
+        self.games = 0
+        self.totals = dict.fromkeys(
+            ("score", "lines", "pieces", "t_spins", "duration", "wall_time"), 0.0
+        )
+        self.best: GameResult | None = None
+        self.worst: GameResult | None = None
+        self.levels: dict[int, int] = {}
+
+    def add(self, result: GameResult) -> None:
+        self.games += 1
+        for key in self.totals:
+            self.totals[key] += getattr(result, key)
+        self.levels[result.level] = self.levels.get(result.level, 0) + 1
+        if self.best is None or result.score > self.best.score:
+            self.best = result
+        if self.worst is None or result.score < self.worst.score:
+            self.worst = result
+
+    def summary(self) -> dict:
+        games = self.games or 1
+        return {
+            "games": self.games,
+            **{f"mean_{key}": value / games for key, value in self.totals.items()},
+            "best": self.best._asdict() if self.best else None,
+            "worst": self.worst._asdict() if self.worst else None,
+            "levels": dict(sorted(self.levels.items())),
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="tetris-sim", description="play many headless games in parallel"
+    )
+    parser.add_argument("-n", "--games", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument(
+        "-p",
+        "--policy",
+        default="random",
+        help="'module:function' called as policy(game, rng) -> actions",
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--dt", type=float, default=1 / 60, help="seconds per step")
+    parser.add_argument("--max-steps", type=int, default=100_000)
+    parser.add_argument(
+        "-o", "--output", help="stream one JSON line per finished game to this file"
+    )
+    parser.add_argument(
+        "--db",
+        metavar="PATH",
+        help="also keep every game in this stats database, for `tetris stats`",
+    )
+    args = parser.parse_args()
+
+    report = Report()
+    start = time.perf_counter()
+    output = open(args.output, "w") if args.output else None
+    writer = None
+    if args.db:
+        # sqlite is only loaded when asked for, workers never need it
+        from .store import GameRecord, Writer
+
+        writer = Writer(args.db)
+    try:
+        for result in simulate(
+            args.games,
+            args.seed,
+            args.policy,
+            args.workers,
+            args.chunk_size,
+            args.dt,
+            args.max_steps,
+        ):
+            report.add(result)
+            if output:
+                output.write(json.dumps(result._asdict()) + "\n")
+            if writer is not None:
+                writer.add(
+                    GameRecord(
+                        time.time(),
+                        args.policy,
+                        "sim",
+                        result.seed,
+                        result.score,
+                        result.lines,
+                        result.level,
+                        result.pieces,
+                        result.t_spins,
+                        result.duration,
+                        result.pieces / result.duration if result.duration else 0.0,
+                        None,
+                    )
+                )
+    finally:
+        if output:
+            output.close()
+        if writer is not None and (error := writer.close()) is not None:
+            print(
+                f"can not write to {args.db}, {writer.dropped} games are not kept:",
+                error,
+                file=sys.stderr,
+            )
+    summary = report.summary()
+    summary["elapsed"] = time.perf_counter() - start
+    summary["games_per_second"] = report.games / summary["elapsed"]
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
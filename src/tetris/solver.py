@@ -0,0 +1,401 @@
+from collections import deque
+from functools import lru_cache
+from multiprocessing import Pool
+from typing import NamedTuple
+
+from .bitboard import BOARD_WIDTH, FULL_ROW, Bitboard
+from .engine import EMPTY, MASK_TABLE, Action, TetriminoShape, TetrisEngine
+from .placement import Placement, choices, finesse, shifts, spawn_state
+
+T = TetriminoShape.T.value
+
+# the rows of the region are packed `STRIDE` bits apart, the bit between
+# them stays empty so a flood fill can not wrap from one row to the next
+STRIDE = BOARD_WIDTH + 1
+
+
+def cells_table() -> list[list[tuple[tuple, tuple]]]:
+    """(cells, column tops) of every mask, as (box row, box column) pairs"""
+    table: list[list[tuple[tuple, tuple]]] = [[]]
+    for masks in MASK_TABLE[1:]:
+        table.append([])
+        for _, _, height, width, bits, _ in masks:
+            cells = [
+                (k, j) for k in range(height) for j in range(width) if bits[k] >> j & 1
+            ]
+            tops = [min(c for c in cells if c[1] == j) for j in range(width)]
+            table[-1].append((tuple(cells), tuple(tops)))
+    return table
+
+
+CELLS_TABLE = cells_table()
+
+
+class Move(NamedTuple):
+    hold: bool  # hold before placing
+    placement: Placement
+
+
+class Search:
+    """depth first search for a perfect clear
+
+    a state is the board, the position in the queue and the hold slot.
+    states that were shown to fail are remembered, so a board reached by
+    placing the same tetriminos in another order is only searched once.
+    """
+
+    def __init__(self, queue: list[int], max_height: int = 4) -> None:
+        self.queue = queue
+        self.max_height = max_height
+        self.failed: set[tuple] = set()
+        self.nodes = 0
+
+    def solve(
+        self,
+        rows: tuple[int, ...],
+        i: int,
+        hold: int | None,
+        can_hold: bool = True,
+        start: tuple[int, int, int] | None = None,
+    ) -> list[Move] | None:
+        """the moves that clear the board from `queue[i]` on, `start` is the
+        (rot, row, col) of `queue[i]` when it is not at its spawn position"""
+        height = stack_height(rows)
+        for target in range(max(height, 1), self.max_height + 1):
+            if self.feasible(rows, target, i, hold):
+                moves = self.search(rows, target, i, hold, can_hold, start)
+                if moves is not None:
+                    return moves
+        return None
+
+    def feasible(
+        self, rows: tuple[int, ...], height: int, i: int, hold: int | None
+    ) -> bool:
+        """whether the tetriminos left could fill the bottom `height` rows,
+        going by cell count, checkerboard parity and enclosed areas"""
+        end = len(rows)
+        empty = 0
+        region = 0
+        black = 0
+        for x in range(end - height, end):
+            free = FULL_ROW & ~rows[x]
+            empty += free.bit_count()
+            region = region << STRIDE | free
+            # cells whose row + column is odd
+            black += (free & (0x155 if x & 1 else 0x2AA)).bit_count()
+        if empty % 4:
+            return False
+        pieces = empty // 4
+        left = self.queue[i:]
+        if hold is not None:
+            left = [hold] + left
+        if pieces > len(left):
+            return False
+        # every tetrimino but T covers two cells of each colour, a T covers
+        # three of one colour. holding lets one more tetrimino take part
+        if abs(2 * black - empty) > 2 * left[: pieces + 1].count(T):
+            return False
+        return enclosed_areas_fit(region)
+
+    def search(
+        self,
+        rows: tuple[int, ...],
+        height: int,
+        i: int,
+        hold: int | None,
+        can_hold: bool,
+        start: tuple[int, int, int] | None = None,
+    ) -> list[Move] | None:
+        if i >= len(self.queue) and hold is None:
+            return None
+        key = (rows[len(rows) - height :], height, i, hold, can_hold)
+        if key in self.failed or not self.feasible(rows, height, i, hold):
+            return None
+        self.nodes += 1
+
+        for held, no, next_i, next_hold in self.choices(i, hold, can_hold):
+            state = start if start is not None and not held else spawn_state(rows, no)
+            for rot, row, col, straight in self.candidates(rows, height, no):
+                child, cleared = place(rows, no, rot, row, col)
+                if any(child):
+                    if not self.feasible(child, height - cleared, next_i, next_hold):
+                        continue
+                    if not straight and not reachable(rows, height, no, rot, row, col):
+                        continue
+                    moves = self.search(
+                        child, height - cleared, next_i, next_hold, True
+                    )
+                    if moves is None:
+                        continue
+                else:
+                    if not straight and not reachable(rows, height, no, rot, row, col):
+                        continue
+                    moves = []
+                # a tetrimino that already moved may not get there any more
+                found = finesse_path(rows, no, state, rot, row, col)
+                if found is None:
+                    continue
+                path, t_spin = found
+                return [Move(held, Placement(rot, col, row, t_spin, path))] + moves
+        self.failed.add(key)
+        return None
+
+    def candidates(
+        self, rows: tuple[int, ...], height: int, no: int
+    ) -> list[tuple[int, int, int, bool]]:
+        """(rot, row, col, straight) of the places a tetrimino can rest on
+        inside the bottom `height` rows, one for each set of cells
+
+        `straight` is whether it can fall straight down from above the
+        stack, the others need `reachable` to check for a tuck or spin.
+        every test is done for all columns at once, bit y of a mask stands
+        for the tetrimino's box at column y.
+        """
+        end = len(rows)
+        first = end - height
+        # covered[x]: columns with a filled cell in the region above row x
+        covered = [0] * (end + 1)
+        for x in range(first, end):
+            covered[x + 1] = covered[x] | rows[x]
+        res = []
+        seen = set()
+        for rot in range(4):
+            top, left, size, width, bits, _ = MASK_TABLE[no][rot]
+            cells, tops = CELLS_TABLE[no][rot]
+            columns = (1 << (BOARD_WIDTH - width + 1)) - 1
+            # lowest first, filling the region from the bottom finds
+            # solutions sooner
+            for x in range(end - size, first - 1, -1):
+                fits = columns
+                for k, j in cells:
+                    fits &= ~rows[x + k] >> j
+                if not fits:
+                    continue
+                # it has to rest on the floor or the stack
+                if x + size < end:
+                    rests = 0
+                    for k, j in cells:
+                        rests |= rows[x + k + 1] >> j
+                    fits &= rests
+                straight = columns
+                for k, j in tops:
+                    straight &= ~covered[x + k] >> j
+                while fits:
+                    y = (fits & -fits).bit_length() - 1
+                    fits &= fits - 1
+                    if (x, y, bits) not in seen:
+                        seen.add((x, y, bits))
+                        res.append((rot, x - top, y - left, straight >> y & 1 == 1))
+        return res
+
+    def choices(
+        self, i: int, hold: int | None, can_hold: bool
+    ) -> list[tuple[bool, int, int, int | None]]:
+        if i >= len(self.queue):
+            # only the held tetrimino is left, it takes a hold to play it
+            return [(True, hold, i, None)] if hold is not None and can_hold else []
+        return choices(self.queue, i, hold, can_hold)
+
+
+def reachable(
+    rows: tuple[int, ...], height: int, no: int, rot: int, row: int, col: int
+) -> bool:
+    """whether a tetrimino can be brought to rest at (rot, row, col) from
+    above the bottom `height` rows"""
+    top, left, _, _, bits, _ = MASK_TABLE[no][rot]
+    if slides(rows, len(rows) - height, no, rot, row + top, col + left):
+        return True
+    return (row + top, col + left, bits) in tucks(rows, no, height)
+
+
+def slides(
+    rows: tuple[int, ...], first: int, no: int, rot: int, x: int, y: int
+) -> bool:
+    """whether a tetrimino can get to box row `x` and column `y` by moving
+    sideways and up, that is without rotating, from above row `first`
+
+    the columns the box fits in are a bit mask per row, so every row is a
+    flood fill of a few shifts.
+    """
+    size, width = MASK_TABLE[no][rot][2:4]
+    cells, _ = CELLS_TABLE[no][rot]
+    columns = (1 << (BOARD_WIDTH - width + 1)) - 1
+    area = 1 << y
+    while x + size > first:
+        fits = columns
+        for k, j in cells:
+            fits &= ~rows[x + k] >> j
+        area &= fits
+        while True:
+            grown = (area | area << 1 | area >> 1) & fits
+            if grown == area:
+                break
+            area = grown
+        if not area:
+            return False
+        x -= 1
+    return True
+
+
+@lru_cache(maxsize=4096)
+def tucks(rows: tuple[int, ...], no: int, height: int) -> set[tuple[int, int, int]]:
+    """(top row, left column, bits) of every place a tetrimino can lock on
+    when the board above the bottom `height` rows is empty
+
+    any rotation and column can be dropped in from above, so the search
+    starts from where those land instead of from the spawn position.
+    """
+    board = Bitboard(len(rows))
+    board.rows = rows  # type: ignore[assignment]
+    board.refresh_tops()
+    masks = MASK_TABLE[no]
+    above = len(rows) - height - 4
+    queue: deque[tuple[int, int, int]] = deque()
+    seen = set()
+    for rot in range(4):
+        for col in range(-3, BOARD_WIDTH):
+            if not board.collides(masks[rot], above, col):
+                state = rot, above + board.drop_distance(masks[rot], above, col), col
+                seen.add(state)
+                queue.append(state)
+
+    res = set()
+    moves: list[tuple] = []
+    while queue:
+        rot, row, col = queue.popleft()
+        top, left, _, _, bits, _ = masks[rot]
+        distance = board.drop_distance(masks[rot], row, col)
+        res.add((row + distance + top, col + left, bits))
+        moves.clear()
+        if distance:
+            moves.append((rot, row + distance, col, 0, Action.SOFT_DROP, distance))
+        shifts(board, no, rot, row, col, moves)
+        for next_rot, x, y, _, _, _ in moves:
+            if (next_rot, x, y) not in seen:
+                seen.add((next_rot, x, y))
+                queue.append((next_rot, x, y))
+    return res
+
+
+def finesse_path(
+    rows: tuple[int, ...],
+    no: int,
+    state: tuple[int, int, int],
+    rot: int,
+    row: int,
+    col: int,
+) -> tuple[tuple[Action, ...], bool] | None:
+    """the fewest key presses to lock a tetrimino at (rot, row, col) and
+    whether they make it a t-spin, which they only do when it can not be
+    reached otherwise. None when it can not be reached from `state`"""
+    for t_spin in (False, True):
+        path = finesse(rows, no, *state, Placement(rot, col, row, t_spin, ()))
+        if path is not None:
+            return path, t_spin
+    return None
+
+
+def stack_height(rows: tuple[int, ...]) -> int:
+    for x, row in enumerate(rows):
+        if row:
+            return len(rows) - x
+    return 0
+
+
+def place(
+    rows: tuple[int, ...], no: int, rot: int, row: int, col: int
+) -> tuple[tuple[int, ...], int]:
+    """the rows after locking a tetrimino, and the lines it cleared"""
+    top, left, _, _, bits, _ = MASK_TABLE[no][rot]
+    x = row + top
+    y = col + left
+    board = list(rows)
+    for k, b in enumerate(bits):
+        board[x + k] |= b << y
+    kept = [row for row in board if row != FULL_ROW]
+    cleared = len(board) - len(kept)
+    return tuple([0] * cleared + kept), cleared
+
+
+def enclosed_areas_fit(region: int) -> bool:
+    """whether every connected area of empty cells could be filled by
+    tetriminos, that is whether it has a multiple of 4 cells"""
+    edge = (1 << BOARD_WIDTH) - 1
+    row_mask = 0
+    for _ in range(region.bit_length() // STRIDE + 1):
+        row_mask = row_mask << STRIDE | edge
+    region &= row_mask
+    while region:
+        area = region & -region
+        while True:
+            grown = (
+                area | area << 1 | area >> 1 | area << STRIDE | area >> STRIDE
+            ) & region
+            if grown == area:
+                break
+            area = grown
+        if area.bit_count() % 4:
+            return False
+        region &= ~area
+    return True
+
+
+def solve_from(task: tuple) -> tuple[int, list[Move] | None]:
+    """worker side of `perfect_clear`: search below one first move, `task`
+    starts with its number"""
+    n, queue, rows, height, i, hold, max_height = task
+    if not any(rows):
+        return n, []
+    return n, Search(queue, max_height).search(rows, height, i, hold, True)
+
+
+def perfect_clear(
+    game: TetrisEngine,
+    previews: int = 14,
+    max_height: int = 4,
+    workers: int = 1,
+) -> list[Move] | None:
+    """the moves that clear the whole board with the current tetrimino and
+    the next `previews` ones, None when it can not be done
+
+    with several `workers` the first moves are searched in separate
+    processes.
+    """
+    tetrimino = game.cur_tetrimino
+    assert tetrimino is not None, "cur_tetrimino is None"
+    previews = min(previews, len(game.bag))
+    queue = [tetrimino.no] + [game.bag[i] for i in range(previews)]
+    hold = game.hold if game.hold != EMPTY else None
+    rows = tuple(game.bitboard.rows)
+    start = tetrimino.rot, tetrimino.row, tetrimino.col
+    search = Search(queue, max_height)
+    if workers == 1:
+        return search.solve(rows, 0, hold, not game.hold_once, start)
+
+    # leaving the pool terminates the workers, so the searches below the
+    # other first moves are not waited for once one of them succeeded
+    with Pool(workers) as pool:
+        for height in range(max(stack_height(rows), 1), max_height + 1):
+            if not search.feasible(rows, height, 0, hold):
+                continue
+            firsts = []
+            tasks = []
+            for held, no, i, next_hold in search.choices(0, hold, not game.hold_once):
+                state = start if not held else spawn_state(rows, no)
+                for rot, row, col, straight in search.candidates(rows, height, no):
+                    if not straight and not reachable(rows, height, no, rot, row, col):
+                        continue
+                    child, cleared = place(rows, no, rot, row, col)
+                    task = (len(tasks), queue, child, height - cleared, i, next_hold)
+                    tasks.append(task + (max_height,))
+                    firsts.append((held, no, state, rot, row, col))
+            for n, moves in pool.imap_unordered(solve_from, tasks):
+                if moves is None:
+                    continue
+                held, no, state, rot, row, col = firsts[n]
+                found = finesse_path(rows, no, state, rot, row, col)
+                if found is None:
+                    continue
+                path, t_spin = found
+                return [Move(held, Placement(rot, col, row, t_spin, path))] + moves
+    return None
@@ -0,0 +1,244 @@
+import asyncio
+import curses
+import os
+import selectors
+import socket
+import stat
+
+from collections import deque
+from typing import Container
+
+from .engine import TetrisEngine
+from .net import (
+    FRAME,
+    FRAME_HEADER,
+    NO_WINNER,
+    OVER,
+    BoardEncoder,
+    apply_frame,
+    keyframe,
+    message,
+    mirror,
+    read_message,
+    split_address,
+)
+from .render import CursesRenderer
+
+DEFAULT_PORT = 7778
+# bytes queued for a spectator before its frames are dropped, it gets a
+# keyframe once it caught up
+BACKLOG = 1 << 16
+
+
+class Subscriber:
+    """a spectator connection and the frames it has yet to receive
+
+    the queued frames are views of the bytes every spectator shares, the
+    first one may be partly sent.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.pending: deque[memoryview] = deque()
+        self.queued = 0
+        self.partial = False
+        self.stale = True  # its mirror needs a keyframe
+
+    def push(self, frame: memoryview) -> None:
+        self.pending.append(frame)
+        self.queued += len(frame)
+
+    def drop(self) -> None:
+        """forget the queued frames, except what is left of a partly sent one
+        so the stream stays intact"""
+        head = self.pending[0] if self.partial else None
+        self.pending.clear()
+        self.queued = 0
+        if head is not None:
+            self.push(head)
+        self.stale = True
+
+    def flush(self) -> None:
+        """send as much as the socket takes without blocking, raises
+        `OSError` when the spectator went away"""
+        pending = self.pending
+        while pending:
+            head = pending[0]
+            try:
+                sent = self.sock.send(head)
+            except BlockingIOError:
+                return
+            self.queued -= sent
+            if sent < len(head):
+                pending[0] = head[sent:]
+                self.partial = True
+                return
+            pending.popleft()
+            self.partial = False
+
+
+def remove_stale_socket(path: str) -> None:
+    """unlink the socket file of a broadcast that did not close, e.g. one that
+    crashed. a socket somebody still listens on is kept, bind fails on it"""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+
+
+class Broadcaster:
+    """streams a game to any number of spectators
+
+    it never blocks the game: sockets are non-blocking and `poll` is called
+    from the game loop. a frame is encoded once and its bytes are shared by
+    every spectator. one that falls `BACKLOG` bytes behind has its frames
+    dropped and catches up with a keyframe, which is also encoded once per
+    frame for every spectator that needs it.
+    """
+
+    def __init__(self, address: str) -> None:
+        target = split_address(address, DEFAULT_PORT)
+        self.path = target if isinstance(target, str) else None
+        if isinstance(target, str):
+            remove_stale_socket(target)
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(target)
+        self.listener.listen()
+        self.listener.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.subscribers: list[Subscriber] = []
+        self.encoder = BoardEncoder(0)
+        self.frame = 0
+
+    def poll(self) -> None:
+        """accept spectators, notice the ones that left and send what is
+        queued"""
+        for key, _ in self.selector.select(0):
+            if key.fileobj is self.listener:
+                self.accept()
+            else:
+                self.receive(key.data)
+        for subscriber in self.subscribers[:]:
+            self.flush(subscriber)
+
+    def accept(self) -> None:
+        try:
+            sock, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        subscriber = Subscriber(sock)
+        self.subscribers.append(subscriber)
+        self.selector.register(sock, selectors.EVENT_READ, subscriber)
+
+    def receive(self, subscriber: Subscriber) -> None:
+        """spectators send nothing, readable means they hung up"""
+        try:
+            data = subscriber.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.remove(subscriber)
+
+    def flush(self, subscriber: Subscriber) -> None:
+        try:
+            subscriber.flush()
+        except OSError:
+            self.remove(subscriber)
+
+    def remove(self, subscriber: Subscriber) -> None:
+        self.subscribers.remove(subscriber)
+        self.selector.unregister(subscriber.sock)
+        subscriber.sock.close()
+
+    def publish(self, game: TetrisEngine) -> None:
+        """send what changed since the last call, e.g. once per drawn frame"""
+        delta = self.encoder.encode(game)
+        header = FRAME_HEADER.pack(self.frame)
+        self.frame += 1
+        frame = memoryview(message(FRAME, header + delta)) if delta else None
+        key = None
+        for subscriber in self.subscribers[:]:
+            if subscriber.stale:
+                # wait for the backlog to drain before catching up
+                if subscriber.queued:
+                    self.flush(subscriber)
+                    continue
+                if key is None:
+                    key = memoryview(message(FRAME, header + keyframe(game)))
+                subscriber.stale = False
+                subscriber.push(key)
+            elif frame is not None:
+                subscriber.push(frame)
+            else:
+                continue
+            if subscriber.queued > BACKLOG:
+                subscriber.drop()
+            self.flush(subscriber)
+
+    def close(self, game: TetrisEngine) -> None:
+        """send the final frame and the end of the game, best effort"""
+        self.publish(game)
+        over = memoryview(message(OVER, bytes([NO_WINNER])))
+        for subscriber in self.subscribers[:]:
+            if not subscriber.stale:
+                subscriber.push(over)
+                self.flush(subscriber)
+        for subscriber in self.subscribers[:]:
+            self.remove(subscriber)
+        self.selector.close()
+        self.listener.close()
+        if self.path is not None:
+            os.unlink(self.path)
+
+
+async def watch(
+    stdscr: curses.window, address: str, quit_keys: Container[int]
+) -> str:
+    """draw a broadcast game until it ends"""
+    target = split_address(address, DEFAULT_PORT)
+    if isinstance(target, str):
+        reader, writer = await asyncio.open_unix_connection(target)
+    else:
+        reader, writer = await asyncio.open_connection(*target)
+    renderer = CursesRenderer(stdscr)
+    games = [mirror()]
+    stdscr.addstr(0, 0, f"watching {address}")
+    stdscr.refresh()
+
+    async def keys() -> None:
+        while True:
+            c = stdscr.getch()
+            if c in quit_keys:
+                writer.close()
+                return
+            if c == curses.KEY_RESIZE:
+                renderer.invalidate()
+            await asyncio.sleep(0.05)
+
+    task = asyncio.create_task(keys())
+    try:
+        while True:
+            kind, payload = await read_message(reader)
+            if kind == FRAME:
+                apply_frame(games, payload)
+                renderer.draw(games[0])
+            elif kind == OVER:
+                return "game over"
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return "quit" if task.done() else "the game went away"
+    finally:
+        task.cancel()
+        writer.close()
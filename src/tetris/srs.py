@@ -0,0 +1,249 @@
+import argparse
+import os
+import sys
+
+from collections import defaultdict
+
+from .bitboard import piece_mask
+from .engine import Direction, TetriminoShape
+
+# the rotation tables of the engine are derived from the shapes, their
+# rotation axes and the wall kicks of the guideline below, and frozen into
+# srs_data so importing the engine does none of this work. run
+# `python -m tetris.srs` after changing anything here, `--check` fails when
+# srs_data is stale
+DATA_PATH = os.path.join(os.path.dirname(__file__), "srs_data.py")
+
+
+def rotate_points(
+    points: list[tuple[int, int]],
+    center: list[int | tuple[int, int]],
+    ccw: bool = False,
+) -> list[tuple[int, int]]:
+    """rotate the point 90 degree"""
+    if isinstance(center[0], (list, tuple)):
+        cr = (center[0][0] + center[0][1]) / 2.0
+        cc = (center[1][0] + center[1][1]) / 2.0  # type: ignore
+    else:
+        cr, cc = float(center[0]), float(center[1])  # type: ignore
+
+    rotated_points = []
+
+    for r, c in points:
+        rel_r = r - cr
+        rel_c = c - cc
+        new_rel_r = -rel_c if ccw else rel_c
+        new_rel_c = rel_r if ccw else -rel_r
+        new_r = int(new_rel_r + cr)
+        new_c = int(new_rel_c + cc)
+
+        rotated_points.append((new_r, new_c))
+
+    return rotated_points
+
+
+SHAPE_TABLE = {
+    TetriminoShape.I: [(0, 0), (0, 1), (0, 2), (0, 3)],
+    TetriminoShape.J: [(0, 0), (1, 0), (1, 1), (1, 2)],
+    TetriminoShape.L: [(0, 0), (0, 1), (0, 2), (-1, 2)],
+    TetriminoShape.O: [(0, 0), (0, 1), (1, 0), (1, 1)],
+    TetriminoShape.S: [(0, 0), (0, 1), (-1, 1), (-1, 2)],
+    TetriminoShape.T: [(0, 0), (0, 1), (-1, 1), (0, 2)],
+    TetriminoShape.Z: [(0, 0), (0, 1), (1, 1), (1, 2)],
+}
+
+ROTATE_AXIS = {
+    TetriminoShape.I: [(0, 1), (1, 2)],
+    TetriminoShape.J: [1, 1],
+    TetriminoShape.L: [0, 1],
+    TetriminoShape.O: [(0, 1), (0, 1)],
+    TetriminoShape.S: [0, 1],
+    TetriminoShape.T: [0, 1],
+    TetriminoShape.Z: [1, 1],
+}
+
+
+# SRS system
+ROTATE_TABLE = defaultdict(lambda: defaultdict(dict))
+
+
+JLSTZ_WALL_KICK_OFFSET = {
+    (Direction.NORTH, Direction.EAST): [(0, 0), (0, -1), (-1, -1), (2, 0), (2, -1)],
+    (Direction.EAST, Direction.NORTH): [(0, 0), (0, 1), (1, 1), (-2, 0), (-2, 1)],
+    (Direction.EAST, Direction.SOUTH): [(0, 0), (0, 1), (1, 1), (-2, 0), (-2, 1)],
+    (Direction.SOUTH, Direction.EAST): [(0, 0), (0, -1), (-1, -1), (2, 0), (2, -1)],
+    (Direction.SOUTH, Direction.WEST): [(0, 0), (0, 1), (-1, 1), (2, 0), (2, 1)],
+    (Direction.WEST, Direction.SOUTH): [(0, 0), (0, -1), (1, -1), (-2, 0), (-2, -1)],
+    (Direction.WEST, Direction.NORTH): [(0, 0), (0, -1), (1, -1), (-2, 0), (-2, -1)],
+    (Direction.NORTH, Direction.WEST): [(0, 0), (0, 1), (-1, 1), (2, 0), (2, 1)],
+}
+
+O_WALL_KICK_OFFSET = {
+    (Direction.NORTH, Direction.EAST): [(0, 0)],
+    (Direction.EAST, Direction.NORTH): [(0, 0)],
+    (Direction.EAST, Direction.SOUTH): [(0, 0)],
+    (Direction.SOUTH, Direction.EAST): [(0, 0)],
+    (Direction.SOUTH, Direction.WEST): [(0, 0)],
+    (Direction.WEST, Direction.SOUTH): [(0, 0)],
+    (Direction.WEST, Direction.NORTH): [(0, 0)],
+    (Direction.NORTH, Direction.WEST): [(0, 0)],
+}
+
+I_WALL_KICK_OFFSET = {
+    (Direction.NORTH, Direction.EAST): [(0, 0), (0, -2), (0, 1), (1, -2), (-2, 1)],
+    (Direction.EAST, Direction.NORTH): [(0, 0), (0, 2), (0, -1), (-1, 2), (2, -1)],
+    (Direction.EAST, Direction.SOUTH): [(0, 0), (0, -1), (0, 2), (-2, -1), (1, 2)],
+    (Direction.SOUTH, Direction.EAST): [(0, 0), (0, 1), (0, -2), (2, 1), (-1, -2)],
+    (Direction.SOUTH, Direction.WEST): [(0, 0), (0, 2), (0, -1), (-1, 2), (2, -1)],
+    (Direction.WEST, Direction.SOUTH): [(0, 0), (0, -2), (0, 1), (1, -2), (-2, 1)],
+    (Direction.WEST, Direction.NORTH): [(0, 0), (0, 1), (0, -2), (2, 1), (-1, -2)],
+    (Direction.NORTH, Direction.WEST): [(0, 0), (0, -1), (0, 2), (-2, -1), (1, 2)],
+}
+
+# build the ROTATE_TABLE
+for shape in list(TetriminoShape):
+    directions = list(Direction)
+    _cw = [
+        (directions[i], directions[(i + 1) % len(directions)], False)
+        for i in range(len(directions))
+    ]
+    _ccw = [
+        (
+            directions[i],
+            directions[(len(directions) + (i - 1)) % len(directions)],
+            True,
+        )
+        for i in range(0, -len(directions), -1)
+    ]
+
+    cur_pos = SHAPE_TABLE[shape][::]
+    for start, end, ccw in _cw + _ccw:
+        rotated = rotate_points(cur_pos, ROTATE_AXIS[shape], ccw)
+        diff = [(rx - x, ry - y) for (rx, ry), (x, y) in list(zip(rotated, cur_pos))]
+        cur_pos = rotated
+
+        ROTATE_TABLE[shape][(start, end)]["standard_rotate_diff"] = diff
+
+        if shape == TetriminoShape.I:
+            ROTATE_TABLE[shape][(start, end)]["offsets"] = I_WALL_KICK_OFFSET[
+                (start, end)
+            ]
+        elif shape == TetriminoShape.O:
+            ROTATE_TABLE[shape][(start, end)]["offsets"] = O_WALL_KICK_OFFSET[
+                (start, end)
+            ]
+        else:
+            ROTATE_TABLE[shape][(start, end)]["offsets"] = JLSTZ_WALL_KICK_OFFSET[
+                (start, end)
+            ]
+
+
+def build_rotation_states():
+    """derive the rotation state tables from SHAPE_TABLE and ROTATE_TABLE"""
+    directions = list(Direction)
+    cells: list = [()] * (len(TetriminoShape) + 1)
+    masks: list = [()] * (len(TetriminoShape) + 1)
+    kicks: list = [()] * (len(TetriminoShape) + 1)
+    for shape in list(TetriminoShape):
+        states = [tuple(SHAPE_TABLE[shape])]
+        for i, direction in enumerate(directions):
+            diff = ROTATE_TABLE[shape][(direction, directions[(i + 1) % 4])][
+                "standard_rotate_diff"
+            ]
+            states.append(
+                tuple((x + dx, y + dy) for (x, y), (dx, dy) in zip(states[i], diff))
+            )
+        # four cw turns around the axis must bring the tetrimino back
+        assert states.pop() == states[0], f"{shape} rotation does not cycle"
+        # and a ccw turn must undo a cw one
+        for i, direction in enumerate(directions):
+            diff = ROTATE_TABLE[shape][(direction, directions[i - 1])][
+                "standard_rotate_diff"
+            ]
+            ccw = tuple((x + dx, y + dy) for (x, y), (dx, dy) in zip(states[i], diff))
+            assert ccw == states[i - 1], f"{shape} ccw rotation mismatch"
+
+        cells[shape.value] = tuple(states)
+        masks[shape.value] = tuple(piece_mask(list(state)) for state in states)
+        kicks[shape.value] = tuple(
+            tuple(
+                tuple(
+                    v
+                    for offset in ROTATE_TABLE[shape][(direction, end)]["offsets"]
+                    for v in offset
+                )
+                for end in (directions[(i + 1) % 4], directions[i - 1])
+            )
+            for i, direction in enumerate(directions)
+        )
+    return tuple(cells), tuple(masks), tuple(kicks)
+
+
+HEADER = '''\
+# generated by `python -m tetris.srs` from the shapes, rotation axes and wall
+# kicks in srs.py, do not edit. indexed by [shape value][rotation index]
+'''
+
+TYPES = {
+    "CELL_TABLE": "tuple[tuple[tuple[tuple[int, int], ...], ...], ...]",
+    "MASK_TABLE": "tuple[tuple[PieceMask, ...], ...]",
+    "KICK_TABLE": "tuple[tuple[tuple[tuple[int, ...], tuple[int, ...]], ...], ...]",
+}
+
+
+def render_table(name: str, table: tuple) -> list[str]:
+    """a table as source, one rotation state per line"""
+    lines = [f"{name}: {TYPES[name]} = (", "    (),"]
+    for no in range(1, len(table)):
+        lines.append(f"    (  # {TetriminoShape(no).name}")
+        lines += [f"        {state!r}," for state in table[no]]
+        lines.append("    ),")
+    lines.append(")")
+    return lines
+
+
+def render(tables: tuple) -> str:
+    """the source of `srs_data`"""
+    lines = [HEADER, "from .bitboard import PieceMask", ""]
+    for name, table in zip(TYPES, tables):
+        lines.append("")
+        lines += render_table(name, table)
+    return "\n".join(lines) + "\n"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m tetris.srs")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="compare srs_data with the generator instead of writing it",
+    )
+    args = parser.parse_args()
+
+    tables = build_rotation_states()
+    source = render(tables)
+    if args.check:
+        from . import srs_data
+
+        stale = [
+            name
+            for name, table in zip(TYPES, tables)
+            if getattr(srs_data, name) != table
+        ]
+        with open(DATA_PATH) as f:
+            if not stale and f.read() != source:
+                stale.append("formatting")
+        if stale:
+            print(f"srs_data is stale ({', '.join(stale)}), run python -m tetris.srs")
+            return 1
+        print("srs_data matches the generator")
+        return 0
+
+    with open(DATA_PATH, "w") as f:
+        f.write(source)
+    print(f"wrote {DATA_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
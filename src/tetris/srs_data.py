@@ -0,0 +1,143 @@
+# generated by `python -m tetris.srs` from the shapes, rotation axes and wall
+# kicks in srs.py, do not edit. indexed by [shape value][rotation index]
+
+from .bitboard import PieceMask
+
+
+CELL_TABLE: tuple[tuple[tuple[tuple[int, int], ...], ...], ...] = (
+    (),
+    (  # Z
+        ((0, 0), (0, 1), (1, 1), (1, 2)),
+        ((0, 2), (1, 2), (1, 1), (2, 1)),
+        ((2, 2), (2, 1), (1, 1), (1, 0)),
+        ((2, 0), (1, 0), (1, 1), (0, 1)),
+    ),
+    (  # S
+        ((0, 0), (0, 1), (-1, 1), (-1, 2)),
+        ((-1, 1), (0, 1), (0, 2), (1, 2)),
+        ((0, 2), (0, 1), (1, 1), (1, 0)),
+        ((1, 1), (0, 1), (0, 0), (-1, 0)),
+    ),
+    (  # O
+        ((0, 0), (0, 1), (1, 0), (1, 1)),
+        ((0, 1), (1, 1), (0, 0), (1, 0)),
+        ((1, 1), (1, 0), (0, 1), (0, 0)),
+        ((1, 0), (0, 0), (1, 1), (0, 1)),
+    ),
+    (  # J
+        ((0, 0), (1, 0), (1, 1), (1, 2)),
+        ((0, 2), (0, 1), (1, 1), (2, 1)),
+        ((2, 2), (1, 2), (1, 1), (1, 0)),
+        ((2, 0), (2, 1), (1, 1), (0, 1)),
+    ),
+    (  # T
+        ((0, 0), (0, 1), (-1, 1), (0, 2)),
+        ((-1, 1), (0, 1), (0, 2), (1, 1)),
+        ((0, 2), (0, 1), (1, 1), (0, 0)),
+        ((1, 1), (0, 1), (0, 0), (-1, 1)),
+    ),
+    (  # I
+        ((0, 0), (0, 1), (0, 2), (0, 3)),
+        ((-1, 2), (0, 2), (1, 2), (2, 2)),
+        ((1, 3), (1, 2), (1, 1), (1, 0)),
+        ((2, 1), (1, 1), (0, 1), (-1, 1)),
+    ),
+    (  # L
+        ((0, 0), (0, 1), (0, 2), (-1, 2)),
+        ((-1, 1), (0, 1), (1, 1), (1, 2)),
+        ((0, 2), (0, 1), (0, 0), (1, 0)),
+        ((1, 1), (0, 1), (-1, 1), (-1, 0)),
+    ),
+)
+
+MASK_TABLE: tuple[tuple[PieceMask, ...], ...] = (
+    (),
+    (  # Z
+        (0, 0, 2, 3, (3, 6), (0, 1, 1)),
+        (0, 1, 3, 2, (2, 3, 1), (2, 1)),
+        (1, 0, 2, 3, (3, 6), (0, 1, 1)),
+        (0, 0, 3, 2, (2, 3, 1), (2, 1)),
+    ),
+    (  # S
+        (-1, 0, 2, 3, (6, 3), (1, 1, 0)),
+        (-1, 1, 3, 2, (1, 3, 2), (1, 2)),
+        (0, 0, 2, 3, (6, 3), (1, 1, 0)),
+        (-1, 0, 3, 2, (1, 3, 2), (1, 2)),
+    ),
+    (  # O
+        (0, 0, 2, 2, (3, 3), (1, 1)),
+        (0, 0, 2, 2, (3, 3), (1, 1)),
+        (0, 0, 2, 2, (3, 3), (1, 1)),
+        (0, 0, 2, 2, (3, 3), (1, 1)),
+    ),
+    (  # J
+        (0, 0, 2, 3, (1, 7), (1, 1, 1)),
+        (0, 1, 3, 2, (3, 1, 1), (2, 0)),
+        (1, 0, 2, 3, (7, 4), (0, 0, 1)),
+        (0, 0, 3, 2, (2, 2, 3), (2, 2)),
+    ),
+    (  # T
+        (-1, 0, 2, 3, (2, 7), (1, 1, 1)),
+        (-1, 1, 3, 2, (1, 3, 1), (2, 1)),
+        (0, 0, 2, 3, (7, 2), (0, 1, 0)),
+        (-1, 0, 3, 2, (2, 3, 2), (1, 2)),
+    ),
+    (  # I
+        (0, 0, 1, 4, (15,), (0, 0, 0, 0)),
+        (-1, 2, 4, 1, (1, 1, 1, 1), (3,)),
+        (1, 0, 1, 4, (15,), (0, 0, 0, 0)),
+        (-1, 1, 4, 1, (1, 1, 1, 1), (3,)),
+    ),
+    (  # L
+        (-1, 0, 2, 3, (4, 7), (1, 1, 1)),
+        (-1, 1, 3, 2, (1, 1, 3), (2, 2)),
+        (0, 0, 2, 3, (7, 1), (1, 0, 0)),
+        (-1, 0, 3, 2, (3, 2, 2), (0, 2)),
+    ),
+)
+
+KICK_TABLE: tuple[tuple[tuple[tuple[int, ...], tuple[int, ...]], ...], ...] = (
+    (),
+    (  # Z
+        ((0, 0, 0, -1, -1, -1, 2, 0, 2, -1), (0, 0, 0, 1, -1, 1, 2, 0, 2, 1)),
+        ((0, 0, 0, 1, 1, 1, -2, 0, -2, 1), (0, 0, 0, 1, 1, 1, -2, 0, -2, 1)),
+        ((0, 0, 0, 1, -1, 1, 2, 0, 2, 1), (0, 0, 0, -1, -1, -1, 2, 0, 2, -1)),
+        ((0, 0, 0, -1, 1, -1, -2, 0, -2, -1), (0, 0, 0, -1, 1, -1, -2, 0, -2, -1)),
+    ),
+    (  # S
+        ((0, 0, 0, -1, -1, -1, 2, 0, 2, -1), (0, 0, 0, 1, -1, 1, 2, 0, 2, 1)),
+        ((0, 0, 0, 1, 1, 1, -2, 0, -2, 1), (0, 0, 0, 1, 1, 1, -2, 0, -2, 1)),
+        ((0, 0, 0, 1, -1, 1, 2, 0, 2, 1), (0, 0, 0, -1, -1, -1, 2, 0, 2, -1)),
+        ((0, 0, 0, -1, 1, -1, -2, 0, -2, -1), (0, 0, 0, -1, 1, -1, -2, 0, -2, -1)),
+    ),
+    (  # O
+        ((0, 0), (0, 0)),
+        ((0, 0), (0, 0)),
+        ((0, 0), (0, 0)),
+        ((0, 0), (0, 0)),
+    ),
+    (  # J
+        ((0, 0, 0, -1, -1, -1, 2, 0, 2, -1), (0, 0, 0, 1, -1, 1, 2, 0, 2, 1)),
+        ((0, 0, 0, 1, 1, 1, -2, 0, -2, 1), (0, 0, 0, 1, 1, 1, -2, 0, -2, 1)),
+        ((0, 0, 0, 1, -1, 1, 2, 0, 2, 1), (0, 0, 0, -1, -1, -1, 2, 0, 2, -1)),
+        ((0, 0, 0, -1, 1, -1, -2, 0, -2, -1), (0, 0, 0, -1, 1, -1, -2, 0, -2, -1)),
+    ),
+    (  # T
+        ((0, 0, 0, -1, -1, -1, 2, 0, 2, -1), (0, 0, 0, 1, -1, 1, 2, 0, 2, 1)),
+        ((0, 0, 0, 1, 1, 1, -2, 0, -2, 1), (0, 0, 0, 1, 1, 1, -2, 0, -2, 1)),
+        ((0, 0, 0, 1, -1, 1, 2, 0, 2, 1), (0, 0, 0, -1, -1, -1, 2, 0, 2, -1)),
+        ((0, 0, 0, -1, 1, -1, -2, 0, -2, -1), (0, 0, 0, -1, 1, -1, -2, 0, -2, -1)),
+    ),
+    (  # I
+        ((0, 0, 0, -2, 0, 1, 1, -2, -2, 1), (0, 0, 0, -1, 0, 2, -2, -1, 1, 2)),
+        ((0, 0, 0, -1, 0, 2, -2, -1, 1, 2), (0, 0, 0, 2, 0, -1, -1, 2, 2, -1)),
+        ((0, 0, 0, 2, 0, -1, -1, 2, 2, -1), (0, 0, 0, 1, 0, -2, 2, 1, -1, -2)),
+        ((0, 0, 0, 1, 0, -2, 2, 1, -1, -2), (0, 0, 0, -2, 0, 1, 1, -2, -2, 1)),
+    ),
+    (  # L
+        ((0, 0, 0, -1, -1, -1, 2, 0, 2, -1), (0, 0, 0, 1, -1, 1, 2, 0, 2, 1)),
+        ((0, 0, 0, 1, 1, 1, -2, 0, -2, 1), (0, 0, 0, 1, 1, 1, -2, 0, -2, 1)),
+        ((0, 0, 0, 1, -1, 1, 2, 0, 2, 1), (0, 0, 0, -1, -1, -1, 2, 0, 2, -1)),
+        ((0, 0, 0, -1, 1, -1, -2, 0, -2, -1), (0, 0, 0, -1, 1, -1, -2, 0, -2, -1)),
+    ),
+)
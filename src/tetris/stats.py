@@ -0,0 +1,239 @@
+import cProfile
+import time
+import tracemalloc
+
+from array import array
+from bisect import bisect_right
+from typing import Callable
+
+from .engine import FALL, LOCK, SHADOW, STEP_PHASES
+from .render import GAME_WINDOW_SIZE_WIDTH
+
+# the parts of a frame that are timed, the ones of the engine come first
+PHASES = STEP_PHASES + ("handle_input", "draw_board")
+LABELS = ("fall", "lock", "shadow", "input", "draw")
+INPUT, DRAW = range(len(STEP_PHASES), len(PHASES))
+RING_SIZE = 1024  # frames kept for the percentiles, 20 s at 50 fps
+PANEL_LEFT = GAME_WINDOW_SIZE_WIDTH + 1
+PANEL_WIDTH = 28
+PANEL_REFRESH = 0.5  # seconds between two updates of the panel
+WINDOW = 5.0  # seconds a profile or a memory trace runs
+# upper edges of the histogram buckets in ms, the last one is open
+EDGES = (1, 2, 4, 8, 16, 24, 32, 64, 128, 256, 512, 1024)
+
+
+class Ring:
+    """the last `size` samples, in an array allocated once"""
+
+    def __init__(self, size: int = RING_SIZE) -> None:
+        self.samples = array("d", bytes(8 * size))
+        self.size = size
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.samples[self.count % self.size] = value
+        self.count += 1
+
+    def percentiles(self, *ps: float) -> list[float]:
+        n = min(self.count, self.size)
+        if not n:
+            return [0.0] * len(ps)
+        values = sorted(self.samples[:n])
+        return [values[min(int(n * p), n - 1)] for p in ps]
+
+
+class Histogram:
+    """sample counts per bucket of `EDGES` ms, over the whole game"""
+
+    def __init__(self) -> None:
+        self.counts = array("Q", bytes(8 * (len(EDGES) + 1)))
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect_right(EDGES, ms)] += 1
+
+    def lines(self, width: int = 40) -> list[str]:
+        most = max(self.counts) or 1
+        res = []
+        for i, count in enumerate(self.counts):
+            edge = f"< {EDGES[i]}" if i < len(EDGES) else f">= {EDGES[-1]}"
+            bar = "#" * round(count / most * width)
+            res.append(f"{edge:>8} ms |{bar:<{width}} {count}")
+        return res
+
+
+class FrameStats:
+    """where the time of each frame goes, for `tetris --stats`
+
+    the front end times the phases of a game with `timed`, a frame ends
+    with `end_frame` after its draw. samples go to fixed size rings, the side panel shows
+    their percentiles and `report` a histogram when the game is over.
+    """
+
+    def __init__(self, fps: int) -> None:
+        self.fps = fps
+        self.spent = array("d", bytes(8 * len(PHASES)))  # of the current frame
+        self.phases = [Ring() for _ in PHASES]
+        self.frames = Ring()  # time between two draws
+        self.work = Ring()  # time spent in the phases
+        self.drift = Ring()  # how late a timer woke the game up
+        self.latency = Ring()  # from reading a key to drawing its frame
+        self.frame_histogram = Histogram()
+        self.work_histogram = Histogram()
+        self.started = self.last_frame = time.perf_counter()
+        self.woke = self.started
+        self.pressed: float | None = None
+
+        self.panel_lines: list[tuple[int, int, str]] = []
+        self.panel_at = 0.0
+        self.panel_frames = 0
+        self.fps_now = 0.0
+
+        self.profiler: cProfile.Profile | None = None
+        self.window_end = 0.0
+        self.status = ""
+        self.written: list[str] = []
+
+    def timed(self, phase: int, method: Callable, *args):
+        """call `method`, its time counts towards `phase` of this frame"""
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.spent[phase] += time.perf_counter() - start
+
+    def wake(self, due: float, timer: bool) -> None:
+        """the game loop woke up, `timer` when no key woke it"""
+        self.woke = time.perf_counter()
+        if timer:
+            self.drift.add(max(self.woke - due, 0.0))
+
+    def press(self) -> None:
+        """a key was read, its latency ends with the next frame"""
+        if self.pressed is None:
+            self.pressed = self.woke
+
+    def end_frame(self) -> None:
+        now = time.perf_counter()
+        spent = self.spent
+        work = 0.0
+        for i, ring in enumerate(self.phases):
+            ring.add(spent[i])
+            work += spent[i]
+            spent[i] = 0.0
+        self.work.add(work)
+        self.work_histogram.add(work * 1000)
+        interval = now - self.last_frame
+        self.last_frame = now
+        self.frames.add(interval)
+        self.frame_histogram.add(interval * 1000)
+        if self.pressed is not None:
+            self.latency.add(now - self.pressed)
+            self.pressed = None
+
+        if self.window_end and now >= self.window_end:
+            self.stop_window()
+        if now - self.panel_at >= PANEL_REFRESH:
+            self.refresh_panel(now)
+
+    def refresh_panel(self, now: float) -> None:
+        frames = self.frames.count - self.panel_frames
+        self.fps_now = frames / (now - self.panel_at) if self.panel_at else 0.0
+        self.panel_at = now
+        self.panel_frames = self.frames.count
+
+        def ms(ring: Ring, digits: int = 1) -> str:
+            p50, p99 = ring.percentiles(0.5, 0.99)
+            return f"p50 {p50 * 1000:5.{digits}f} p99 {p99 * 1000:5.{digits}f}ms"
+
+        left = PANEL_LEFT
+        lines = [
+            (1, left, f"frame  {ms(self.frames)}"),
+            (2, left, f"fps    {self.fps_now:5.1f} of {self.fps}"),
+            (3, left, f"drift  {ms(self.drift, 2)}"),
+            (4, left, f"input  {ms(self.latency)}"),
+            (6, left, f"{'us':<8}{'p50':>8}{'p99':>8}"),
+        ]
+        for i, (label, ring) in enumerate(zip(LABELS, self.phases)):
+            p50, p99 = ring.percentiles(0.5, 0.99)
+            lines.append((7 + i, left, f"{label:<8}{p50 * 1e6:8.0f}{p99 * 1e6:8.0f}"))
+        lines.append((13, left, "p profile  m memory"))
+        lines.append((14, left, self.status[:PANEL_WIDTH]))
+        self.panel_lines = lines
+
+    def panel(self, cols: int) -> list[tuple[int, int, str]]:
+        """the texts of the side panel, none when the terminal is too
+        narrow for it"""
+        return self.panel_lines if cols >= PANEL_LEFT + PANEL_WIDTH else []
+
+    def profile(self) -> None:
+        """run cProfile for `WINDOW` seconds, the stats go to a .prof file"""
+        if self.window_end:
+            return
+        self.profiler = cProfile.Profile()
+        try:
+            self.profiler.enable()
+        except ValueError:  # another profiler is active
+            self.profiler = None
+            self.status = "a profiler is running"
+            return
+        self.window_end = time.perf_counter() + WINDOW
+        self.status = "profiling"
+
+    def trace_memory(self) -> None:
+        """trace allocations for `WINDOW` seconds, the top sites go to a
+        .alloc file"""
+        if self.window_end or tracemalloc.is_tracing():
+            return
+        tracemalloc.start()
+        self.window_end = time.perf_counter() + WINDOW
+        self.status = "tracing memory"
+
+    def stop_window(self) -> None:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self.profiler is not None:
+            self.profiler.disable()
+            path = f"tetris-{stamp}.prof"
+            self.profiler.dump_stats(path)
+            self.profiler = None
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            path = f"tetris-{stamp}.alloc"
+            with open(path, "w") as f:
+                f.write(f"peak {peak / 1024:.1f} KiB in {WINDOW:g} s\n")
+                for stat in snapshot.statistics("lineno")[:30]:
+                    f.write(f"{stat}\n")
+        self.window_end = 0.0
+        self.status = f"wrote {path}"
+        self.written.append(path)
+
+    def close(self) -> None:
+        """finish a running profile or trace"""
+        if self.window_end:
+            self.stop_window()
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        count = self.frames.count
+        lines = [
+            f"{count} frames in {elapsed:.1f} s, {count / elapsed:.1f} fps of {self.fps}",
+            "",
+            "frame time",
+            *self.frame_histogram.lines(),
+            "",
+            "work per frame",
+            *self.work_histogram.lines(),
+            "",
+            f"last {min(count, RING_SIZE)} frames     p50 us    p99 us",
+        ]
+        rows = list(zip(PHASES, self.phases)) + [
+            ("timer drift", self.drift),
+            ("input latency", self.latency),
+        ]
+        for name, ring in rows:
+            p50, p99 = ring.percentiles(0.5, 0.99)
+            lines.append(f"{name:<18}{p50 * 1e6:10.0f}{p99 * 1e6:10.0f}")
+        for path in self.written:
+            lines.append(f"wrote {path}")
+        return "\n".join(lines)
@@ -0,0 +1,321 @@
+import getpass
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from typing import Callable, Iterable, NamedTuple
+
+from .engine import Action, Observer, TetriminoShape, TetrisEngine
+from .placement import Placement, finesse, keypresses
+
+DEFAULT_PATH = os.path.join(
+    os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"),
+    "tetris",
+    "stats.db",
+)
+BATCH = 4096  # rows written in one transaction at most
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    played REAL NOT NULL,
+    player TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    score REAL NOT NULL,
+    lines INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    pieces INTEGER NOT NULL,
+    t_spins INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    pps REAL NOT NULL,
+    finesse INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_by_score ON games (mode, score DESC);
+CREATE INDEX IF NOT EXISTS games_by_player ON games (player, mode, score DESC);
+CREATE TABLE IF NOT EXISTS pieces (
+    game INTEGER NOT NULL REFERENCES games (id),
+    shape INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    presses INTEGER NOT NULL,
+    faults INTEGER NOT NULL,
+    t_spins INTEGER NOT NULL,
+    PRIMARY KEY (game, shape)
+) WITHOUT ROWID;
+"""
+INSERT_GAME = """
+INSERT INTO games (
+    played, player, mode, seed, score, lines, level, pieces, t_spins, duration,
+    pps, finesse
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_PIECES = "INSERT INTO pieces VALUES (?, ?, ?, ?, ?, ?)"
+
+
+class GameRecord(NamedTuple):
+    played: float  # unix time the game ended
+    player: str
+    mode: str  # marathon, autoplay or sim
+    seed: int
+    score: float
+    lines: int
+    level: int
+    pieces: int
+    t_spins: int
+    duration: float  # game time in seconds
+    pps: float  # pieces per second
+    finesse: int | None  # faults, None when key presses were not tracked
+
+
+class PieceSummary(NamedTuple):
+    shape: int
+    count: int
+    presses: int
+    faults: int  # pieces locked with more presses than needed
+    t_spins: int
+
+
+def connect(path: str = DEFAULT_PATH) -> sqlite3.Connection:
+    """open the stats database, creating it when it does not exist"""
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # the writer thread takes the connection over
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def leaderboard(
+    conn: sqlite3.Connection, mode: str = "marathon", limit: int = 10
+) -> list[sqlite3.Row]:
+    """the best games of a mode"""
+    return conn.execute(
+        "SELECT * FROM games WHERE mode = ? ORDER BY score DESC LIMIT ?",
+        (mode, limit),
+    ).fetchall()
+
+
+def personal_bests(conn: sqlite3.Connection, player: str) -> list[sqlite3.Row]:
+    """the best score, lines, speed and finesse of a player, per mode"""
+    return conn.execute(
+        """
+        SELECT mode, COUNT(*) AS games, MAX(score) AS score, MAX(lines) AS lines,
+            MAX(level) AS level, MAX(pps) AS pps, MIN(finesse) AS finesse
+        FROM games WHERE player = ? GROUP BY mode ORDER BY mode
+        """,
+        (player,),
+    ).fetchall()
+
+
+def piece_totals(conn: sqlite3.Connection, player: str) -> list[sqlite3.Row]:
+    """key presses and finesse faults of a player, per shape"""
+    return conn.execute(
+        """
+        SELECT shape, SUM(count) AS count, SUM(presses) AS presses,
+            SUM(faults) AS faults, SUM(pieces.t_spins) AS t_spins
+        FROM pieces JOIN games ON games.id = pieces.game
+        WHERE player = ? GROUP BY shape ORDER BY shape
+        """,
+        (player,),
+    ).fetchall()
+
+
+class Writer:
+    """writes games to the stats database on a background thread
+
+    `add` only queues a game, so the game loop never waits on the disk. the
+    thread writes whatever queued up since its last write in one
+    transaction, `close` waits until everything is written. a batch that
+    fails is dropped, later ones are still written.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        # opened here so a database that can not be opened fails early
+        self.conn = connect(path)
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.written = 0
+        self.dropped = 0
+        self.error: Exception | None = None  # the last one
+        self.thread = threading.Thread(
+            target=self.run, name="stats-writer", daemon=True
+        )
+        self.thread.start()
+
+    def add(self, record: GameRecord, pieces: Iterable[PieceSummary] = ()) -> None:
+        self.queue.put((record, tuple(pieces)))
+
+    def add_later(
+        self, make: Callable[[], tuple[GameRecord, tuple[PieceSummary, ...]]]
+    ) -> None:
+        """queue a game that is put together on the writer thread"""
+        self.queue.put(make)
+
+    def run(self) -> None:
+        get = self.queue.get
+        get_nowait = self.queue.get_nowait
+        done = False
+        while not done:
+            batch = [get()]
+            while len(batch) < BATCH:
+                try:
+                    batch.append(get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            games = []
+            for item in batch:
+                if callable(item):
+                    # a game that can not be put together is dropped alone
+                    try:
+                        item = item()
+                    except Exception as e:
+                        self.error = e
+                        self.dropped += 1
+                        continue
+                games.append(item)
+            try:
+                self.write(games)
+            except sqlite3.Error as e:
+                self.error = e
+                self.dropped += len(games)
+        self.conn.close()
+
+    def write(self, batch: list[tuple[GameRecord, tuple[PieceSummary, ...]]]) -> None:
+        with self.conn:
+            cursor = self.conn.cursor()
+            # games without piece summaries, e.g. from the simulator, go in
+            # with one statement
+            cursor.executemany(
+                INSERT_GAME, [record for record, pieces in batch if not pieces]
+            )
+            for record, pieces in batch:
+                if pieces:
+                    cursor.execute(INSERT_GAME, record)
+                    game = cursor.lastrowid
+                    cursor.executemany(
+                        INSERT_PIECES, [(game, *piece) for piece in pieces]
+                    )
+        self.written += len(batch)
+
+    def close(self) -> Exception | None:
+        """write the queued games and close the database, returns the last
+        error when some games were dropped"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        return self.error
+
+
+class GameLog(Observer):
+    """collects what the stats database keeps about a terminal game
+
+    key presses are counted per tetrimino as an observer of the game. a
+    tetrimino that locked with more presses than the fewest that reach the
+    same placement from its spawn is a finesse fault. finding those takes a
+    search per tetrimino, so it runs on the writer thread once the game is
+    over.
+    """
+
+    def __init__(self, writer: Writer, player: str, mode: str = "marathon") -> None:
+        self.writer = writer
+        self.player = player
+        self.mode = mode
+        self.started = 0.0
+        # the falling tetrimino: the board and its state when it spawned,
+        # and the actions it took
+        self.spawn: tuple[tuple[int, ...], int, int, int, int] | None = None
+        self.actions: list[Action] = []
+        # (spawn, placement, presses) of every locked tetrimino
+        self.locks: list[tuple[tuple, Placement, int]] = []
+
+    def observe(self, game: TetrisEngine) -> None:
+        """count the key presses of `game` from now on"""
+        self.started = time.monotonic()
+        game.observers.append(self)
+
+    def on_action(self, game: TetrisEngine, action: Action) -> None:
+        # a hold spawns the next tetrimino, its presses start over
+        if action is not Action.HOLD:
+            self.actions.append(action)
+
+    def on_spawn(self, game: TetrisEngine) -> None:
+        tetrimino = game.cur_tetrimino
+        assert tetrimino is not None, "cur_tetrimino is None"
+        self.spawn = (
+            tuple(game.bitboard.rows),
+            tetrimino.no,
+            tetrimino.rot,
+            tetrimino.row,
+            tetrimino.col,
+        )
+        self.actions.clear()
+
+    def on_lock(self, game: TetrisEngine) -> None:
+        tetrimino = game.cur_tetrimino
+        assert tetrimino is not None, "cur_tetrimino is None"
+        if self.spawn is not None:
+            target = Placement(
+                tetrimino.rot, tetrimino.col, tetrimino.row, game.is_t_spin(), ()
+            )
+            self.locks.append((self.spawn, target, keypresses(tuple(self.actions))))
+
+    def pieces(self) -> list[PieceSummary]:
+        """presses and finesse faults per shape"""
+        size = len(TetriminoShape) + 1
+        counts = [0] * size
+        presses = [0] * size
+        faults = [0] * size
+        t_spins = [0] * size
+        for (rows, no, rot, row, col), target, pressed in self.locks:
+            counts[no] += 1
+            presses[no] += pressed
+            t_spins[no] += target.t_spin
+            path = finesse(rows, no, rot, row, col, target)
+            if path is not None and pressed > keypresses(path):
+                faults[no] += 1
+        return [
+            PieceSummary(no, counts[no], presses[no], faults[no], t_spins[no])
+            for no in range(1, size)
+            if counts[no]
+        ]
+
+    def finish(self, game: TetrisEngine) -> None:
+        """queue the game for the database, games without a locked
+        tetrimino are not kept"""
+        if not game.pieces:
+            return
+        duration = time.monotonic() - self.started
+        record = GameRecord(
+            time.time(),
+            self.player,
+            self.mode,
+            game.seed,
+            game.score,
+            game.lines,
+            game.level,
+            game.pieces,
+            game.t_spins,
+            duration,
+            game.pieces / duration if duration else 0.0,
+            None,
+        )
+
+        def summarize() -> tuple[GameRecord, tuple[PieceSummary, ...]]:
+            pieces = tuple(self.pieces())
+            return record._replace(finesse=sum(p.faults for p in pieces)), pieces
+
+        self.writer.add_later(summarize)
+
+
+def default_player() -> str:
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):  # no user name, e.g. in some containers
+        return "player"
@@ -1,15 +1,22 @@
 import curses
-import random
+import math
+import selectors
 import sys
 import time
 
-from collections import defaultdict, deque
-from enum import Enum
-
-EMPTY = 0
-
-GAME_WINDOW_SIZE_HEIGHT = 22
-GAME_WINDOW_SIZE_WIDTH = 50
+from .bot import Bot
+from .controls import Controls
+from .engine import GARBAGE, Action, TetriminoShape, TetrisEngine
+from .render import (
+    GAME_WINDOW_SIZE_HEIGHT,
+    GAME_WINDOW_SIZE_WIDTH,
+    PALETTE,
+    make_renderer,
+)
+from .replay import Recorder, Replay
+from .spectate import Broadcaster
+from .stats import DRAW, INPUT, FrameStats
+from .store import GameLog
 
 # keymap
 MOVE_LEFT = [curses.KEY_LEFT, ord("A"), ord("a")]
@@ -20,725 +27,244 @@ ROTATE_CCW = [ord("z"), ord("Z")]
 HOLD = [ord("c"), ord("C")]
 HARD_DROP = [ord(" ")]
 EXIT = [ord("q"), ord("Q")]
-
-
-def rotate_points(
-    points: list[tuple[int, int]],
-    center: list[int | tuple[int, int]],
-    ccw: bool = False,
-) -> list[tuple[int, int]]:
-    """rotate the point 90 degree"""
-    if isinstance(center[0], (list, tuple)):
-        cr = (center[0][0] + center[0][1]) / 2.0
-        cc = (center[1][0] + center[1][1]) / 2.0  # type: ignore
-    else:
-        cr, cc = float(center[0]), float(center[1])  # type: ignore
-
-    rotated_points = []
-
-    for r, c in points:
-        rel_r = r - cr
-        rel_c = c - cc
-        new_rel_r = -rel_c if ccw else rel_c
-        new_rel_c = rel_r if ccw else -rel_r
-        new_r = int(new_rel_r + cr)
-        new_c = int(new_rel_c + cc)
-
-        rotated_points.append((new_r, new_c))
-
-    return rotated_points
-
-
-class TetriminoShape(Enum):
-    Z = 1
-    S = 2
-    O = 3
-    J = 4
-    T = 5
-    I = 6
-    L = 7
-
-    def __repr__(self) -> str:
-        return f"TetriminoShape.{self.name}"
-
-
-class Direction(Enum):
-    NORTH = 0
-    EAST = 1
-    SOUTH = 2
-    WEST = 3
-
-    def __repr__(self) -> str:
-        return f"Direction.{self.name}"
-
-
-SHAPE_TABLE = {
-    TetriminoShape.I: [(0, 0), (0, 1), (0, 2), (0, 3)],
-    TetriminoShape.J: [(0, 0), (1, 0), (1, 1), (1, 2)],
-    TetriminoShape.L: [(0, 0), (0, 1), (0, 2), (-1, 2)],
-    TetriminoShape.O: [(0, 0), (0, 1), (1, 0), (1, 1)],
-    TetriminoShape.S: [(0, 0), (0, 1), (-1, 1), (-1, 2)],
-    TetriminoShape.T: [(0, 0), (0, 1), (-1, 1), (0, 2)],
-    TetriminoShape.Z: [(0, 0), (0, 1), (1, 1), (1, 2)],
+# with --stats
+PROFILE = [ord("p"), ord("P")]
+TRACE_MEMORY = [ord("m"), ord("M")]
+
+KEYMAP = {
+    **dict.fromkeys(MOVE_LEFT, Action.MOVE_LEFT),
+    **dict.fromkeys(MOVE_RIGHT, Action.MOVE_RIGHT),
+    **dict.fromkeys(SOFT_DROP, Action.SOFT_DROP),
+    **dict.fromkeys(ROTATE_CW, Action.ROTATE_CW),
+    **dict.fromkeys(ROTATE_CCW, Action.ROTATE_CCW),
+    **dict.fromkeys(HOLD, Action.HOLD),
+    **dict.fromkeys(HARD_DROP, Action.HARD_DROP),
 }
 
-ROTATE_AXIS = {
-    TetriminoShape.I: [(0, 1), (1, 2)],
-    TetriminoShape.J: [1, 1],
-    TetriminoShape.L: [0, 1],
-    TetriminoShape.O: [(0, 1), (0, 1)],
-    TetriminoShape.S: [0, 1],
-    TetriminoShape.T: [0, 1],
-    TetriminoShape.Z: [1, 1],
-}
-
-GENERATE_POSITION = {
-    TetriminoShape.I: (19, 3),
-    TetriminoShape.J: (18, 3),
-    TetriminoShape.L: (19, 3),
-    TetriminoShape.O: (18, 4),
-    TetriminoShape.S: (19, 3),
-    TetriminoShape.T: (19, 3),
-    TetriminoShape.Z: (18, 3),
-}
-
-
-# SRS system
-ROTATE_TABLE = defaultdict(lambda: defaultdict(dict))
-
-
-JLSTZ_WALL_KICK_OFFSET = {
-    (Direction.NORTH, Direction.EAST): [(0, 0), (0, -1), (-1, -1), (2, 0), (2, -1)],
-    (Direction.EAST, Direction.NORTH): [(0, 0), (0, 1), (1, 1), (-2, 0), (-2, 1)],
-    (Direction.EAST, Direction.SOUTH): [(0, 0), (0, 1), (1, 1), (-2, 0), (-2, 1)],
-    (Direction.SOUTH, Direction.EAST): [(0, 0), (0, -1), (-1, -1), (2, 0), (2, -1)],
-    (Direction.SOUTH, Direction.WEST): [(0, 0), (0, 1), (-1, 1), (2, 0), (2, 1)],
-    (Direction.WEST, Direction.SOUTH): [(0, 0), (0, -1), (1, -1), (-2, 0), (-2, -1)],
-    (Direction.WEST, Direction.NORTH): [(0, 0), (0, -1), (1, -1), (-2, 0), (-2, -1)],
-    (Direction.NORTH, Direction.WEST): [(0, 0), (0, 1), (-1, 1), (2, 0), (2, 1)],
-}
-
-O_WALL_KICK_OFFSET = {
-    (Direction.NORTH, Direction.EAST): [(0, 0)],
-    (Direction.EAST, Direction.NORTH): [(0, 0)],
-    (Direction.EAST, Direction.SOUTH): [(0, 0)],
-    (Direction.SOUTH, Direction.EAST): [(0, 0)],
-    (Direction.SOUTH, Direction.WEST): [(0, 0)],
-    (Direction.WEST, Direction.SOUTH): [(0, 0)],
-    (Direction.WEST, Direction.NORTH): [(0, 0)],
-    (Direction.NORTH, Direction.WEST): [(0, 0)],
-}
-
-I_WALL_KICK_OFFSET = {
-    (Direction.NORTH, Direction.EAST): [(0, 0), (0, -2), (0, 1), (1, -2), (-2, 1)],
-    (Direction.EAST, Direction.NORTH): [(0, 0), (0, 2), (0, -1), (-1, 2), (2, -1)],
-    (Direction.EAST, Direction.SOUTH): [(0, 0), (0, -1), (0, 2), (-2, -1), (1, 2)],
-    (Direction.SOUTH, Direction.EAST): [(0, 0), (0, 1), (0, -2), (2, 1), (-1, -2)],
-    (Direction.SOUTH, Direction.WEST): [(0, 0), (0, 2), (0, -1), (-1, 2), (2, -1)],
-    (Direction.WEST, Direction.SOUTH): [(0, 0), (0, -2), (0, 1), (1, -2), (-2, 1)],
-    (Direction.WEST, Direction.NORTH): [(0, 0), (0, 1), (0, -2), (2, 1), (-1, -2)],
-    (Direction.NORTH, Direction.WEST): [(0, 0), (0, -1), (0, 2), (-2, -1), (1, 2)],
-}
-
-# build the ROTATE_TABLE
-for shape in list(TetriminoShape):
-    directions = list(Direction)
-    _cw = [
-        (directions[i], directions[(i + 1) % len(directions)], False)
-        for i in range(len(directions))
-    ]
-    _ccw = [
-        (
-            directions[i],
-            directions[(len(directions) + (i - 1)) % len(directions)],
-            True,
-        )
-        for i in range(0, -len(directions), -1)
-    ]
-
-    cur_pos = SHAPE_TABLE[shape][::]
-    for start, end, ccw in _cw + _ccw:
-        rotated = rotate_points(cur_pos, ROTATE_AXIS[shape], ccw)
-        diff = [(rx - x, ry - y) for (rx, ry), (x, y) in list(zip(rotated, cur_pos))]
-        cur_pos = rotated
 
-        ROTATE_TABLE[shape][(start, end)]["standard_rotate_diff"] = diff
-
-        if shape == TetriminoShape.I:
-            ROTATE_TABLE[shape][(start, end)]["offsets"] = I_WALL_KICK_OFFSET[
-                (start, end)
-            ]
-        elif shape == TetriminoShape.O:
-            ROTATE_TABLE[shape][(start, end)]["offsets"] = O_WALL_KICK_OFFSET[
-                (start, end)
-            ]
-        else:
-            ROTATE_TABLE[shape][(start, end)]["offsets"] = JLSTZ_WALL_KICK_OFFSET[
-                (start, end)
-            ]
-
-
-class Tetrimino:
-
-    ## line0  0000000000 -
-    ## ...               |>  buffer zone
-    ## line19 0000000000 -
-    ## line20 0000000000 -
-    ## ...               |>   game zone
-    ## line39 0000000000 -
-    ## all the tetriminos are generated in the 18th and 19th line(buffer zone)
-
-    def __init__(self, shape: TetriminoShape) -> None:
-        self.shape = shape
-        self.no = shape.value
-        dx, dy = GENERATE_POSITION[shape]
-        self.bodies = [(x + dx, y + dy) for (x, y) in SHAPE_TABLE[shape]]
-        self.direction = Direction.NORTH
-
-    def __iter__(self):
-        for x, y in self.bodies:
-            yield x, y
-
-    def __getitem__(self, index: int) -> tuple[int, int]:
-        return self.bodies[index]
-
-    def __setitem__(self, index: int, value: tuple[int, int]) -> None:
-        self.bodies[index] = value
-
-
-class Tetris:
-    score = 0
-    lines = 0
-
-    lines_for_level = 0
-
-    level = 1
+class Tetris(TetrisEngine):
+    """curses front end, drives a `TetrisEngine` in real time"""
 
     fps = 50  # 1 / 60 s per frame
-    tick = 0.001  # calculate tick 1 ms
-
-    failed = False
-
-    cur_tetrimino = None
-    shadow = []
-    hold = None
-
-    frame_timer = 0
-    normal_fall_timer = 0
-    soft_drop_timer = 0
-
-    lock_down_timer = 0
-    lock_down_rotate_counter = 0
-
-    hold_once = False
-    reach_bottom = False
-    lowest = 0
-
-    b2b_bones = False
-
-    class Movement(Enum):
-        MOVE = 0
-        ROTATE = 1
-
-    # for t-spin calculation
-    last_move = Movement.MOVE
-
-    board = [[0] * 10 for _ in range(40)]
-    bag: deque[Tetrimino] = deque(maxlen=14)
-
-    @property
-    def fall_speed(self) -> float:
-        return (0.8 - ((self.level - 1) * 0.007)) ** (self.level - 1)
-
-    @property
-    def soft_drop_speed(self) -> float:
-        return self.fall_speed / 20
-
-    def __init__(self, stdscr: curses.window) -> None:
+    tick = 0.001  # polling interval when stdin can not be waited on
+
+    def __init__(
+        self,
+        stdscr: curses.window,
+        seed: int | None = None,
+        record: str | None = None,
+        bot: Bot | None = None,
+        broadcast: str | None = None,
+        backend: str = "curses",
+        stats: FrameStats | None = None,
+        controls: Controls | None = None,
+        log: GameLog | None = None,
+    ) -> None:
+        super().__init__(seed)
         self.stdscr = stdscr
+        self.renderer = make_renderer(stdscr, backend)
+        self.selector: selectors.BaseSelector | None = None
+        self.recorder = Recorder(record, self.seed) if record else None
+        self.bot = bot
+        self.controls = controls if controls is not None else Controls()
+        self.broadcaster = Broadcaster(broadcast) if broadcast else None
+        self.stats = stats
+        self.log = log
+        if log is not None:
+            log.observe(self)
 
-    def replenish_bag(self) -> None:
-        """replenish the bag with 7 random tetriminos"""
-        tmp = [Tetrimino(shape) for shape in list(TetriminoShape)]
-        random.shuffle(tmp)
-        self.bag.extend(tmp)
-
-    def init_bag(self) -> None:
-        """fill the bag"""
-        for _ in range(2):
-            self.replenish_bag()
-
-    def get_tetrimino(self) -> Tetrimino:
-        """get a tetrimino from the bag"""
-        tetrimino = self.bag.popleft()
-        if len(self.bag) == 7:
-            self.replenish_bag()
-        # move down one cell immediate
-        return tetrimino
-
-    def get_current_lowest(self) -> int:
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        return max(x for x, _ in self.cur_tetrimino)
-
-    def generate_new_tetrimino(self) -> None:
-        self.cur_tetrimino = self.get_tetrimino()
-        if any(self.board[x][y] != EMPTY for x, y in self.cur_tetrimino):
-            self.failed = True
-        self.do_fall_immediate()
-
-    def line_clear(self) -> int:
-        res = 0
-        for row in range(len(self.board) - 1, -1, -1):
-            while all(v != EMPTY for v in self.board[row]):
-                res += 1
-
-                for i in range(row - 1, -1, -1):
-                    self.board[i + 1] = self.board[i]
-                self.board[0] = [0] * 10
-        return res
-
-    def check_can_move_down(self) -> bool:
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        for x, y in self.cur_tetrimino:
-            if x + 1 >= 40:
-                return False
-            if (x + 1, y) in self.cur_tetrimino:
-                continue
-            if self.board[x + 1][y] != EMPTY:
-                return False
-        return True
-
-    def check_can_move_left(self) -> bool:
-        if self.lock_down_rotate_counter >= 15:
-            return False
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        for x, y in self.cur_tetrimino:
-            if y - 1 < 0:
-                return False
-            if (x, y - 1) in self.cur_tetrimino:
-                continue
-            if self.board[x][y - 1] != EMPTY:
-                return False
-        return True
-
-    def check_can_move_right(self) -> bool:
-        if self.lock_down_rotate_counter >= 15:
-            return False
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        for x, y in self.cur_tetrimino:
-            if y + 1 >= 10:
-                return False
-            if (x, y + 1) in self.cur_tetrimino:
-                continue
-            if self.board[x][y + 1] != EMPTY:
-                return False
-        return True
-
-    def do_fall_immediate(self) -> bool:
-        if not self.check_can_move_down():
-            return False
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        # clean old pos
-        for x, y in self.cur_tetrimino:
-            self.board[x][y] = EMPTY
-        # move down
-        for i, (x, y) in enumerate(self.cur_tetrimino):
-            self.cur_tetrimino[i] = (x + 1, y)
-        # draw new pos
-        for x, y in self.cur_tetrimino:
-            self.board[x][y] = self.cur_tetrimino.no
-        return True
-
-    def do_move_left(self) -> bool:
-        if not self.check_can_move_left():
-            return False
-        if self.reach_bottom:
-            self.lock_down_rotate_counter += 1
-
-        self.last_move = self.Movement.MOVE
-
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        for x, y in self.cur_tetrimino:
-            self.board[x][y] = EMPTY
-        for i, (x, y) in enumerate(self.cur_tetrimino):
-            self.cur_tetrimino[i] = (x, y - 1)
-        for x, y in self.cur_tetrimino:
-            self.board[x][y] = self.cur_tetrimino.no
-        return True
-
-    def do_move_right(self) -> bool:
-        if not self.check_can_move_right():
-            return False
-        if self.reach_bottom:
-            self.lock_down_rotate_counter += 1
-
-        self.last_move = self.Movement.MOVE
-
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        for x, y in self.cur_tetrimino:
-            self.board[x][y] = EMPTY
-        for i, (x, y) in enumerate(self.cur_tetrimino):
-            self.cur_tetrimino[i] = (x, y + 1)
-        for x, y in self.cur_tetrimino:
-            self.board[x][y] = self.cur_tetrimino.no
-        return True
-
-    def check_empty(self, points: list[tuple[int, int]]) -> bool:
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        m, n = len(self.board), len(self.board[0])
-        for x, y in points:
-            if (x, y) in self.cur_tetrimino.bodies:
-                continue
-            if not (0 <= x < m and 0 <= y < n) or self.board[x][y] != EMPTY:
-                return False
-        return True
-
-    def do_rotate(self, cur_direction: Direction, next_direction: Direction):
-        if (
-            self.lock_down_rotate_counter >= 15
-        ):  # can only rotate 15 times when reach bottom
-            return
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        standard_rotate_diff, offsets = ROTATE_TABLE[self.cur_tetrimino.shape][
-            (cur_direction), (next_direction)
-        ].values()
-
-        rotated = [
-            (x + dx, y + dy)
-            for (x, y), (dx, dy) in list(
-                zip(self.cur_tetrimino.bodies, standard_rotate_diff)
-            )
-        ]
-
-        for dx, dy in offsets:
-            tmp = rotated[::]
-            for i, (x, y) in enumerate(rotated):
-                tmp[i] = x + dx, y + dy
-
-            if self.check_empty(tmp):
-                for x, y in self.cur_tetrimino.bodies:
-                    self.board[x][y] = EMPTY
-                for x, y in tmp:
-                    self.board[x][y] = self.cur_tetrimino.shape.value
-                self.cur_tetrimino.bodies = tmp
-                self.cur_tetrimino.direction = next_direction
-
-                self.last_move = self.Movement.ROTATE
-
-                return
-
-    def do_rotate_cw(self) -> None:
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        cur_direction = self.cur_tetrimino.direction
-        directions = list(Direction)
-        next_direction = directions[
-            (directions.index(cur_direction) + 1) % len(directions)
-        ]
-        self.do_rotate(cur_direction, next_direction)
-
-    def do_rotate_ccw(self) -> None:
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        cur_direction = self.cur_tetrimino.direction
-        directions = list(Direction)
-        next_direction = directions[
-            (len(directions) + (directions.index(cur_direction) - 1)) % len(directions)
-        ]
-        self.do_rotate(cur_direction, next_direction)
-
-    def normal_fall(self) -> None:
-        self.normal_fall_timer += self.tick
-        if self.normal_fall_timer < self.fall_speed:
-            return
-        self.normal_fall_timer = 0
-        if not self.do_fall_immediate():
-            self.lowest = self.get_current_lowest()
-            self.reach_bottom = True
+    def draw_board(self) -> None:
+        if self.stats is None:
+            self.draw_frame()
         else:
-            self.last_move = self.Movement.MOVE
+            self.stats.timed(DRAW, self.draw_frame)
+            self.stats.end_frame()
 
-    def do_soft_drop(self) -> None:
-        # cancel normal fall
-        self.normal_fall_timer = 0
-        if not self.do_fall_immediate():
-            self.lowest = self.get_current_lowest()
-            self.reach_bottom = True
+    def draw_frame(self) -> None:
+        if self.stats is None:
+            self.renderer.draw(self)
         else:
-            # soft drop get level score
-            self.score += self.level
-            self.last_move = self.Movement.MOVE
-
-    def do_hard_drop(self) -> None:
-        while self.do_fall_immediate():
-            # hard drop get 2 * level score
-            self.score += self.level * 2
-            pass
-        self.lock_down()
-
-    def do_hold(self) -> None:
-        if self.hold_once:
-            return
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        self.hold_once = True
-        for x, y in self.cur_tetrimino:
-            self.board[x][y] = EMPTY
-        if self.hold is None:
-            self.hold = self.cur_tetrimino
-            self.generate_new_tetrimino()
+            self.renderer.draw(self, self.stats.panel(curses.COLS))
+        if self.broadcaster is not None:
+            self.broadcaster.publish(self)
+
+    def handle_input(self) -> tuple[list[Action], Action | None]:
+        """read every pending key at once, `controls` turns them into
+        actions and adds the auto shifts of held keys"""
+        pressed = []
+        stats = self.stats
+        while (c := self.stdscr.getch()) != -1:
+            action = KEYMAP.get(c)
+            if action is not None:
+                pressed.append(action)
+            elif c in EXIT:
+                self.failed = True
+            elif c == curses.KEY_RESIZE:
+                self.renderer.invalidate()
+            elif stats is not None and c in PROFILE:
+                stats.profile()
+            elif stats is not None and c in TRACE_MEMORY:
+                stats.trace_memory()
+            if stats is not None:
+                stats.press()
+        return self.controls.actions(pressed, time.monotonic(), self)
+
+    def wait(self, timeout: float) -> None:
+        """sleep until the terminal has input or `timeout` seconds passed"""
+        if self.selector is None:
+            timeout = min(timeout, self.tick)
+            due = time.perf_counter() + timeout
+            time.sleep(timeout)
+            timer = True
         else:
-            self.bag.appendleft(Tetrimino(self.hold.shape))
-            self.hold = self.cur_tetrimino
-            self.generate_new_tetrimino()
-
-    def draw_board(self) -> None:
-        self.frame_timer += self.tick
-        if self.frame_timer < 1 / self.fps:
-            return
-        self.frame_timer = 0
-
-        # draw border
-        self.stdscr.move(0, 0)
-        self.stdscr.addstr("┏")
-        self.stdscr.move(0, GAME_WINDOW_SIZE_WIDTH - 1)
-        self.stdscr.addstr("┓")
-        self.stdscr.move(GAME_WINDOW_SIZE_HEIGHT - 1, 0)
-        self.stdscr.addstr("┗")
-        self.stdscr.move(GAME_WINDOW_SIZE_HEIGHT - 1, GAME_WINDOW_SIZE_WIDTH - 1)
-        self.stdscr.addstr("┛")
-
-        for i in range(1, GAME_WINDOW_SIZE_WIDTH - 1):
-            self.stdscr.move(0, i)
-            self.stdscr.addstr("━")
-            self.stdscr.move(GAME_WINDOW_SIZE_HEIGHT - 1, i)
-            self.stdscr.addstr("━")
-        for i in range(1, GAME_WINDOW_SIZE_HEIGHT - 1):
-            self.stdscr.move(i, 0)
-            self.stdscr.addstr("┃")
-            self.stdscr.move(i, GAME_WINDOW_SIZE_WIDTH - 1)
-            self.stdscr.addstr("┃")
-
-        self.stdscr.move(0, 21)
-        self.stdscr.addstr("┳")
-        for i in range(1, 21):
-            self.stdscr.move(i, 21)
-            self.stdscr.addstr("┃")
-        self.stdscr.move(GAME_WINDOW_SIZE_HEIGHT - 1, 21)
-        self.stdscr.addstr("┻")
+            due = time.perf_counter() + timeout
+            timer = not self.selector.select(timeout)
+        if self.stats is not None:
+            self.stats.wake(due, timer)
+        if self.broadcaster is not None:
+            self.broadcaster.poll()
+
+    @staticmethod
+    def clock() -> int:
+        """monotonic time in whole milliseconds, so a recorded game steps
+        the engine with exactly the same deltas when it is replayed"""
+        return time.monotonic_ns() // 1_000_000
+
+    def advance(
+        self, delta_ms: int, actions: list[Action], shift: Action | None = None
+    ) -> None:
+        timed = self.stats.timed if self.stats is not None else None
+        moved = self.step(actions, delta_ms / 1000, shift, timed)
+        if self.recorder is not None:
+            if shift is not None and moved:
+                # a replay repeats the shift to the wall as the moves it took
+                actions = actions + [shift] * moved
+            self.recorder.record(delta_ms, actions)
 
-        # title
-        self.stdscr.move(3, 28)
-        self.stdscr.addstr("━┳━┏━━━┳━┏━┓┳┏━╸")
-        self.stdscr.move(4, 28)
-        self.stdscr.addstr(" ┃ ┣━━ ┃ ┣┳┛┃┗━┓")
-        self.stdscr.move(5, 28)
-        self.stdscr.addstr(" ╹ ┗━━ ╹ ╹┗━┻━━┛")
-
-        # game info
-        self.stdscr.move(9, 27)
-        self.stdscr.addstr("Next  : ")
-        for i in range(5):
-            self.stdscr.addstr(f"{self.bag[i].shape.name} ")
-
-        self.stdscr.move(11, 27)
-        self.stdscr.addstr(f"Score : {self.score}")
-        self.stdscr.move(13, 27)
-        self.stdscr.addstr(f"Lines : {self.lines}")
-        self.stdscr.move(15, 27)
-        self.stdscr.addstr(f"Level : {self.level}")
-        self.stdscr.move(17, 27)
-        self.stdscr.addstr(f"Hold  : {self.hold.shape.name if self.hold else ''}")
-
-        # board
-        for i in range(20, 40):
-            self.stdscr.move(i - 19, 1)
-            for j in range(10):
-                # shadow
-                if self.board[i][j] == EMPTY and (i, j) in self.shadow:
-                    self.stdscr.addstr("[]")
-                else:
-                    self.stdscr.addstr("  ", curses.color_pair(self.board[i][j]))
-
-        self.stdscr.refresh()
+    def game_loop(self) -> None:
+        """run the engine on real time
 
-    def handle_input(self) -> None:
-        """handle the input
-        Terminal input relies on the operating system's control
-        over the rate at which keyboard characters are entered.
-        it't hard to ctrl the long press and normal press
+        the loop sleeps until a key arrives or the next deadline: gravity,
+        lock down or, when something changed, the next frame. timers are
+        advanced by the measured time between wake ups.
         """
-        c = self.stdscr.getch()
-        if c in EXIT:
-            self.failed = True
-        if c in MOVE_LEFT:
-            self.do_move_left()
-        if c in MOVE_RIGHT:
-            self.do_move_right()
-        if c in SOFT_DROP:
-            self.do_soft_drop()
-        if c in ROTATE_CW:
-            self.do_rotate_cw()
-        if c in ROTATE_CCW:
-            self.do_rotate_ccw()
-        if c in HARD_DROP:
-            self.do_hard_drop()
-        if c in HOLD:
-            self.do_hold()
-
-    def is_t_spin(self) -> bool:
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        if (
-            self.cur_tetrimino.shape != TetriminoShape.T
-            or self.last_move != self.Movement.ROTATE
-        ):
-            return False
-        cx, cy = self.cur_tetrimino[1]
-        corners = 0
-        for x, y in [
-            (cx - 1, cy - 1),
-            (cx + 1, cy - 1),
-            (cx - 1, cy + 1),
-            (cx + 1, cy + 1),
-        ]:
-            if (
-                not ((0 <= x < len(self.board)) and (0 <= y < len(self.board[0])))
-                or self.board[x][y] != EMPTY
-            ):
-                corners += 1
-        return corners >= 3
-
-    def lock_down(self) -> None:
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        # all cells in buff zone when lock down
-        if all(x < 20 for x, _ in self.cur_tetrimino):
-            self.failed = True
-
-        is_t_spin = self.is_t_spin()
-        cleared_lines = self.line_clear()
-
-        # calculate the score and lines to add
-        bonus = self.b2b_bones
-        self.b2b_bones = False
-
-        awarded_line = 0
-        score2add = 0
-
-        if is_t_spin:
-
-            self.b2b_bones = True
-
-            if cleared_lines == 0:
-                awarded_line = 4
-                score2add = 100 * self.level
-            elif cleared_lines == 1:
-                awarded_line = 7
-                score2add = 400 * self.level
-            elif cleared_lines == 2:
-                awarded_line = 10
-                score2add = 1200 * self.level
-            elif cleared_lines == 3:
-                awarded_line = 13
-                score2add = 1600 * self.level
-        else:
-            if cleared_lines == 1:
-                score2add = 100 * self.level
-            elif cleared_lines == 2:
-                awarded_line = 1
-                score2add = 300 * self.level
-            elif cleared_lines == 3:
-                awarded_line = 2
-                score2add = 500 * self.level
-            elif cleared_lines == 4:
-                awarded_line = 4
-                self.b2b_bones = True
-
-                score2add = 800 * self.level
-        # if b2b, line clear bonus * 1.5 abd score * 1.5
-        if bonus and self.b2b_bones:
-            self.lines_for_level += int((awarded_line + cleared_lines) * 1.5)
-            self.score += 1.5 * score2add
-        else:
-            self.lines_for_level += awarded_line + cleared_lines
-            self.score += score2add
-        
-        self.lines += cleared_lines
-
-        # level up
-        # max level 15
-        if self.level < 15 and self.lines_for_level >= 5 * self.level * (self.level + 1) / 2:
-            self.level += 1
-
-        self.generate_new_tetrimino()
-
-        self.reach_bottom = False
-        self.lock_down_timer = 0
-        self.lock_down_rotate_counter = 0
-        self.hold_once = False
-
-    def handle_lock_down(self) -> None:
-        if not self.reach_bottom:
-            return
-        if self.lock_down_timer >= 0.5:
-            self.lock_down()
-            return
-        # no longer move down and has cells below, continue timer
-        # if self.get_current_lowest() == self.lowest and not self.check_can_move_down():
-        if not self.check_can_move_down():
-            self.lock_down_timer += self.tick
-        # reach new lowest, reset timer and counter
-        elif self.get_current_lowest() > self.lowest:
-            self.reach_bottom = False
-            self.lock_down_timer = 0
-            self.lock_down_rotate_counter = 0
-
-    def handle_shadow(self):
-        assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-        self.shadow = self.cur_tetrimino.bodies[::]
-
-        def helper():
-            assert self.cur_tetrimino is not None, "cur_tetrimino is None"
-            for x, y in self.shadow:
-                if x + 1 >= len(self.board):
-                    return False
-                if (x + 1, y) in self.board or (x + 1, y) in self.cur_tetrimino.bodies:
-                    continue
-                if self.board[x + 1][y] != EMPTY:
-                    return False
-            return True
-
-        while helper():
-            for i in range(len(self.shadow)):
-                x, y = self.shadow[i]
-                self.shadow[i] = x + 1, y
-
-    def game_loop(self) -> None:
+        frame = 1000 // self.fps
+        last = next_frame = self.clock()
         while not self.failed:
-            self.normal_fall()
-            self.handle_input()
-            self.handle_lock_down()
-            self.handle_shadow()
-            self.draw_board()
-            time.sleep(self.tick)
-
-    def init_color(self) -> None:
+            now = self.clock()
+            if self.stats is None:
+                actions, shift = self.handle_input()
+            else:
+                actions, shift = self.stats.timed(INPUT, self.handle_input)
+            self.advance(now - last, actions, shift)
+            last = now
+            if self.bot is not None:
+                # play a new tetrimino right away, before gravity moves it
+                actions = self.bot.actions(self)
+                if actions:
+                    self.advance(0, actions)
+            # every wake up is a key or a timer firing, both change the game
+            dirty = True
+
+            if now >= next_frame:
+                self.draw_board()
+                next_frame = now + frame
+                dirty = False
+
+            timeout = min(
+                self.next_timeout(), self.controls.next_timeout(time.monotonic())
+            )
+            deadline = now + math.ceil(timeout * 1000)
+            # the bot plays the next tetrimino on the next frame
+            if dirty or self.bot is not None:
+                deadline = min(deadline, next_frame)
+            self.wait(max(deadline - self.clock(), 0) / 1000)
+
+    @staticmethod
+    def init_color() -> None:
+        garbage = curses.COLOR_WHITE
         if curses.can_change_color():
-            curses.init_color(TetriminoShape.I.value, 0, 941, 941)
-            curses.init_color(TetriminoShape.O.value, 941, 941, 0)
-            curses.init_color(TetriminoShape.T.value, 627, 0, 941)
-            curses.init_color(TetriminoShape.L.value, 941, 627, 0)
-            curses.init_color(TetriminoShape.J.value, 0, 0, 941)
-            curses.init_color(TetriminoShape.S.value, 0, 941, 0)
-            curses.init_color(TetriminoShape.Z.value, 941, 0, 0)
+            for tetrimino in list(TetriminoShape):
+                curses.init_color(tetrimino.value, *PALETTE[tetrimino.value])
+            # white is L's orange by now
+            if curses.COLORS > GARBAGE:
+                curses.init_color(GARBAGE, *PALETTE[GARBAGE])
+                garbage = GARBAGE
         curses.use_default_colors()
         for tetrimino in list(TetriminoShape):
             curses.init_pair(tetrimino.value, tetrimino.value, tetrimino.value)
+        curses.init_pair(GARBAGE, garbage, garbage)
 
     def init_game(self) -> None:
-        self.init_bag()
-        self.generate_new_tetrimino()
+        super().init_game()
         self.init_color()
 
         curses.curs_set(0)
         self.stdscr.timeout(0)
+        # select() only accepts sockets on windows, fall back to polling there
+        if sys.platform != "win32":
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(sys.stdin, selectors.EVENT_READ)
+            # wake up for new spectators too
+            if self.broadcaster is not None:
+                self.selector.register(
+                    self.broadcaster.listener, selectors.EVENT_READ
+                )
 
     def main(self) -> None:
         self.init_game()
-        self.game_loop()
+        try:
+            self.game_loop()
+        finally:
+            if self.recorder is not None:
+                self.recorder.close(self)
+            if self.broadcaster is not None:
+                self.broadcaster.close(self)
+            if self.stats is not None:
+                self.stats.close()
+            if self.log is not None:
+                self.log.finish(self)
+
+
+class ReplayTetris(Tetris):
+    """plays a recorded game back in the terminal, `speed` times as fast"""
+
+    def __init__(
+        self,
+        stdscr: curses.window,
+        replay: Replay,
+        speed: float = 1,
+        broadcast: str | None = None,
+        backend: str = "curses",
+        stats: FrameStats | None = None,
+    ) -> None:
+        super().__init__(
+            stdscr, replay.seed, broadcast=broadcast, backend=backend, stats=stats
+        )
+        self.replay = replay
+        self.speed = speed
+
+    def game_loop(self) -> None:
+        frame = 1000 // self.fps
+        start = next_frame = self.clock()
+        elapsed = 0
+        timed = self.stats.timed if self.stats is not None else None
+        for delta, actions in self.replay:
+            elapsed += delta
+            # wait until this step is due at the replay speed
+            due = start + elapsed / self.speed
+            now = self.clock()
+            while now < due:
+                if now >= next_frame:
+                    self.draw_board()
+                    next_frame = now + frame
+                self.wait((min(due, next_frame) - now) / 1000)
+                if self.stdscr.getch() in EXIT:
+                    return
+                now = self.clock()
+            self.step(actions, delta / 1000, timed=timed)
+
+        # keep the final board on screen until a key is pressed
+        self.draw_board()
+        self.stdscr.timeout(-1)
+        self.stdscr.getch()
@@ -0,0 +1,378 @@
+import numpy as np
+
+from .engine import (
+    CELL_TABLE,
+    GENERATE_POSITION,
+    KICK_TABLE,
+    Action,
+    TetriminoShape,
+)
+
+NOOP = -1  # action value for "do nothing this step"
+
+T = TetriminoShape.T.value
+
+# CELL_TABLE and KICK_TABLE as arrays, indexed by [shape, rot, ...].
+# shorter kick lists (the O tetrimino) are padded with their first kick,
+# trying a kick that already failed again is harmless.
+CELLS = np.zeros((len(TetriminoShape) + 1, 4, 4, 2), np.int16)
+KICKS = np.zeros((len(TetriminoShape) + 1, 4, 2, 5, 2), np.int16)
+SPAWN = np.zeros((len(TetriminoShape) + 1, 2), np.int16)
+for _shape in list(TetriminoShape):
+    SPAWN[_shape.value] = GENERATE_POSITION[_shape]
+    for _rot in range(4):
+        CELLS[_shape.value, _rot] = CELL_TABLE[_shape.value][_rot]
+        for _ccw in range(2):
+            _flat = KICK_TABLE[_shape.value][_rot][_ccw]
+            _pairs = list(zip(_flat[::2], _flat[1::2]))
+            _pairs += _pairs[:1] * (5 - len(_pairs))
+            KICKS[_shape.value, _rot, _ccw] = _pairs
+# lowest cell offset of each rotation state
+BOTTOM = CELLS[..., 0].max(axis=2)
+
+# lock_down scoring, indexed by cleared lines
+TSPIN_AWARDED_LINES = np.array([4, 7, 10, 13, 0])
+TSPIN_SCORE = np.array([100, 400, 1200, 1600, 0])
+AWARDED_LINES = np.array([0, 0, 1, 2, 4])
+SCORE = np.array([0, 100, 300, 500, 800])
+
+
+class VectorTetris:
+    """N independent games stepped together on NumPy arrays
+
+    follows the rules of `TetrisEngine` (SRS kicks, 7-bag, hold, lock
+    down, t-spin and back-to-back scoring) but keeps every game's state in
+    arrays, so one `step` costs a few array operations regardless of N.
+
+    actions are `Action` values, or NOOP, one per game. finished games
+    ignore their actions until they are `reset`.
+    """
+
+    def __init__(self, n: int, seed: int | None = None) -> None:
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+
+        self.board = np.zeros((n, 40, 10), np.uint8)
+        self.shape = np.zeros(n, np.int8)
+        self.rot = np.zeros(n, np.int16)
+        self.row = np.zeros(n, np.int16)
+        self.col = np.zeros(n, np.int16)
+
+        # upcoming shapes, like TetrisEngine.bag: 7 to 14 of them
+        self.bag = np.zeros((n, 14), np.int8)
+        self.bag_len = np.zeros(n, np.int16)
+        self.hold = np.zeros(n, np.int8)  # 0 when nothing is held
+        self.hold_once = np.zeros(n, bool)
+
+        self.score = np.zeros(n, np.float64)
+        self.lines = np.zeros(n, np.int32)
+        self.lines_for_level = np.zeros(n, np.int32)
+        self.level = np.ones(n, np.int32)
+        self.b2b_bones = np.zeros(n, bool)
+        self.failed = np.zeros(n, bool)
+
+        self.normal_fall_timer = np.zeros(n, np.float64)
+        self.lock_down_timer = np.zeros(n, np.float64)
+        self.lock_down_rotate_counter = np.zeros(n, np.int16)
+        self.reach_bottom = np.zeros(n, bool)
+        self.lowest = np.zeros(n, np.int16)
+        # for t-spin calculation, whether the last movement was a rotation
+        self.last_rotate = np.zeros(n, bool)
+
+        self.reset()
+
+    @property
+    def fall_speed(self) -> np.ndarray:
+        return (0.8 - ((self.level - 1) * 0.007)) ** (self.level - 1)
+
+    def reset(self, games: np.ndarray | None = None) -> np.ndarray:
+        """start new games, all of them or the selected ones"""
+        idx = np.arange(self.n) if games is None else self._select(games)
+        for array in (
+            self.board,
+            self.bag_len,
+            self.hold,
+            self.hold_once,
+            self.score,
+            self.lines,
+            self.lines_for_level,
+            self.b2b_bones,
+            self.failed,
+            self.normal_fall_timer,
+            self.lock_down_timer,
+            self.lock_down_rotate_counter,
+            self.reach_bottom,
+            self.lowest,
+            self.last_rotate,
+        ):
+            array[idx] = 0
+        self.level[idx] = 1
+        self.replenish_bag(idx)
+        self.replenish_bag(idx)
+        self.generate_new_tetrimino(idx)
+        return self.observe()
+
+    def _select(self, games: np.ndarray) -> np.ndarray:
+        games = np.asarray(games)
+        return np.flatnonzero(games) if games.dtype == bool else games
+
+    def replenish_bag(self, idx: np.ndarray) -> None:
+        """append 7 shuffled shapes to the bags of the given games"""
+        bags = self.rng.permuted(
+            np.tile(np.array([s.value for s in TetriminoShape], np.int8), (len(idx), 1)),
+            axis=1,
+        )
+        positions = self.bag_len[idx, None] + np.arange(7)
+        self.bag[idx[:, None], positions] = bags
+        self.bag_len[idx] += 7
+
+    def cells(
+        self,
+        idx: np.ndarray,
+        rot: np.ndarray | None = None,
+        row: np.ndarray | None = None,
+        col: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """(rows, cols) of the tetrimino cells, shape (len(idx), 4)"""
+        rot = self.rot[idx] if rot is None else rot
+        row = self.row[idx] if row is None else row
+        col = self.col[idx] if col is None else col
+        offsets = CELLS[self.shape[idx], rot]
+        return row[:, None] + offsets[..., 0], col[:, None] + offsets[..., 1]
+
+    def collides(
+        self,
+        idx: np.ndarray,
+        rot: np.ndarray | None = None,
+        row: np.ndarray | None = None,
+        col: np.ndarray | None = None,
+    ) -> np.ndarray:
+        rows, cols = self.cells(idx, rot, row, col)
+        inside = (rows >= 0) & (rows < 40) & (cols >= 0) & (cols < 10)
+        filled = self.board[idx[:, None], rows.clip(0, 39), cols.clip(0, 9)] != 0
+        return (~inside | filled).any(axis=1)
+
+    def drop_distance(self, idx: np.ndarray) -> np.ndarray:
+        """rows every selected tetrimino can fall before it lands"""
+        # the first filled row at or below each cell, 40 for the floor
+        filled = np.where(self.board[idx] != 0, np.arange(40)[:, None], 40)
+        below = np.minimum.accumulate(filled[:, ::-1], axis=1)[:, ::-1]
+        below = np.concatenate([below, np.full((len(idx), 1, 10), 40)], axis=1)
+        rows, cols = self.cells(idx)
+        return (below[np.arange(len(idx))[:, None], rows + 1, cols] - rows - 1).min(axis=1)
+
+    def generate_new_tetrimino(
+        self, idx: np.ndarray, shapes: np.ndarray | None = None
+    ) -> None:
+        """take the next shape from the bag (or `shapes`) and spawn it"""
+        if shapes is None:
+            shapes = self.bag[idx, 0]
+            self.bag[idx, :-1] = self.bag[idx, 1:]
+            self.bag_len[idx] -= 1
+            refill = idx[self.bag_len[idx] == 7]
+            if len(refill):
+                self.replenish_bag(refill)
+        self.shape[idx] = shapes
+        self.rot[idx] = 0
+        self.row[idx] = SPAWN[shapes, 0]
+        self.col[idx] = SPAWN[shapes, 1]
+        self.failed[idx] |= self.collides(idx)
+        # move down one cell immediate
+        self.fall(idx)
+
+    def current_lowest(self, idx: np.ndarray) -> np.ndarray:
+        return self.row[idx] + BOTTOM[self.shape[idx], self.rot[idx]]
+
+    def fall(self, idx: np.ndarray) -> np.ndarray:
+        """move the selected tetriminos down one row where possible"""
+        can = ~self.collides(idx, row=self.row[idx] + 1)
+        self.row[idx[can]] += 1
+        return can
+
+    def move(self, idx: np.ndarray, step: int) -> None:
+        idx = idx[self.lock_down_rotate_counter[idx] < 15]
+        can = ~self.collides(idx, col=self.col[idx] + step)
+        idx = idx[can]
+        self.col[idx] += step
+        self.lock_down_rotate_counter[idx] += self.reach_bottom[idx]
+        self.last_rotate[idx] = False
+
+    def rotate(self, idx: np.ndarray, ccw: bool) -> None:
+        idx = idx[self.lock_down_rotate_counter[idx] < 15]
+        rot = self.rot[idx]
+        next_rot = (rot + (-1 if ccw else 1)) & 3
+        kicks = KICKS[self.shape[idx], rot, int(ccw)]  # (m, 5, 2)
+        free = np.stack(
+            [
+                ~self.collides(
+                    idx,
+                    next_rot,
+                    self.row[idx] + kicks[:, k, 0],
+                    self.col[idx] + kicks[:, k, 1],
+                )
+                for k in range(kicks.shape[1])
+            ],
+            axis=1,
+        )
+        ok = free.any(axis=1)
+        first = free.argmax(axis=1)[ok]
+        kick = kicks[ok, first]
+        idx = idx[ok]
+        self.rot[idx] = next_rot[ok]
+        self.row[idx] += kick[:, 0]
+        self.col[idx] += kick[:, 1]
+        self.last_rotate[idx] = True
+
+    def soft_drop(self, idx: np.ndarray) -> None:
+        # cancel normal fall
+        self.normal_fall_timer[idx] = 0
+        can = self.fall(idx)
+        moved = idx[can]
+        # soft drop get level score
+        self.score[moved] += self.level[moved]
+        self.last_rotate[moved] = False
+        self.touch_bottom(idx[~can])
+
+    def touch_bottom(self, idx: np.ndarray) -> None:
+        self.lowest[idx] = self.current_lowest(idx)
+        self.reach_bottom[idx] = True
+
+    def hard_drop(self, idx: np.ndarray) -> None:
+        distance = self.drop_distance(idx)
+        self.row[idx] += distance
+        # hard drop get 2 * level score
+        self.score[idx] += self.level[idx] * 2 * distance
+        self.lock_down(idx)
+
+    def do_hold(self, idx: np.ndarray) -> None:
+        idx = idx[~self.hold_once[idx]]
+        self.hold_once[idx] = True
+        held = self.hold[idx].copy()
+        self.hold[idx] = self.shape[idx]
+        empty = held == 0
+        self.generate_new_tetrimino(idx[empty])
+        self.generate_new_tetrimino(idx[~empty], held[~empty])
+
+    def is_t_spin(self, idx: np.ndarray) -> np.ndarray:
+        rows, cols = self.cells(idx)
+        cx, cy = rows[:, 1, None], cols[:, 1, None]
+        x = cx + np.array([-1, 1, -1, 1])
+        y = cy + np.array([-1, -1, 1, 1])
+        inside = (x >= 0) & (x < 40) & (y >= 0) & (y < 10)
+        filled = self.board[idx[:, None], x.clip(0, 39), y.clip(0, 9)] != 0
+        corners = (~inside | filled).sum(axis=1)
+        return (self.shape[idx] == T) & self.last_rotate[idx] & (corners >= 3)
+
+    def line_clear(self, idx: np.ndarray) -> np.ndarray:
+        """remove full rows of the selected games, returns the counts"""
+        boards = self.board[idx]
+        full = (boards != 0).all(axis=2)
+        cleared = full.sum(axis=1)
+        # full rows first, the rest keep their order below them
+        order = np.argsort(~full, axis=1, kind="stable")
+        boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+        boards[np.arange(40) < cleared[:, None]] = 0
+        self.board[idx] = boards
+        return cleared
+
+    def lock_down(self, idx: np.ndarray) -> None:
+        if not len(idx):
+            return
+        rows, cols = self.cells(idx)
+        # all cells in buff zone when lock down
+        self.failed[idx] |= (rows < 20).all(axis=1)
+        self.board[idx[:, None], rows, cols] = self.shape[idx, None]
+
+        is_t_spin = self.is_t_spin(idx)
+        cleared = self.line_clear(idx)
+        level = self.level[idx]
+
+        awarded = np.where(is_t_spin, TSPIN_AWARDED_LINES[cleared], AWARDED_LINES[cleared])
+        score = np.where(is_t_spin, TSPIN_SCORE[cleared], SCORE[cleared]) * level
+        b2b = is_t_spin | (cleared == 4)
+        # if b2b, line clear bonus * 1.5 and score * 1.5
+        bonus = self.b2b_bones[idx] & b2b
+        self.b2b_bones[idx] = b2b
+        self.lines_for_level[idx] += np.where(
+            bonus, ((awarded + cleared) * 1.5).astype(np.int32), awarded + cleared
+        )
+        self.score[idx] += np.where(bonus, 1.5 * score, score)
+        self.lines[idx] += cleared
+
+        # level up
+        # max level 15
+        up = (level < 15) & (self.lines_for_level[idx] >= 5 * level * (level + 1) / 2)
+        self.level[idx[up]] += 1
+
+        self.generate_new_tetrimino(idx)
+
+        self.reach_bottom[idx] = False
+        self.lock_down_timer[idx] = 0
+        self.lock_down_rotate_counter[idx] = 0
+        self.hold_once[idx] = False
+
+    def normal_fall(self, idx: np.ndarray, dt: float) -> None:
+        self.normal_fall_timer[idx] += dt
+        # a long step may cover several rows of gravity
+        while len(idx):
+            speed = self.fall_speed[idx]
+            due = self.normal_fall_timer[idx] >= speed
+            idx, speed = idx[due], speed[due]
+            self.normal_fall_timer[idx] -= speed
+            landed = ~self.fall(idx)
+            self.normal_fall_timer[idx[landed]] = 0
+            self.touch_bottom(idx[landed])
+            self.last_rotate[idx[~landed]] = False
+            idx = idx[~landed]
+
+    def handle_lock_down(self, idx: np.ndarray, dt: float) -> None:
+        idx = idx[self.reach_bottom[idx]]
+        grounded = self.collides(idx, row=self.row[idx] + 1)
+        on_ground = idx[grounded]
+        self.lock_down_timer[on_ground] += dt
+        self.lock_down(on_ground[self.lock_down_timer[on_ground] >= 0.5])
+        # reach new lowest, reset timer and counter
+        airborne = idx[~grounded]
+        lower = airborne[self.current_lowest(airborne) > self.lowest[airborne]]
+        self.reach_bottom[lower] = False
+        self.lock_down_timer[lower] = 0
+        self.lock_down_rotate_counter[lower] = 0
+
+    def observe(self) -> np.ndarray:
+        """the visible 20 x 10 boards with the falling tetriminos drawn in"""
+        obs = self.board[:, 20:].copy()
+        idx = np.arange(self.n)
+        rows, cols = self.cells(idx)
+        visible = rows >= 20
+        games = np.broadcast_to(idx[:, None], rows.shape)
+        obs[games[visible], rows[visible] - 20, cols[visible]] = np.broadcast_to(
+            self.shape[:, None], rows.shape
+        )[visible]
+        return obs
+
+    def step(
+        self, actions: np.ndarray, dt: float = 0.0
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """apply one action per game and advance every game by `dt` seconds
+
+        returns the observations, the score gained in this step and
+        whether each game is over.
+        """
+        actions = np.asarray(actions)
+        before = self.score.copy()
+        idx = np.flatnonzero(~self.failed)
+        self.normal_fall(idx, dt)
+
+        idx = idx[~self.failed[idx]]
+        act = actions[idx]
+        self.move(idx[act == Action.MOVE_LEFT.value], -1)
+        self.move(idx[act == Action.MOVE_RIGHT.value], 1)
+        self.soft_drop(idx[act == Action.SOFT_DROP.value])
+        self.hard_drop(idx[act == Action.HARD_DROP.value])
+        self.rotate(idx[act == Action.ROTATE_CW.value], ccw=False)
+        self.rotate(idx[act == Action.ROTATE_CCW.value], ccw=True)
+        self.do_hold(idx[act == Action.HOLD.value])
+
+        idx = idx[~self.failed[idx]]
+        self.handle_lock_down(idx, dt)
+        return self.observe(), self.score - before, self.failed.copy()
@@ -0,0 +1,312 @@
+import asyncio
+import curses
+import random
+import sys
+
+from .bitboard import BOARD_WIDTH
+from .engine import TetrisEngine
+from .net import (
+    ACTIONS,
+    FRAME,
+    FRAME_HEADER,
+    HELLO,
+    INPUT,
+    NO_WINNER,
+    OVER,
+    PING,
+    PONG,
+    START,
+    START_HEADER,
+    BoardEncoder,
+    apply_frame,
+    message,
+    mirror,
+    read_message,
+)
+from .render import GAME_WINDOW_SIZE_WIDTH, OpponentRenderer, VersusRenderer
+from .tetris import EXIT, KEYMAP, Tetris
+
+DEFAULT_PORT = 7777
+MAX_PLAYERS = 16
+TICK = 1 / 50  # seconds between two gravity steps of a match
+# bytes queued for a client that stopped reading before it is dropped
+SLOW_CLIENT = 1 << 20
+
+
+class Player:
+    """a connection on the server"""
+
+    def __init__(self, writer: asyncio.StreamWriter, name: str) -> None:
+        self.writer = writer
+        self.name = name
+        self.slot = 0
+        self.match: Match | None = None
+
+    def send(self, data: bytes) -> None:
+        """queue data without waiting, the match never blocks on a client"""
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > SLOW_CLIENT:
+            transport.abort()
+            return
+        self.writer.write(data)
+
+
+class Match:
+    """a game between players on the same tetrimino sequence
+
+    inputs are applied as soon as they arrive, gravity and lock down advance
+    on the match's own tick. after either, the attacks are routed and the
+    changed boards are encoded once into a frame every player receives.
+    """
+
+    def __init__(self, players: list[Player], seed: int, tick: float = TICK) -> None:
+        self.players = players
+        self.tick = tick
+        self.rng = random.Random(seed)
+        self.games: list[TetrisEngine] = []
+        self.encoders: list[BoardEncoder] = []
+        self.sent: list[int] = []
+        self.frame = 0
+        self.over = False
+        for slot, player in enumerate(players):
+            player.slot = slot
+            player.match = self
+            game = TetrisEngine(seed)
+            game.init_game()
+            self.games.append(game)
+            self.encoders.append(BoardEncoder(slot))
+            self.sent.append(0)
+
+    def start(self) -> None:
+        names = b"".join(
+            bytes([len(name)]) + name
+            for name in (p.name.encode()[:255] for p in self.players)
+        )
+        for player in self.players:
+            header = START_HEADER.pack(player.slot, len(self.players))
+            player.send(message(START, header + names))
+        self.update()
+
+    def on_input(self, slot: int, actions: list) -> None:
+        if self.over:
+            return
+        self.games[slot].step(actions, 0.0)
+        self.update()
+
+    def leave(self, slot: int) -> None:
+        """a player disconnected, that counts as losing"""
+        if self.over:
+            return
+        self.games[slot].failed = True
+        self.update()
+
+    def update(self) -> None:
+        self.route_attacks()
+        deltas = b"".join(e.encode(g) for e, g in zip(self.encoders, self.games))
+        if deltas:
+            frame = message(FRAME, FRAME_HEADER.pack(self.frame) + deltas)
+            for player in self.players:
+                player.send(frame)
+
+        alive = [slot for slot, game in enumerate(self.games) if not game.failed]
+        if len(alive) > 1 or (alive and len(self.games) == 1):
+            return
+        self.over = True
+        winner = alive[0] if alive and len(self.games) > 1 else NO_WINNER
+        for player in self.players:
+            player.send(message(OVER, bytes([winner])))
+            player.writer.close()
+
+    def route_attacks(self) -> None:
+        """send the lines a player attacked with to a random opponent that is
+        still alive, as one block of garbage with a single hole"""
+        games = self.games
+        for slot, game in enumerate(games):
+            attack = game.sent - self.sent[slot]
+            if not attack:
+                continue
+            self.sent[slot] = game.sent
+            targets = [g for g in games if g is not game and not g.failed]
+            if targets:
+                target = self.rng.choice(targets)
+                target.receive(attack, self.rng.randrange(BOARD_WIDTH))
+
+    async def run(self) -> None:
+        """step every board on a fixed tick until one player is left"""
+        loop = asyncio.get_running_loop()
+        self.start()
+        last = deadline = loop.time()
+        while not self.over:
+            deadline += self.tick
+            await asyncio.sleep(max(deadline - loop.time(), 0))
+            now = loop.time()
+            for game in self.games:
+                game.step((), now - last)
+            last = now
+            self.frame += 1
+            self.update()
+
+
+class Server:
+    """pairs up connecting players and runs any number of matches"""
+
+    def __init__(self, players: int = 2, seed: int | None = None) -> None:
+        if not 1 <= players <= MAX_PLAYERS:
+            raise ValueError(f"a match has 1 to {MAX_PLAYERS} players")
+        self.players = players
+        self.seed = seed
+        self.lobby: list[Player] = []
+        self.matches: set[asyncio.Task] = set()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        player = None
+        try:
+            kind, payload = await read_message(reader)
+            if kind != HELLO:
+                return
+            player = Player(writer, payload.decode(errors="replace") or "player")
+            self.lobby.append(player)
+            if len(self.lobby) >= self.players:
+                self.start_match()
+            while True:
+                kind, payload = await read_message(reader)
+                match = player.match
+                if kind == INPUT and match is not None:
+                    actions = [ACTIONS[v] for v in payload if v < len(ACTIONS)]
+                    match.on_input(player.slot, actions)
+                elif kind == PING:
+                    player.send(message(PONG, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if player in self.lobby:
+                self.lobby.remove(player)
+            if player is not None and player.match is not None:
+                player.match.leave(player.slot)
+            writer.close()
+
+    def start_match(self) -> None:
+        players = self.lobby[: self.players]
+        del self.lobby[: self.players]
+        seed = self.seed if self.seed is not None else random.getrandbits(32)
+        task = asyncio.create_task(Match(players, seed).run())
+        # the loop only keeps weak references to tasks
+        self.matches.add(task)
+        task.add_done_callback(self.matches.discard)
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"listening on {host}:{port}, {self.players} players per match")
+        async with server:
+            await server.serve_forever()
+
+
+class Client:
+    """curses front end of a versus match, it only sends the keys and draws
+    the boards the server sends back"""
+
+    def __init__(self, stdscr: curses.window, name: str) -> None:
+        self.stdscr = stdscr
+        self.name = name
+        self.writer: asyncio.StreamWriter | None = None
+        self.slot = 0
+        self.games: list[TetrisEngine] = []
+        self.renderers: list[tuple[int, VersusRenderer | OpponentRenderer]] = []
+        self.quit = False
+
+    def on_key(self) -> None:
+        actions = bytearray()
+        while (c := self.stdscr.getch()) != -1:
+            if c == curses.KEY_RESIZE:
+                for _, renderer in self.renderers:
+                    renderer.invalidate()
+            elif c in EXIT:
+                self.quit = True
+            elif c in KEYMAP:
+                actions.append(KEYMAP[c].value)
+        if self.writer is None:
+            return
+        if self.quit:
+            self.writer.close()
+        elif actions:
+            self.writer.write(message(INPUT, bytes(actions)))
+
+    async def poll_keys(self) -> None:
+        """windows can not wait on stdin, read the keys on a timer instead"""
+        while True:
+            self.on_key()
+            await asyncio.sleep(Tetris.tick)
+
+    def start(self, payload: bytes) -> None:
+        slot, count = START_HEADER.unpack_from(payload)
+        offset = START_HEADER.size
+        names = []
+        for _ in range(count):
+            length = payload[offset]
+            names.append(payload[offset + 1 : offset + 1 + length].decode())
+            offset += 1 + length
+
+        self.slot = slot
+        self.stdscr.clear()
+        self.games = [mirror() for _ in range(count)]
+        self.renderers = [(slot, VersusRenderer(self.stdscr))]
+        left = GAME_WINDOW_SIZE_WIDTH + 1
+        for i, name in enumerate(names):
+            if i == slot or left + OpponentRenderer.width > curses.COLS:
+                continue
+            self.renderers.append((i, OpponentRenderer(self.stdscr, left, name)))
+            left += OpponentRenderer.width + 1
+
+    def draw(self) -> None:
+        for slot, renderer in self.renderers:
+            renderer.draw(self.games[slot])
+
+    async def run(self, host: str, port: int) -> str:
+        loop = asyncio.get_running_loop()
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(message(HELLO, self.name.encode()))
+        self.stdscr.addstr(0, 0, f"waiting for players on {host}:{port}")
+        self.stdscr.refresh()
+
+        if sys.platform != "win32":
+            loop.add_reader(sys.stdin.fileno(), self.on_key)
+            poller = None
+        else:
+            poller = asyncio.create_task(self.poll_keys())
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind == START:
+                    self.start(payload)
+                elif kind == FRAME:
+                    apply_frame(self.games, payload)
+                    self.draw()
+                elif kind == OVER:
+                    if payload[0] == NO_WINNER:
+                        return "game over"
+                    return "you won" if payload[0] == self.slot else "you lost"
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return "quit" if self.quit else "the server went away"
+        finally:
+            if poller is None:
+                loop.remove_reader(sys.stdin.fileno())
+            else:
+                poller.cancel()
+            self.writer.close()
+
+
+def play(stdscr: curses.window, host: str, port: int, name: str) -> str:
+    Tetris.init_color()
+    curses.curs_set(0)
+    stdscr.timeout(0)
+    result = asyncio.run(Client(stdscr, name).run(host, port))
+    if result != "quit":
+        # keep the final boards on screen until a key is pressed
+        stdscr.addstr(0, 2, f" {result}, press a key ")
+        stdscr.timeout(-1)
+        stdscr.getch()
+    return result
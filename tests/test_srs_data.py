@@ -0,0 +1,12 @@
+from tetris import srs, srs_data
+
+
+def test_tables_match_the_generator():
+    tables = srs.build_rotation_states()
+    for name, table in zip(srs.TYPES, tables):
+        assert getattr(srs_data, name) == table, f"{name} is stale"
+
+
+def test_source_matches_the_generator():
+    with open(srs.DATA_PATH) as f:
+        assert f.read() == srs.render(srs.build_rotation_states())
@@ -0,0 +1,30 @@
+import compileall
+import importlib.util
+import os
+
+import pytest
+
+# the benchmark keeps the list of modules that must import without curses
+spec = importlib.util.spec_from_file_location(
+    "startup",
+    os.path.join(os.path.dirname(__file__), "..", "benchmarks", "startup.py"),
+)
+assert spec is not None and spec.loader is not None
+startup = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(startup)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def compiled():
+    # time the imports, not compiling them
+    compileall.compile_dir(startup.SRC, quiet=1)
+
+
+@pytest.mark.parametrize("module", startup.HEADLESS)
+def test_headless_imports_skip_curses(module):
+    requires = startup.missing(module)
+    if requires is not None:
+        pytest.skip(f"{requires} is not installed")
+    result = startup.measure(module, 3)
+    assert not result["curses"]
+    assert result["tetris_ms"] <= startup.BUDGET_MS